@@ -1,7 +1,7 @@
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
-from django.contrib.auth.models import User, AnonymousUser
-from .models import UserProfile  # zakładam, że jest w 'api' (zmień na swoją lokalizację)
+from django.contrib.auth.models import AnonymousUser
+from .broker import user_for_token
 
 class CustomAuthentication(BaseAuthentication):
     keyword = b"token"  # 'Token' w nagłówku
@@ -27,20 +27,10 @@ class CustomAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token_key)
 
     def authenticate_credentials(self, key):
-        try:
-            user_profile = UserProfile.objects.get(auth_token=key)
-        except UserProfile.DoesNotExist:
+        # Token -> User z cache w pamięci procesu (baza tylko przy pierwszym użyciu / po TTL)
+        user_mock = user_for_token(key)
+        if user_mock is None:
             raise AuthenticationFailed("Invalid token")
-
-        # Tworzymy tymczasowego usera Django
-        user_mock = User(
-            id=user_profile.user_id,
-            username=f"micro_{user_profile.user_id}",
-            is_active=True,
-            is_staff=True,
-            is_superuser=True
-        )
-        user_mock.set_unusable_password()
         return (user_mock, None)
 
 class MicroserviceUser(AnonymousUser):
@@ -0,0 +1,76 @@
+# bnbgrid/binance_clients.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from binance.client import Client
+from requests.adapters import HTTPAdapter
+
+MAX_CLIENTS = 256        # ile klientów trzymamy maksymalnie (LRU)
+CLIENT_IDLE_TTL = 600    # po ilu sekundach bezczynności klient jest usuwany
+POOL_MAXSIZE = 32        # ile połączeń keep-alive na klienta (wątki workera)
+
+
+class ClientRegistry:
+    """
+    Wspólny dla procesu rejestr klientów python-binance.
+    Klucz: (api_key, sha256 zaszyfrowanego sekretu) - trafienie w cache nie wymaga
+    odszyfrowania sekretu ani nowego Client() (bez pingu i nowej sesji HTTPS).
+    """
+
+    def __init__(self, max_size: int = MAX_CLIENTS, idle_ttl: float = CLIENT_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._clients = OrderedDict()  # klucz -> (client, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, secret_enc=None, decrypt=None) -> Client:
+        """
+        Zwraca klienta dla danych kluczy. `decrypt` (callable zwracający sekret)
+        jest wołany tylko, gdy klienta nie ma jeszcze w rejestrze.
+        """
+        secret_hash = hashlib.sha256(bytes(secret_enc)).hexdigest() if secret_enc else ""
+        key = (api_key or "", secret_hash)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                return entry[0]
+
+            # Tworzymy pod blokadą, żeby równoległe wywołania nie zbudowały drugiego, niezamkniętego klienta
+            api_secret = decrypt() if decrypt else ""
+            client = _create_client(api_key or "", api_secret or "")
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                _, (old_client, _) = self._clients.popitem(last=False)
+                _close_client(old_client)
+        return client
+
+    def _evict_idle(self, now: float):
+        for key in [k for k, (_, used) in self._clients.items() if now - used > self.idle_ttl]:
+            client, _ = self._clients.pop(key)
+            _close_client(client)
+
+
+def _create_client(api_key: str, api_secret: str) -> Client:
+    # ping=False: nie odpytujemy serwera przy tworzeniu klienta
+    client = Client(api_key, api_secret, ping=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+    client.session.mount("https://", adapter)
+    return client
+
+
+def _close_client(client: Client):
+    try:
+        client.session.close()
+    except Exception:
+        pass
+
+
+client_registry = ClientRegistry()
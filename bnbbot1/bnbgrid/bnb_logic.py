@@ -1,53 +1,88 @@
 # bnbgrid/bnb_logic.py
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from django.db import close_old_connections
 from django.utils import timezone
 from django.conf import settings
 
 from .models import BnbBot
-from .bnb_manager import get_binance_client, fetch_symbol_price, run_grid_bot
+from .bnb_manager import fetch_ticker_snapshot, run_grid_bot
+from .broker import publish_bot_status
 
 CHECK_INTERVAL = 5  # co ile sekund worker sprawdza boty?
 
+# Ile botów obsługujemy równolegle (wątki); można nadpisać w settings.BNB_WORKER_CONCURRENCY
+WORKER_CONCURRENCY = getattr(settings, "BNB_WORKER_CONCURRENCY", 16)
+
+
+def evaluate_bot(bot: BnbBot, prices: dict):
+    """
+    Obsługa jednego bota w jednym cyklu (wywoływana z puli wątków).
+    Cena pochodzi ze wspólnego snapshotu cyklu i jest przekazywana do run_grid_bot.
+    """
+    try:
+        # 1) Cena z snapshotu pobranego raz dla wszystkich botów
+        current_price = prices.get(bot.symbol)
+        if current_price is None:
+            print(f"[worker] Bot {bot.id}: brak ceny dla {bot.symbol} w tym cyklu.")
+            return
+
+        # 2) Pobierz cenę lv1 (wiersz BnbLevel z index=1)
+        lv1_price = bot.levels.filter(index=1).values_list("price", flat=True).first() or Decimal("0")
+
+        # 3) Jeśli cena > lv1, zmieniamy status na FINISHED
+        if current_price > lv1_price:
+            bot.status = "FINISHED"
+            bot.save(update_fields=["status"])
+            publish_bot_status(bot.id, bot.user_id, "FINISHED")
+            print(f"[worker] Bot {bot.id}: cena {current_price} przekroczyła lv1={lv1_price}, status=FINISHED.")
+        else:
+            # W innym wypadku odpalamy logikę grid-bota
+            run_grid_bot(bot.id, current_price=current_price)
+
+    except Exception as e:
+        # Obsługa wyjątków, żeby w razie błędu worker się nie zatrzymał
+        print(f"[worker] Błąd przy obsłudze bota {bot.id}: {e}")
+    finally:
+        # Każdy wątek ma własne połączenie z DB
+        close_old_connections()
+
 
 def worker_loop():
     """
     Główna pętla worker-a.
+    Boty RUNNING są obsługiwane równolegle w puli WORKER_CONCURRENCY wątków;
+    cykl kończy się, gdy obsłużone zostaną wszystkie, więc jeden bot nigdy nie jest
+    przetwarzany przez dwa wątki naraz.
     """
+    executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="bnb-worker")
+
     while True:
         # Zamykanie połączeń DB przed/po pętli (zapobiega "MySQL has gone away" itp.)
         close_old_connections()
+        started = time.monotonic()
+
+        # Pobierz boty w statusie RUNNING
+        running_bots = list(BnbBot.objects.filter(status="RUNNING"))
+
+        # Jedno zapytanie o ceny wszystkich symboli, na których grają boty
+        try:
+            prices = fetch_ticker_snapshot(bot.symbol for bot in running_bots)
+        except Exception as e:
+            print(f"[worker] Błąd pobierania cen: {e}")
+            prices = {}
+
+        # Obsłuż boty równolegle, każdy z tym samym snapshotem cen
+        list(executor.map(lambda bot: evaluate_bot(bot, prices), running_bots))
+
+        elapsed = time.monotonic() - started
+        if elapsed > CHECK_INTERVAL:
+            print(f"[worker] Cykl {len(running_bots)} botów trwał {elapsed:.2f}s (> {CHECK_INTERVAL}s).")
 
-        # 1) Pobierz boty w statusie RUNNING
-        running_bots = BnbBot.objects.filter(status="RUNNING")
-
-        for bot in running_bots:
-            try:
-                # 2) Pobierz lv1 z levels_data
-                levels_data = bot.get_levels_data()
-                lv1_price = Decimal(str(levels_data.get("lv1", "0")))  # domyślnie 0, jeśli brak
-
-                # 3) Pobierz aktualną cenę z Binance
-                client = get_binance_client(bot)
-                current_price = fetch_symbol_price(client, bot.symbol)
-
-                # 4) Jeśli cena > lv1, zmieniamy status na FINISHED
-                if current_price > lv1_price:
-                    bot.status = "FINISHED"
-                    bot.save()
-                    print(f"[worker] Bot {bot.id}: cena {current_price} przekroczyła lv1={lv1_price}, status=FINISHED.")
-                else:
-                    # W innym wypadku odpalamy logikę grid-bota
-                    run_grid_bot(bot.id)
-
-            except Exception as e:
-                # Obsługa wyjątków, żeby w razie błędu worker się nie zatrzymał
-                print(f"[worker] Błąd przy obsłudze bota {bot.id}: {e}")
-
-        # Odczekaj ustalony czas
-        time.sleep(CHECK_INTERVAL)
+        # Odczekaj do końca interwału
+        time.sleep(max(0.0, CHECK_INTERVAL - elapsed))
 
 
 def start_bnb_worker():
@@ -1,12 +1,15 @@
 # bnbgrid/bnb_manager.py
 
+import json
 import time
 import math
 import decimal
 from decimal import Decimal, ROUND_DOWN
 from django.utils import timezone
 
-from .models import BnbBot, BnbTrade
+from .models import BnbBot, BnbLevel, BnbTrade
+from .broker import publish_bot_status, save_closed_trade
+from .binance_clients import client_registry
 from binance.client import Client  # jeśli używamy python-binance
 from binance.exceptions import BinanceAPIException
 
@@ -15,11 +18,17 @@ FEE_RATE = Decimal("0.0011")  # 0.11% = 0.0011 w zapisie dziesiętnym
 
 def get_binance_client(bot: BnbBot) -> Client:
     """
-    Tworzy klienta Binance używając kluczy zapisanych w obiekcie bota.
+    Zwraca klienta Binance dla kluczy zapisanych w obiekcie bota
+    (z rejestru - sekret odszyfrowujemy tylko przy pierwszym użyciu).
     """
-    api_key = bot.binance_api_key or ""
-    api_secret = bot.get_binance_api_secret() or ""
-    return Client(api_key, api_secret)
+    return client_registry.get(bot.binance_api_key, bot.binance_api_secret_enc, bot.get_binance_api_secret)
+
+
+def get_public_client() -> Client:
+    """
+    Klient bez kluczy API do publicznych endpointów (ceny).
+    """
+    return client_registry.get("")
 
 
 def fetch_symbol_price(client: Client, symbol: str) -> Decimal:
@@ -37,6 +46,33 @@ def fetch_symbol_price(client: Client, symbol: str) -> Decimal:
     #return 3.90
 
 
+def fetch_ticker_snapshot(symbols) -> dict:
+    """
+    Pobiera ceny wielu symboli JEDNYM zapytaniem (GET /api/v3/ticker/price?symbols=[...]).
+    Zwraca słownik symbol -> Decimal. Endpoint jest publiczny, więc nie potrzebujemy kluczy.
+    Jeśli Binance odrzuci całe zapytanie (np. nieistniejący symbol), pobieramy ceny pojedynczo,
+    żeby jeden błędny bot nie blokował pozostałych.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return {}
+
+    client = get_public_client()
+    try:
+        tickers = client.get_symbol_ticker(symbols=json.dumps(symbols, separators=(",", ":")))
+        return {t["symbol"]: Decimal(t["price"]) for t in tickers}
+    except BinanceAPIException as e:
+        print(f"[fetch_ticker_snapshot] Batch request failed ({e}), falling back to per-symbol.")
+
+    snapshot = {}
+    for symbol in symbols:
+        try:
+            snapshot[symbol] = fetch_symbol_price(client, symbol)
+        except BinanceAPIException as e:
+            print(f"[fetch_ticker_snapshot] {symbol}: {e}")
+    return snapshot
+
+
 def place_market_order(client: Client, symbol: str, side: str, quantity: Decimal) -> dict:
     """
     Składa zlecenie rynkowe (BUY lub SELL).
@@ -82,35 +118,124 @@ def calculate_profit(buy_price: Decimal, sell_price: Decimal, volume: Decimal) -
     return net
 
 
-def run_grid_bot(bot_id: int):
+def summarize_fills(order_resp: dict):
+    """
+    Zwraca (executed_qty, average_price) na podstawie "fills" z odpowiedzi Binance.
+    """
+    executed_qty = Decimal("0")
+    fill_cost = Decimal("0")
+
+    for f in order_resp.get("fills", []):
+        fill_price = Decimal(f["price"])
+        fill_qty = Decimal(f["qty"])
+        executed_qty += fill_qty
+        fill_cost += fill_price * fill_qty
+
+    average_price = fill_cost / executed_qty if executed_qty > 0 else Decimal("0")
+    return executed_qty, average_price
+
+
+def _sell_level(client: Client, bot: BnbBot, level: BnbLevel) -> bool:
+    """
+    Sprzedaje pozycję poziomu (MARKET SELL), zapisuje BnbTrade i aktualizuje wiersz poziomu.
+    Zwraca False, jeśli zlecenie się nie powiodło.
+    """
+    level.in_progress = True
+
+    order_resp = place_market_order(client, bot.symbol, "SELL", level.buy_volume)
+    if not order_resp:
+        # Błąd w składaniu zlecenia – reset flag, przechodzimy dalej
+        level.in_progress = False
+        return False
+
+    executed_qty, average_price = summarize_fills(order_resp)
+    profit = calculate_profit(level.buy_price, average_price, executed_qty)
+
+    # Zapisz transakcję SELL (razem z podsumowaniem P&L)
+    save_closed_trade(BnbTrade(
+        bot=bot,
+        level=level.name,
+        side="SELL",
+        quantity=executed_qty,
+        open_price=level.buy_price,
+        close_price=average_price,
+        profit=profit,
+        binance_order_id=order_resp.get("orderId", ""),
+        status="FILLED",
+        sell_type="MARKET"
+    ))
+
+    # Zwiększamy kapitał poziomu o profit i resetujemy flagi
+    level.cap = level.cap + profit
+    level.in_progress = False
+    level.bought = False
+    level.buy_price = Decimal("0")
+    level.buy_volume = Decimal("0")
+    level.save(update_fields=["cap", "in_progress", "bought", "buy_price", "buy_volume"])
+    return True
+
+
+def _buy_level(client: Client, bot: BnbBot, level: BnbLevel) -> bool:
+    """
+    Kupuje za kapitał poziomu (MARKET BUY), zapisuje BnbTrade i aktualizuje wiersz poziomu.
+    Zwraca False, jeśli zlecenie się nie powiodło.
+    """
+    level.in_progress = True
+
+    order_resp = place_market_order(client, bot.symbol, "BUY", level.cap)  # kapitał w USDT (zakładam)
+    if not order_resp:
+        level.in_progress = False
+        return False
+
+    executed_qty, average_price = summarize_fills(order_resp)
+
+    BnbTrade.objects.create(
+        bot=bot,
+        level=level.name,
+        side="BUY",
+        quantity=executed_qty,
+        open_price=average_price,
+        close_price=None,
+        profit=None,
+        binance_order_id=order_resp.get("orderId", ""),
+        status="FILLED",
+        buy_type="MARKET"
+    )
+
+    level.in_progress = False
+    level.bought = True
+    level.buy_price = average_price
+    level.buy_volume = executed_qty
+    level.save(update_fields=["in_progress", "bought", "buy_price", "buy_volume"])
+    return True
+
+
+def run_grid_bot(bot_id: int, current_price: Decimal = None, client: Client = None):
     """
     Funkcja, która może być wywoływana co pewien interwał (cron, Celery, cokolwiek),
     by aktualizować stany i ewentualnie wykonywać transakcje.
+    Stan poziomów jest w tabeli BnbLevel - zapisujemy tylko wiersze, które się zmieniły.
+    Worker przekazuje już pobraną cenę i klienta; bez nich pobieramy je tutaj.
     """
     try:
         bot = BnbBot.objects.get(id=bot_id, status="RUNNING")
     except BnbBot.DoesNotExist:
         return  # Bot nie istnieje lub nie jest w statusie RUNNING
 
-    # 1) Pobierz aktualną cenę z Binance
-    client = get_binance_client(bot)
-    current_price = fetch_symbol_price(client, bot.symbol)
+    # 1) Pobierz aktualną cenę z Binance (jeśli nie została przekazana)
+    if client is None:
+        client = get_binance_client(bot)
+    if current_price is None:
+        current_price = fetch_symbol_price(client, bot.symbol)
 
-    levels_data = bot.get_levels_data()    # np. {"lv1": 5.655, "lv2": 5.372, ..., "caps": {...}, "sell_levels": {...}}
-    runtime_data = bot.get_runtime_data()  # np. {"flags": {"lv1_bought": False, ...}, "buy_price": {"lv1":0}, "buy_volume": {"lv1":0}}
+    levels = bot.get_levels()  # lv1, lv2, ... (od najwyższej ceny)
+    levels_by_index = {lvl.index: lvl for lvl in levels}
 
-    if not levels_data or not runtime_data:
-        return
-
-    # Wyodrębnij listę poziomów (np. lv1, lv2, lv3...)
-    level_names = sorted([k for k in levels_data.keys() if k.startswith("lv")],
-                         key=lambda x: int(x.replace("lv", "")))
-
-    if "lv1" not in level_names:
+    if 1 not in levels_by_index:
         # Jeśli nie ma lv1, nie ma sensu kontynuować
         return
 
-    lv1_price = Decimal(str(levels_data["lv1"]))
+    lv1_price = levels_by_index[1].price
 
     # -----------------------------------------------------
     # SPRAWDZENIE, CZY current_price > lv1
@@ -119,65 +244,15 @@ def run_grid_bot(bot_id: int):
     if current_price > lv1_price * Decimal("1.1"):
         print(f"[run_grid_bot] Bot {bot.id}: current_price={current_price} > lv1={lv1_price}, closing all and FINISHING.")
 
-        for lv_name in level_names:
-            lv_bought = runtime_data["flags"].get(f"{lv_name}_bought", False)
-            lv_in_progress = runtime_data["flags"].get(f"{lv_name}_in_progress", False)
-            buy_price_stored = Decimal(runtime_data["buy_price"].get(lv_name, "0"))
-            buy_volume_stored = Decimal(runtime_data["buy_volume"].get(lv_name, "0"))
-
+        for level in levels:
             # Jeżeli mamy pozycję kupioną (bought == True) i nie jest w trakcie in_progress -> zamykamy SELL
-            if lv_bought and not lv_in_progress and buy_volume_stored > 0:
-                runtime_data["flags"][f"{lv_name}_in_progress"] = True
-
-                order_resp = place_market_order(client, bot.symbol, "SELL", buy_volume_stored)
-                if not order_resp:
-                    # Błąd w składaniu zlecenia – reset flag, przechodzimy dalej
-                    runtime_data["flags"][f"{lv_name}_in_progress"] = False
-                    continue
-
-                # Oblicz średnią cenę sprzedaży i zysk
-                fills = order_resp.get("fills", [])
-                executed_qty = Decimal("0")
-                fill_cost = Decimal("0")
-
-                for f in fills:
-                    fill_price = Decimal(f["price"])
-                    fill_qty = Decimal(f["qty"])
-                    executed_qty += fill_qty
-                    fill_cost += fill_price * fill_qty
-
-                average_price = fill_cost / executed_qty if executed_qty > 0 else Decimal("0")
-                profit = calculate_profit(buy_price_stored, average_price, executed_qty)
-
-                # Zapisz transakcję SELL
-                BnbTrade.objects.create(
-                    bot=bot,
-                    level=lv_name,
-                    side="SELL",
-                    quantity=executed_qty,
-                    open_price=buy_price_stored,
-                    close_price=average_price,
-                    profit=profit,
-                    binance_order_id=order_resp.get("orderId", ""),
-                    status="FILLED",
-                    sell_type="MARKET"
-                )
-
-                # Zwiększamy kapitał poziomu o profit (opcjonalnie)
-                new_cap = Decimal(levels_data["caps"][lv_name]) + profit
-                levels_data["caps"][lv_name] = str(new_cap)
-
-                # Reset flag
-                runtime_data["flags"][f"{lv_name}_in_progress"] = False
-                runtime_data["flags"][f"{lv_name}_bought"] = False
-                runtime_data["buy_price"][lv_name] = "0"
-                runtime_data["buy_volume"][lv_name] = "0"
+            if level.bought and not level.in_progress and level.buy_volume > 0:
+                _sell_level(client, bot, level)
 
         # Ustawiamy status bota na FINISHED i zapisujemy
         bot.status = "FINISHED"
-        bot.save_levels_data(levels_data)
-        bot.save_runtime_data(runtime_data)
-        bot.save()
+        bot.save(update_fields=["status"])
+        publish_bot_status(bot.id, bot.user_id, "FINISHED")
         return  # Koniec działania
 
     # -----------------------------------------------
@@ -185,106 +260,21 @@ def run_grid_bot(bot_id: int):
     # -----------------------------------------------
 
     # 2) Przejrzyj pozostałe poziomy
-    for lv_name in level_names:
-        level_price = Decimal(levels_data[lv_name])
-        capital_for_level = Decimal(levels_data["caps"].get(lv_name, 0))  # kapitał w USDT (zakładam)
-
-        lv_bought = runtime_data["flags"].get(f"{lv_name}_bought", False)
-        lv_in_progress = runtime_data["flags"].get(f"{lv_name}_in_progress", False)
-        buy_price_stored = Decimal(runtime_data["buy_price"].get(lv_name, "0"))
-        buy_volume_stored = Decimal(runtime_data["buy_volume"].get(lv_name, "0"))
+    for level in levels:
+        lv_bought = level.bought
+        lv_in_progress = level.in_progress
 
         # -----------------------------------------------------
         # A) Logika KUPNA
         # -----------------------------------------------------
-        if current_price < level_price and not lv_bought and not lv_in_progress:
-            runtime_data["flags"][f"{lv_name}_in_progress"] = True
-
-            order_resp = place_market_order(client, bot.symbol, "BUY", capital_for_level)
-            if not order_resp:
-                runtime_data["flags"][f"{lv_name}_in_progress"] = False
+        if current_price < level.price and not lv_bought and not lv_in_progress:
+            if not _buy_level(client, bot, level):
                 continue
 
-            fills = order_resp.get("fills", [])
-            executed_qty = Decimal("0")
-            fill_cost = Decimal("0")
-
-            for f in fills:
-                fill_price = Decimal(f["price"])
-                fill_qty = Decimal(f["qty"])
-                executed_qty += fill_qty
-                fill_cost += fill_price * fill_qty
-
-            average_price = fill_cost / executed_qty if executed_qty > 0 else Decimal("0")
-
-            BnbTrade.objects.create(
-                bot=bot,
-                level=lv_name,
-                side="BUY",
-                quantity=executed_qty,
-                open_price=average_price,
-                close_price=None,
-                profit=None,
-                binance_order_id=order_resp.get("orderId", ""),
-                status="FILLED",
-                buy_type="MARKET"
-            )
-
-            runtime_data["flags"][f"{lv_name}_in_progress"] = False
-            runtime_data["flags"][f"{lv_name}_bought"] = True
-            runtime_data["buy_price"][lv_name] = str(average_price)
-            runtime_data["buy_volume"][lv_name] = str(executed_qty)
-
         # -----------------------------------------------------
         # B) Logika SPRZEDAŻY
         # -----------------------------------------------------
-        sell_lv_name = levels_data["sell_levels"].get(lv_name) if "sell_levels" in levels_data else None
-        if lv_bought and not lv_in_progress and sell_lv_name:
-            sell_target_price = Decimal(levels_data[sell_lv_name])
-
-            if current_price >= sell_target_price:
-                runtime_data["flags"][f"{lv_name}_in_progress"] = True
-
-                order_resp = place_market_order(client, bot.symbol, "SELL", buy_volume_stored)
-                if not order_resp:
-                    runtime_data["flags"][f"{lv_name}_in_progress"] = False
-                    continue
-
-                fills = order_resp.get("fills", [])
-                executed_qty = Decimal("0")
-                fill_cost = Decimal("0")
-
-                for f in fills:
-                    fill_price = Decimal(f["price"])
-                    fill_qty = Decimal(f["qty"])
-                    executed_qty += fill_qty
-                    fill_cost += fill_price * fill_qty
-
-                average_price = fill_cost / executed_qty if executed_qty > 0 else Decimal("0")
-                profit = calculate_profit(buy_price_stored, average_price, executed_qty)
-
-                BnbTrade.objects.create(
-                    bot=bot,
-                    level=lv_name,
-                    side="SELL",
-                    quantity=executed_qty,
-                    open_price=buy_price_stored,
-                    close_price=average_price,
-                    profit=profit,
-                    binance_order_id=order_resp.get("orderId", ""),
-                    status="FILLED",
-                    sell_type="MARKET"
-                )
-
-                new_cap = Decimal(levels_data["caps"][lv_name]) + profit
-                levels_data["caps"][lv_name] = str(new_cap)
-
-                runtime_data["flags"][f"{lv_name}_in_progress"] = False
-                runtime_data["flags"][f"{lv_name}_bought"] = False
-                runtime_data["buy_price"][lv_name] = "0"
-                runtime_data["buy_volume"][lv_name] = "0"
-
-    # 3) Zapisz zmodyfikowane dane w bazie
-    bot.save_levels_data(levels_data)
-    bot.save_runtime_data(runtime_data)
-    bot.save()
+        sell_level = levels_by_index.get(level.sell_index) if level.sell_index else None
+        if lv_bought and not lv_in_progress and sell_level:
+            if current_price >= sell_level.price:
+                _sell_level(client, bot, level)
@@ -0,0 +1,31 @@
+# bnbgrid/broker.py
+"""
+Wspólne moduły botcore podpięte do modeli serwisu BNB.
+"""
+
+from botcore.columnar_export import TradeExport
+from botcore.pnl import PnlSummary
+from botcore.status_events import StatusPublisher
+from botcore.token_cache import TokenCache
+
+from .models import BnbBot, BnbTrade, BotPnlSummary, LevelPnlSummary, UserProfile
+
+BROKER_TYPE = "BNB"
+
+status_events = StatusPublisher(BROKER_TYPE)
+publish_bot_status = status_events.publish
+
+pnl = PnlSummary(BnbBot, BnbTrade, BotPnlSummary, LevelPnlSummary,
+                 closed_filter={"status": "FILLED", "side": "SELL"}, level_field="level")
+save_closed_trade = pnl.save_closed_trade
+rebuild_pnl_summary = pnl.rebuild
+
+token_cache = TokenCache(UserProfile)
+user_for_token = token_cache.user_for_token
+
+trade_export = TradeExport(
+    BROKER_TYPE, BnbBot, BnbTrade, date_field="created_at",
+    # bot_id, level, side, quantity, open_price, close_price, profit, status, opened_at, closed_at
+    fields=("bot_id", "level", "side", "quantity", "open_price", "close_price", "profit", "status", "created_at", None),
+)
+user_trades = trade_export.user_trades
@@ -0,0 +1,19 @@
+# bnbgrid/management/commands/rebuild_pnl_summary.py
+
+from django.core.management.base import BaseCommand
+
+from bnbgrid.broker import rebuild_pnl_summary
+
+
+class Command(BaseCommand):
+    help = "Odbudowuje BotPnlSummary / LevelPnlSummary z historii transakcji."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bot", type=int, action="append", dest="bot_ids",
+            help="ID bota do przeliczenia (można podać wielokrotnie); domyślnie wszystkie boty."
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_pnl_summary(options.get("bot_ids"))
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono podsumowania P&L dla {count} botów."))
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bnbgrid', '0010_bnbbot_runtime_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BnbLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('sell_index', models.PositiveIntegerField(blank=True, null=True)),
+                ('cap', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('bought', models.BooleanField(default=False)),
+                ('in_progress', models.BooleanField(default=False)),
+                ('buy_price', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('buy_volume', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='bnbgrid.bnbbot')),
+            ],
+            options={
+                'unique_together': {('bot', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Przeniesienie levels_data / runtime_data (str(dict)) do wierszy BnbLevel
+
+import ast
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def _parse(blob):
+    if not blob:
+        return {}
+    try:
+        return ast.literal_eval(blob)
+    except (ValueError, SyntaxError):
+        return {}
+
+
+def _dec(value):
+    return Decimal(str(value or 0))
+
+
+def blobs_to_levels(apps, schema_editor):
+    BnbBot = apps.get_model('bnbgrid', 'BnbBot')
+    BnbLevel = apps.get_model('bnbgrid', 'BnbLevel')
+
+    for bot in BnbBot.objects.all():
+        levels_data = _parse(bot.levels_data)
+        runtime_data = _parse(bot.runtime_data)
+        flags = runtime_data.get("flags", {})
+        caps = levels_data.get("caps", {})
+        sell_levels = levels_data.get("sell_levels", {})
+
+        rows = []
+        for lv_name, price in levels_data.items():
+            if not lv_name.startswith("lv"):
+                continue
+            sell_lv = sell_levels.get(lv_name)
+            rows.append(BnbLevel(
+                bot=bot,
+                index=int(lv_name[2:]),
+                price=_dec(price),
+                sell_index=int(sell_lv[2:]) if sell_lv else None,
+                cap=_dec(caps.get(lv_name)),
+                bought=bool(flags.get(f"{lv_name}_bought", False)),
+                in_progress=bool(flags.get(f"{lv_name}_in_progress", False)),
+                buy_price=_dec(runtime_data.get("buy_price", {}).get(lv_name)),
+                buy_volume=_dec(runtime_data.get("buy_volume", {}).get(lv_name)),
+            ))
+        BnbLevel.objects.bulk_create(rows)
+
+
+def levels_to_blobs(apps, schema_editor):
+    BnbBot = apps.get_model('bnbgrid', 'BnbBot')
+    BnbLevel = apps.get_model('bnbgrid', 'BnbLevel')
+
+    for bot in BnbBot.objects.all():
+        levels_data = {"caps": {}, "sell_levels": {}}
+        runtime_data = {"flags": {}, "buy_price": {}, "buy_volume": {}}
+        for lvl in BnbLevel.objects.filter(bot=bot).order_by('index'):
+            lv_name = f"lv{lvl.index}"
+            levels_data[lv_name] = float(lvl.price)
+            levels_data["caps"][lv_name] = str(lvl.cap)
+            if lvl.sell_index:
+                levels_data["sell_levels"][lv_name] = f"lv{lvl.sell_index}"
+            runtime_data["flags"][f"{lv_name}_bought"] = lvl.bought
+            runtime_data["flags"][f"{lv_name}_sold"] = False
+            runtime_data["flags"][f"{lv_name}_in_progress"] = lvl.in_progress
+            runtime_data["buy_price"][lv_name] = str(lvl.buy_price)
+            runtime_data["buy_volume"][lv_name] = str(lvl.buy_volume)
+        bot.levels_data = str(levels_data)
+        bot.runtime_data = str(runtime_data)
+        bot.save(update_fields=['levels_data', 'runtime_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bnbgrid', '0011_bnblevel'),
+    ]
+
+    operations = [
+        migrations.RunPython(blobs_to_levels, levels_to_blobs),
+    ]
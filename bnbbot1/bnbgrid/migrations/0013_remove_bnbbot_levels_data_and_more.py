@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bnbgrid', '0012_bnblevel_from_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='bnbbot',
+            name='levels_data',
+        ),
+        migrations.RemoveField(
+            model_name='bnbbot',
+            name='runtime_data',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bnbgrid', '0014_botpnlsummary_levelpnlsummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='auth_token',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bnbbot',
+            index=models.Index(fields=['status'], name='bnb_bot_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bnbbot',
+            index=models.Index(fields=['user_id', 'status'], name='bnb_bot_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bnbtrade',
+            index=models.Index(fields=['bot', 'status', 'level', 'side'], name='bnb_trade_bot_st_lvl_side_idx'),
+        ),
+    ]
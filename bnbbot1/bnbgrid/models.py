@@ -12,7 +12,7 @@ class UserProfile(models.Model):
     user_id = models.IntegerField(unique=True)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     reserved_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    auth_token = models.CharField(max_length=255, blank=True, null=True)
+    auth_token = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     def __str__(self):
         return f"UserProfile(user_id={self.user_id}, balance={self.balance}, reserved={self.reserved_balance})"
@@ -32,42 +32,53 @@ class BnbBot(models.Model):
     percent = models.DecimalField(max_digits=5, decimal_places=2, default=2.0)
     capital = models.DecimalField(max_digits=12, decimal_places=2)
 
-   # Dotychczasowe
-    levels_data = models.TextField(default="{}")  # <-- tu zostawiamy tylko konfigurację
-    # Nowe pole na "dane dynamiczne" (flagi, buy_volume, buy_price)
-    runtime_data = models.TextField(default="{}")
-
     binance_api_key = models.CharField(max_length=100, blank=True, null=True)
     binance_api_secret_enc = models.BinaryField(blank=True, null=True)
 
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='STOPPED')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='bnb_bot_status_idx'),
+            models.Index(fields=['user_id', 'status'], name='bnb_bot_user_status_idx'),
+        ]
+
     def __str__(self):
         return f"BnbBot(id={self.id}, user={self.user_id}, symbol={self.symbol}, status={self.status})"
 
-    def get_levels_data(self) -> dict:
-        if not self.levels_data:
-            return {}
-        # jeśli zapisujesz w formie stringa przez str(data), można używać eval
-        # jeśli w formie JSON, to json.loads()
-        return eval(self.levels_data)
-
-    def save_levels_data(self, data: dict):
+    def get_levels(self):
         """
-        Ustawia atrybut levels_data, ale NIE wywołuje self.save().
+        Poziomy bota (BnbLevel) posortowane od lv1 (najwyższa cena) w dół.
         """
-        self.levels_data = str(data)
-        # UWAGA: USUWAMY self.save()!
-        # Poprawność w asynchronicznym kodzie zapewniamy przez await sync_to_async(bot.save)()
-
-    def get_runtime_data(self) -> dict:
-        if not self.runtime_data:
-            return {}
-        return eval(self.runtime_data)  # lub json.loads
+        return list(self.levels.order_by("index"))
 
-    def save_runtime_data(self, data: dict):
-        self.runtime_data = str(data)
-        # nie wywołujemy self.save() tutaj
+    def get_level_stats(self):
+        """
+        Zwraca słownik {nazwa poziomu: {"tp": liczba TP, "profit": zysk}}.
+        Czyta gotowe wiersze LevelPnlSummary (po jednym na poziom); bez nich
+        (np. przed rebuild_pnl_summary) liczy je jednym zapytaniem GROUP BY level.
+        """
+        stats = {
+            row.level: {
+                "tp": row.tp_count,
+                "profit": float(row.total_profit)
+            }
+            for row in self.level_pnl.all()
+        }
+        if stats:
+            return stats
+
+        qs = self.trades.filter(status="FILLED", side="SELL").values("level").annotate(
+            tp=models.Count("id"),
+            total_profit=models.Sum("profit")
+        )
+        return {
+            item["level"]: {
+                "tp": item["tp"],
+                "profit": float(item["total_profit"] or 0)
+            }
+            for item in qs
+        }
 
     def set_binance_api_secret(self, plain_secret: str):
         self.binance_api_secret_enc = fernet.encrypt(plain_secret.encode("utf-8"))
@@ -78,6 +89,32 @@ class BnbBot(models.Model):
         return fernet.decrypt(self.binance_api_secret_enc).decode("utf-8")
 
 
+class BnbLevel(models.Model):
+    """
+    Stan pojedynczego poziomu grid (jeden wiersz na poziom).
+    Worker aktualizuje tylko te wiersze, które zmienia.
+    """
+    bot = models.ForeignKey(BnbBot, on_delete=models.CASCADE, related_name='levels')
+    index = models.PositiveIntegerField()                 # 1 => "lv1" (najwyższa cena)
+    price = models.DecimalField(max_digits=20, decimal_places=8)
+    sell_index = models.PositiveIntegerField(null=True, blank=True)  # poziom sprzedaży, np. lv3 -> lv2
+    cap = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    bought = models.BooleanField(default=False)
+    in_progress = models.BooleanField(default=False)
+    buy_price = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    buy_volume = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+
+    class Meta:
+        unique_together = ('bot', 'index')
+
+    @property
+    def name(self) -> str:
+        return f"lv{self.index}"
+
+    def __str__(self):
+        return f"BnbLevel(bot_id={self.bot_id}, {self.name}, price={self.price}, bought={self.bought})"
+
+
 class BnbTrade(models.Model):
     """
     Transakcje zawarte przez BnbBot (kupno/sprzedaż).
@@ -95,6 +132,42 @@ class BnbTrade(models.Model):
     sell_type = models.CharField(max_length=10, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['bot', 'status', 'level', 'side'], name='bnb_trade_bot_st_lvl_side_idx'),
+        ]
+
     def __str__(self):
         return f"BnbTrade(bot_id={self.bot_id}, lv={self.level}, side={self.side}, status={self.status})"
 
+
+class BotPnlSummary(models.Model):
+    """
+    Zmaterializowane podsumowanie P&L bota: liczba TP i łączny zysk.
+    Aktualizowane w tej samej transakcji co zapis zamkniętej transakcji (broker.save_closed_trade),
+    odbudowywane z historii komendą rebuild_pnl_summary.
+    """
+    bot = models.OneToOneField(BnbBot, on_delete=models.CASCADE, related_name="pnl_summary")
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"BotPnlSummary(bot_id={self.bot_id}, tp={self.tp_count}, profit={self.total_profit})"
+
+
+class LevelPnlSummary(models.Model):
+    """
+    Podsumowanie P&L jednego poziomu bota (jeden wiersz na poziom).
+    """
+    bot = models.ForeignKey(BnbBot, on_delete=models.CASCADE, related_name="level_pnl")
+    level = models.CharField(max_length=10)
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("bot", "level")
+
+    def __str__(self):
+        return f"LevelPnlSummary(bot_id={self.bot_id}, {self.level}, tp={self.tp_count}, profit={self.total_profit})"
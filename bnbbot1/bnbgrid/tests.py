@@ -1,3 +1,41 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from .models import BnbBot, BnbTrade, UserProfile
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), "plan format znany tylko dla MySQL/SQLite")
+class HotPathIndexTests(TestCase):
+    """
+    Zapytania z gorącej ścieżki (pętla workerów, autoryzacja tokenem, otwarte transakcje)
+    muszą mieć w planie (EXPLAIN) indeksy z migracji 0015_hot_path_indexes.
+    """
+
+    def assertPlanUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} nie występuje w planie:\n{plan}")
+
+    def test_running_bots_use_status_index(self):
+        self.assertPlanUses(BnbBot.objects.filter(status='RUNNING'), 'bnb_bot_status_idx')
+
+    def test_user_bots_use_user_status_index(self):
+        self.assertPlanUses(BnbBot.objects.filter(user_id=1, status='RUNNING'), 'bnb_bot_user_status_idx')
+
+    def test_token_lookup_uses_auth_token_index(self):
+        self.assertPlanUses(UserProfile.objects.filter(auth_token='token'), 'auth_token')
+
+    def test_open_trades_use_composite_index(self):
+        # Przy pustej tabeli planer może wybrać dowolny indeks - potrzebne są dane,
+        # w których sam bot_id jest mało selektywny (wiele poziomów i statusów na bota)
+        bots = [
+            BnbBot.objects.create(user_id=1, name=f'bot{i}', symbol='BTCUSDT', max_price=100, capital=1000)
+            for i in range(2)
+        ]
+        BnbTrade.objects.bulk_create([
+            BnbTrade(bot=bot, level=f'lv{lv}', side=side, quantity=1, status=status)
+            for bot in bots for lv in range(10) for side in ('BUY', 'SELL') for status in ('OPEN', 'FILLED')
+            for _ in range(5)
+        ])
+        self.assertPlanUses(BnbTrade.objects.filter(bot_id=bots[0].id, status='FILLED', level='lv1', side='SELL'), 'bnb_trade_bot_st_lvl_side_idx')
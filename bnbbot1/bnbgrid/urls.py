@@ -6,6 +6,9 @@ urlpatterns = [
     path('get_bot_details/<int:bot_id>/', views.get_bot_details, name='bnb_get_bot'),
     path('remove_bot/<int:bot_id>/', views.remove_bot, name='bnb_remove_bot'),
     path('get_bot_status/<int:bot_id>/', views.get_bot_status, name='bnb_bot_status'),
+    path('bot_statuses/', views.get_bot_statuses, name='bnb_bot_statuses'),
     path('register_token/', views.register, name='register_token'),
     path('export_bnb_trades_csv/<int:bot_id>/', views.export_bnb_trades_csv, name='export_bnb_trades_csv'),
+    path('export_trades/', views.export_trades_columnar, name='bnb_export_trades_columnar'),
+    path('export_trades/<int:bot_id>/', views.export_trades_columnar, name='bnb_export_bot_trades_columnar'),
 ]
\ No newline at end of file
@@ -4,16 +4,18 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
 from decimal import Decimal
-import csv
 import json
-from io import StringIO
 
 from django.conf import settings
 
-from .models import UserProfile, BnbBot, BnbTrade
+from .models import UserProfile, BnbBot, BnbLevel, BnbTrade, BotPnlSummary
+from botcore.csv_stream import ROW_CHUNK_SIZE, parse_date_range, filter_date_range, streaming_csv_response
+from botcore.columnar_export import FORMATS, columnar_available, stream_columnar
+from botcore.bot_statuses import bot_statuses_view
+from .broker import token_cache, user_trades
 from .authentication import CustomAuthentication
 
 
@@ -44,6 +46,7 @@ def register(request):
     user_profile, created = UserProfile.objects.get_or_create(user_id=user_id)
     user_profile.auth_token = token
     user_profile.save()
+    token_cache.invalidate_user(user_id)
     return Response({'status': 'Token saved successfully'})
 
 
@@ -99,22 +102,25 @@ def generate_levels(max_price, pct, capital, min_price=None, decimals=3):
     return data
 
 
-def init_runtime_data(level_names):
+def create_levels(bot, data):
     """
-    Tworzy słownik z `flags`, `buy_price`, `buy_volume` = 0.
+    Tworzy wiersze BnbLevel (cena, kapitał, poziom sprzedaży) na podstawie
+    słownika z generate_levels. Flagi i buy_price/buy_volume startują od zera.
     """
-    rd = {
-        "flags": {},
-        "buy_price": {},
-        "buy_volume": {}
-    }
-    for lv_name in level_names:
-        rd["flags"][f"{lv_name}_bought"] = False
-        rd["flags"][f"{lv_name}_sold"] = False
-        rd["flags"][f"{lv_name}_in_progress"] = False
-        rd["buy_price"][lv_name] = 0.0
-        rd["buy_volume"][lv_name] = 0.0
-    return rd
+    sell_levels = data.get("sell_levels", {})
+    rows = []
+    for lv_name, lv_price in data.items():
+        if not lv_name.startswith("lv"):
+            continue
+        sell_lv = sell_levels.get(lv_name)
+        rows.append(BnbLevel(
+            bot=bot,
+            index=int(lv_name[2:]),
+            price=Decimal(str(lv_price)),
+            sell_index=int(sell_lv[2:]) if sell_lv else None,
+            cap=Decimal(str(data["caps"].get(lv_name, 0))),
+        ))
+    BnbLevel.objects.bulk_create(rows)
 
 
 
@@ -145,17 +151,10 @@ def create_bot(request):
         bot.set_binance_api_secret(binance_secret)
         bot.save()
 
-    # 1) Tylko statyczna konfiguracja:
+    # Poziomy: jeden wiersz BnbLevel na poziom
     data = generate_levels(max_price, percent, capital, decimals=decimals)
-    bot.save_levels_data(data)
-
-    # 2) Inicjalizacja runtime:
-    #    *level_names* to klucze lv1..lvN wygenerowane przez generate_levels
-    level_names = [k for k in data.keys() if k.startswith("lv")]
-    runtime = init_runtime_data(level_names)
-    bot.save_runtime_data(runtime)
+    create_levels(bot, data)
 
-    bot.save()
     return Response({
         "bot_id": bot.id,
         "message": "Bot created successfully"
@@ -171,31 +170,31 @@ def create_bot(request):
 @permission_classes([IsAuthenticated])
 def get_bot_details(request, bot_id):
     bot = get_object_or_404(BnbBot, pk=bot_id, user_id=request.user.id)
-    raw_data = bot.get_levels_data()
 
-    # wczytaj FILLED transakcje
-    trades = BnbTrade.objects.filter(bot=bot, status='FILLED')
+    # TP i zysk wszystkich poziomów jednym zapytaniem (z cache)
+    level_stats = bot.get_level_stats()
 
     # Zbuduj obiekt levels
     levels = {}
-    for k, v in raw_data.items():
-        if k.startswith("lv"):
-            levels[k] = {
-                "price": float(v),
-                "capital": float(raw_data.get("caps", {}).get(k, 0.0)),
-                "tp": 0,
-                "profit": 0.0,
-            }
-
-    total_profit = 0.0
+    for lvl in bot.get_levels():
+        levels[lvl.name] = {
+            "price": float(lvl.price),
+            "capital": float(lvl.cap),
+            "tp": 0,
+            "profit": 0.0,
+        }
+
     for lv_key, info in levels.items():
-        sells = trades.filter(level=lv_key, side='SELL')
-        tp_count = sells.count()
-        lv_profit = sum(float(t.profit or 0) for t in sells)
+        stats = level_stats.get(lv_key, {})
+        tp_count = stats.get("tp", 0)
+        lv_profit = stats.get("profit", 0.0)
 
         info["tp"] = tp_count
         info["profit"] = round(lv_profit, 2)
-        total_profit += lv_profit
+
+    # Łączny zysk ze zmaterializowanego podsumowania (jeden wiersz)
+    summary = BotPnlSummary.objects.filter(bot=bot).first()
+    total_profit = float(summary.total_profit) if summary else 0.0
 
     resp = {
         "bot_id": bot.id,
@@ -239,6 +238,12 @@ def get_bot_status(request, bot_id):
     })
 
 
+# -------------------------------------------------------
+# 6b) Zbiorczy status botów
+# -------------------------------------------------------
+get_bot_statuses = bot_statuses_view(BnbBot, CustomAuthentication)
+
+
 # -------------------------------------------------------
 # 7) Eksport transakcji do CSV
 # -------------------------------------------------------
@@ -246,19 +251,50 @@ def get_bot_status(request, bot_id):
 @authentication_classes([CustomAuthentication])
 @permission_classes([IsAuthenticated])
 def export_bnb_trades_csv(request, bot_id):
+    """
+    Transakcje bota w CSV, generowane strumieniowo.
+    Opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD (po created_at).
+    """
     try:
         bot = BnbBot.objects.get(id=bot_id, user_id=request.user.id)
     except BnbBot.DoesNotExist:
         return Response({"error": "Bot not found or not owned by user"}, status=404)
 
-    trades = BnbTrade.objects.filter(bot=bot).order_by('created_at')
-
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';')
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    trades = filter_date_range(BnbTrade.objects.filter(bot=bot), 'created_at', date_from, date_to)
+    trades = trades.order_by('created_at').values_list(
+        'level', 'side', 'quantity', 'open_price', 'close_price', 'profit',
+        'binance_order_id', 'buy_type', 'sell_type', 'status', 'created_at'
+    ).iterator(chunk_size=ROW_CHUNK_SIZE)
+
+    def _num(value):
+        return str(value).replace('.', ',') if value is not None else ""
+
+    def rows():
+        for (level, side, quantity, open_price, close_price, profit,
+             binance_order_id, buy_type, sell_type, status, created_at) in trades:
+            yield [
+                level,
+                side or "",
+                _num(quantity),
+                _num(open_price),
+                _num(close_price),
+                _num(profit),
+                binance_order_id or "",
+                buy_type or "",
+                sell_type or "",
+                status,
+                created_at.strftime("%Y-%m-%d %H:%M") if created_at else "",
+                "",  # BnbTrade nie ma osobnego czasu zamknięcia
+            ]
 
     # Definicja nagłówka CSV - pomijamy pola związane z id
     header = [
-        "Level", 
+        "Level",
         "Side",
         "Quantity",
         "Open Price",
@@ -271,41 +307,40 @@ def export_bnb_trades_csv(request, bot_id):
         "Open Time",
         "Close Time"
     ]
-    writer.writerow(header)
-
-    for trade in trades:
-        quantity = str(trade.quantity).replace('.', ',') if trade.quantity is not None else ""
-        open_price = str(trade.open_price).replace('.', ',') if trade.open_price is not None else ""
-        close_price = str(trade.close_price).replace('.', ',') if trade.close_price is not None else ""
-        profit = str(trade.profit).replace('.', ',') if trade.profit is not None else ""
-        
-        binance_order_id = trade.binance_order_id or ""
-        buy_type = trade.buy_type or ""
-        sell_type = trade.sell_type or ""
-        side = trade.side or ""
-
-        open_time = trade.created_at.strftime("%Y-%m-%d %H:%M") if trade.created_at else ""
-        # Jeżeli posiadasz pole 'filled_at' (np. jako moment zamknięcia transakcji)
-        close_time = ""
-        if hasattr(trade, 'filled_at') and trade.filled_at:
-            close_time = trade.filled_at.strftime("%Y-%m-%d %H:%M")
-
-        writer.writerow([
-            trade.level,
-            side,
-            quantity,
-            open_price,
-            close_price,
-            profit,
-            binance_order_id,
-            buy_type,
-            sell_type,
-            trade.status,
-            open_time,
-            close_time,
-        ])
-
-    response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
-    return response
+    return streaming_csv_response(request, f"bot_{bot_id}_trades.csv", header, rows())
+
 
+# -------------------------------------------------------
+# 8) Eksport kolumnowy (Arrow / Parquet)
+# -------------------------------------------------------
+@api_view(['GET'])
+@authentication_classes([CustomAuthentication])
+@permission_classes([IsAuthenticated])
+def export_trades_columnar(request, bot_id=None):
+    """
+    Transakcje usera (wszystkich botów albo jednego) w formacie kolumnowym, z zachowaniem typów:
+    ?output=arrow (Arrow IPC stream, domyślnie) lub ?output=parquet,
+    opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD.
+    """
+    if not columnar_available():
+        return Response({"error": "Columnar export requires pyarrow"}, status=501)
+
+    output = request.GET.get('output', 'arrow')
+    if output not in FORMATS:
+        return Response({"error": f"Unknown output format: {output}"}, status=400)
+
+    if bot_id is not None and not BnbBot.objects.filter(id=bot_id, user_id=request.user.id).exists():
+        return Response({"error": "Bot not found or not owned by user"}, status=404)
+
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    content_type, extension = FORMATS[output]
+    rows = user_trades(request.user.id, bot_id, date_from, date_to)
+    filename = f"bot_{bot_id}_trades.{extension}" if bot_id else f"bnb_trades.{extension}"
+
+    response = StreamingHttpResponse(stream_columnar(rows, output), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
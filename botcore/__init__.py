@@ -0,0 +1,6 @@
+# botcore/__init__.py
+"""
+Moduły wspólne dla serwisów botów (microservice/api - XTB, bnbbot1/bnbgrid - BNB, xtb_d/d510 - D10).
+Każdy serwis podpina je do swoich modeli w module <app>/broker.py;
+katalog nadrzędny projektów trafia na sys.path w settings.py serwisu.
+"""
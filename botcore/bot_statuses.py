@@ -0,0 +1,36 @@
+# botcore/bot_statuses.py
+
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+
+def bot_statuses_view(bot_model, authentication_class):
+    """
+    Buduje widok POST /bot_statuses/ serwisu dla modelu bota `bot_model`
+    (user_id, status) i klasy autoryzacji tokenem serwisu.
+    """
+
+    @api_view(['POST'])
+    @authentication_classes([authentication_class])
+    @permission_classes([IsAuthenticated])
+    def get_bot_statuses(request):
+        """
+        Zbiorczy status botów zalogowanego usera.
+        Body: {"bot_ids": [1, 2, ...]} - bez bot_ids zwraca wszystkie boty usera.
+        Jedno zapytanie do bazy (po kluczu głównym / user_id) zamiast N wywołań get_bot_status.
+        """
+        bot_ids = request.data.get('bot_ids')
+        bots = bot_model.objects.filter(user_id=request.user.id)
+        if bot_ids is not None:
+            if not isinstance(bot_ids, list):
+                return Response({"error": "bot_ids must be a list"}, status=400)
+            bots = bots.filter(id__in=bot_ids)
+
+        statuses = [
+            {"bot_id": bot_id, "status": status}
+            for bot_id, status in bots.values_list('id', 'status')
+        ]
+        return Response({"bots": statuses})
+
+    return get_bot_statuses
@@ -0,0 +1,150 @@
+# botcore/columnar_export.py
+
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow jest opcjonalny - bez niego eksport kolumnowy zwraca 501
+    pa = None
+    pq = None
+
+from .csv_stream import ROW_CHUNK_SIZE, filter_date_range
+
+BATCH_ROWS = 50_000    # wierszy w jednym RecordBatch / row group Parquet
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Kolumny wspólne dla XTB, BNB i D10 - portal scala eksporty bez konwersji
+COLUMNS = [
+    "broker", "bot_id", "level", "side", "quantity",
+    "open_price", "close_price", "profit", "status", "opened_at", "closed_at",
+]
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+def trade_schema():
+    money = pa.decimal128(20, 8)
+    return pa.schema([
+        ("broker", pa.string()),
+        ("bot_id", pa.int64()),
+        ("level", pa.string()),
+        ("side", pa.string()),
+        ("quantity", money),
+        ("open_price", money),
+        ("close_price", money),
+        ("profit", money),
+        ("status", pa.string()),
+        ("opened_at", pa.timestamp("us", tz="UTC")),
+        ("closed_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+class TradeExport:
+    """
+    Źródło wierszy eksportu dla jednego serwisu.
+    `fields` to nazwy pól modelu transakcji dla kolumn COLUMNS po "broker"
+    (None = serwis nie ma takiej kolumny), `date_field` - pole do filtra dat i sortowania.
+    """
+
+    def __init__(self, broker_type: str, bot_model, trade_model, date_field: str, fields):
+        self.broker_type = broker_type
+        self.bot_model = bot_model
+        self.trade_model = trade_model
+        self.date_field = date_field
+        self.fields = fields
+
+    def user_trades(self, user_id: int, bot_id=None, date_from=None, date_to=None):
+        """
+        Transakcje usera (albo jednego bota) jako krotki w kolejności COLUMNS,
+        pobierane paczkami przez .iterator().
+        """
+        bots = self.bot_model.objects.filter(user_id=user_id)
+        if bot_id is not None:
+            bots = bots.filter(id=bot_id)
+        trades = self.trade_model.objects.filter(bot__in=bots)
+        trades = filter_date_range(trades, self.date_field, date_from, date_to)
+
+        present = [f for f in self.fields if f is not None]
+        positions = [present.index(f) if f is not None else None for f in self.fields]
+        rows = trades.order_by("bot_id", self.date_field).values_list(*present).iterator(chunk_size=ROW_CHUNK_SIZE)
+        for row in rows:
+            yield (self.broker_type, *(row[i] if i is not None else None for i in positions))
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Plik tylko do zapisu, z którego po każdej paczce odbieramy zapisane bajty.
+    tell() liczy wszystkie bajty, więc offsety w stopce Parquet są poprawne.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batches(rows, schema):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            yield _to_batch(batch, schema)
+            batch = []
+    if batch:
+        yield _to_batch(batch, schema)
+
+
+def _to_batch(rows, schema):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def stream_columnar(rows, fmt: str):
+    """
+    Generator bajtów Arrow IPC (stream) albo Parquet - jedna paczka BATCH_ROWS
+    wierszy naraz (dla Parquet: jeden row group na paczkę).
+    """
+    schema = trade_schema()
+    sink = _ChunkSink()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(out, schema)
+        write = lambda batch: writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+        write = writer.write_batch
+
+    for batch in _record_batches(rows, schema):
+        write(batch)
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
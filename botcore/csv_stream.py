@@ -0,0 +1,99 @@
+# botcore/csv_stream.py
+
+import csv
+import datetime
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+
+ROW_CHUNK_SIZE = 2000      # ile wierszy pobieramy z bazy na raz (.iterator)
+OUTPUT_CHUNK_SIZE = 64 * 1024  # do ilu bajtów sklejamy linie CSV przed wysłaniem
+
+
+class _Echo:
+    """
+    Pseudo-plik dla csv.writer: write() zwraca linię zamiast ją buforować.
+    """
+
+    def write(self, value):
+        return value
+
+
+def parse_date_range(request):
+    """
+    Czyta opcjonalne ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD (obie daty włącznie).
+    Zwraca (date_from, date_to_exclusive) - każda może być None.
+    Rzuca ValueError przy niepoprawnym formacie.
+    """
+    def _get(name):
+        raw = request.GET.get(name)
+        if not raw:
+            return None
+        value = parse_date(raw)
+        if value is None:
+            raise ValueError(f"Niepoprawna data {name}={raw} (oczekiwano RRRR-MM-DD)")
+        return value
+
+    date_from = _get("date_from")
+    date_to = _get("date_to")
+    if date_to is not None:
+        date_to = date_to + datetime.timedelta(days=1)
+    return date_from, date_to
+
+
+def filter_date_range(queryset, field, date_from, date_to):
+    if date_from is not None:
+        queryset = queryset.filter(**{f"{field}__gte": date_from})
+    if date_to is not None:
+        queryset = queryset.filter(**{f"{field}__lt": date_to})
+    return queryset
+
+
+def _csv_lines(header, rows, delimiter):
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _batched(lines):
+    buf = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buf.append(data)
+        size += len(data)
+        if size >= OUTPUT_CHUNK_SIZE:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # format gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_csv_response(request, filename, header, rows, delimiter=";"):
+    """
+    Odpowiedź CSV generowana w locie - w pamięci jest tylko bieżąca paczka wierszy.
+    Jeśli klient akceptuje gzip (Accept-Encoding), strumień jest kompresowany.
+    """
+    chunks = _batched(_csv_lines(header, rows, delimiter))
+    use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if use_gzip:
+        chunks = _gzipped(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Vary"] = "Accept-Encoding"
+    if use_gzip:
+        response["Content-Encoding"] = "gzip"
+    return response
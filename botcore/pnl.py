@@ -0,0 +1,95 @@
+# botcore/pnl.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+
+class PnlSummary:
+    """
+    Utrzymanie zmaterializowanych podsumowań P&L (BotPnlSummary / LevelPnlSummary) serwisu.
+    - bot_model, trade_model: modele bota i transakcji,
+    - closed_filter: filtr zamkniętych transakcji (np. {"status": "SOLD"}),
+    - level_field: pole transakcji z nazwą poziomu ("level" albo "level_name").
+    """
+
+    def __init__(self, bot_model, trade_model, bot_summary_model, level_summary_model,
+                 closed_filter: dict, level_field: str = "level"):
+        self.bot_model = bot_model
+        self.trade_model = trade_model
+        self.bot_summary_model = bot_summary_model
+        self.level_summary_model = level_summary_model
+        self.closed_filter = closed_filter
+        self.level_field = level_field
+
+    def _closed_trades(self):
+        return self.trade_model.objects.filter(**self.closed_filter)
+
+    def save_closed_trade(self, trade):
+        """
+        Zapisuje zamkniętą transakcję i w tej samej transakcji bazy dopisuje ją
+        do BotPnlSummary / LevelPnlSummary (TP +1, zysk +profit).
+        """
+        with transaction.atomic():
+            trade.save()
+            self._add_to_summary(trade.bot_id, getattr(trade, self.level_field), trade.profit or 0)
+
+    def _add_to_summary(self, bot_id: int, level: str, profit):
+        now = timezone.now()
+        profit = Decimal(str(profit))
+
+        # Inkrementacja przez F() - bez wyścigu przy równoległych zapisach
+        self.level_summary_model.objects.get_or_create(bot_id=bot_id, level=level)
+        self.level_summary_model.objects.filter(bot_id=bot_id, level=level).update(
+            tp_count=F('tp_count') + 1,
+            total_profit=F('total_profit') + profit,
+            updated_at=now
+        )
+        self.bot_summary_model.objects.get_or_create(bot_id=bot_id)
+        self.bot_summary_model.objects.filter(bot_id=bot_id).update(
+            tp_count=F('tp_count') + 1,
+            total_profit=F('total_profit') + profit,
+            updated_at=now
+        )
+
+    def rebuild(self, bot_ids=None) -> int:
+        """
+        Odbudowuje podsumowania P&L z pełnej historii transakcji
+        (wszystkich botów albo tylko podanych). Zwraca liczbę przeliczonych botów.
+        """
+        bots = self.bot_model.objects.all()
+        if bot_ids:
+            bots = bots.filter(id__in=bot_ids)
+        bot_ids = list(bots.values_list('id', flat=True))
+
+        rows = self._closed_trades().filter(bot_id__in=bot_ids).values('bot_id', self.level_field).annotate(
+            tp=Count('id'),
+            profit=Sum('profit')
+        )
+
+        level_rows = []
+        totals = defaultdict(lambda: [0, Decimal("0")])
+        for row in rows:
+            profit = row['profit'] or Decimal("0")
+            level_rows.append(self.level_summary_model(
+                bot_id=row['bot_id'],
+                level=row[self.level_field],
+                tp_count=row['tp'],
+                total_profit=profit
+            ))
+            totals[row['bot_id']][0] += row['tp']
+            totals[row['bot_id']][1] += profit
+
+        with transaction.atomic():
+            self.level_summary_model.objects.filter(bot_id__in=bot_ids).delete()
+            self.bot_summary_model.objects.filter(bot_id__in=bot_ids).delete()
+            self.level_summary_model.objects.bulk_create(level_rows)
+            self.bot_summary_model.objects.bulk_create([
+                self.bot_summary_model(bot_id=bot_id, tp_count=totals[bot_id][0], total_profit=totals[bot_id][1])
+                for bot_id in bot_ids
+            ])
+
+        return len(bot_ids)
@@ -0,0 +1,97 @@
+# botcore/status_events.py
+
+import datetime
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+MAX_ATTEMPTS = 5       # ile razy próbujemy dostarczyć zdarzenie do portalu
+RETRY_DELAY = 2.0      # pierwsze opóźnienie ponowienia (s), podwajane przy każdej próbie
+SEND_TIMEOUT = (2, 5)
+
+
+class StatusPublisher:
+    """
+    Wysyłka zmian statusu botów danego brokera do portalu (webhook /bot_status_webhook/).
+    Zdarzenia idą przez kolejkę i jeden wątek w tle - wywołanie nie blokuje logiki bota.
+    Nieudane zdarzenie czeka na ponowienie (backoff) w osobnym kopcu i jest wysyłane
+    dopiero, gdy kolejka jest pusta - awaria portalu nie wstrzymuje pozostałych zdarzeń.
+    """
+
+    def __init__(self, broker_type: str):
+        self.broker_type = broker_type
+        self._events = queue.Queue()   # (seq, event)
+        self._seq = itertools.count()
+        self._latest = {}              # bot_id -> seq ostatniego zgłoszonego zdarzenia
+        self._sender_started = False
+        self._sender_lock = threading.Lock()
+
+    def publish(self, bot_id: int, user_id: int, status: str):
+        """
+        Zgłasza portalowi zmianę statusu bota.
+        """
+        event = {
+            "broker_type": self.broker_type,
+            "bot_id": bot_id,
+            "user_id": user_id,
+            "status": status,
+            "changed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        seq = next(self._seq)
+        self._latest[bot_id] = seq
+        self._ensure_sender()
+        self._events.put((seq, event))
+
+    def _ensure_sender(self):
+        with self._sender_lock:
+            if self._sender_started:
+                return
+            self._sender_started = True
+        threading.Thread(target=self._sender_loop, daemon=True, name=f"bot-status-events-{self.broker_type}").start()
+
+    def _sender_loop(self):
+        session = requests.Session()
+        retries = []  # kopiec (due, seq, event, attempt)
+        while True:
+            timeout = max(0.0, retries[0][0] - time.monotonic()) if retries else None
+            try:
+                seq, event = self._events.get(timeout=timeout)
+                attempt = 0
+            except queue.Empty:
+                _, seq, event, attempt = heapq.heappop(retries)
+                if self._latest.get(event["bot_id"]) != seq:
+                    # Bot zgłosił już nowszy status - stare zdarzenie nie może go nadpisać w portalu
+                    continue
+
+            if self._deliver(session, event, attempt):
+                continue
+            attempt += 1
+            if attempt < MAX_ATTEMPTS:
+                heapq.heappush(retries, (time.monotonic() + RETRY_DELAY * (2 ** (attempt - 1)), seq, event, attempt))
+            else:
+                print(f"[status_events] Nie dostarczono zdarzenia {event} po {MAX_ATTEMPTS} próbach.")
+
+    def _deliver(self, session: requests.Session, event: dict, attempt: int) -> bool:
+        """
+        Jedna próba wysyłki. Zwraca False, gdy warto ponowić (błąd sieci albo 5xx portalu).
+        """
+        url = f"{settings.PORTAL_URL.rstrip('/')}/bot_status_webhook/"
+        headers = {"Authorization": f"Bearer {settings.MICROSERVICE_API_TOKEN}"}
+
+        try:
+            resp = session.post(url, json=event, headers=headers, timeout=SEND_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"[status_events] Błąd wysyłki statusu bota {event['bot_id']}: {e}, próba {attempt + 1}")
+            return False
+
+        if resp.status_code >= 500:
+            print(f"[status_events] Portal zwrócił {resp.status_code} dla bota {event['bot_id']}, próba {attempt + 1}")
+            return False
+        if resp.status_code != 200:
+            print(f"[status_events] Portal odrzucił zdarzenie {event}: {resp.status_code} {resp.text}")
+        return True
@@ -0,0 +1,84 @@
+# botcore/token_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+
+TOKEN_CACHE_SIZE = 1024   # ilu tokenów trzymamy maksymalnie (LRU)
+TOKEN_CACHE_TTL = 300     # po ilu sekundach token jest ponownie sprawdzany w bazie
+
+
+class TokenCache:
+    """
+    Wspólny dla procesu cache: token -> tymczasowy User mikroserwisu.
+    Tokeny czytane są z `profile_model` (UserProfile serwisu: user_id, auth_token).
+    Trafienie nie odpytuje bazy ani nie tworzy nowego obiektu User.
+    Wpisy wygasają po TOKEN_CACHE_TTL (zmiana tokena w innym procesie),
+    a register usuwa je od razu przez invalidate_user().
+    """
+
+    def __init__(self, profile_model, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.profile_model = profile_model
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (user, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, user: User):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """
+        Usuwa wszystkie tokeny danego usera (np. po zmianie tokena w register).
+        """
+        user_id = int(user_id)
+        with self._lock:
+            for key in [k for k, (user, _) in self._entries.items() if user.id == user_id]:
+                del self._entries[key]
+
+    def user_for_token(self, key: str):
+        """
+        Zwraca usera dla tokena z UserProfile albo None, gdy token jest nieznany.
+        """
+        user = self.get(key)
+        if user is not None:
+            return user
+
+        user_id = self.profile_model.objects.filter(auth_token=key).values_list('user_id', flat=True).first()
+        if user_id is None:
+            return None
+
+        user = _microservice_user(user_id)
+        self.set(key, user)
+        return user
+
+
+def _microservice_user(user_id: int) -> User:
+    # Tymczasowy obiekt User z biblioteki Django (nie zapisywany w bazie)
+    user_mock = User(
+        id=user_id,
+        username=f"micro_{user_id}",
+        is_active=True,
+        is_staff=True,
+        is_superuser=True
+    )
+    user_mock.set_unusable_password()
+    return user_mock
@@ -0,0 +1,216 @@
+# botcore/xtb_transport.py
+
+import asyncio
+import datetime
+import itertools
+import json
+import time
+
+# Po ilu sekundach przestajemy czekać na odpowiedź na komendę (łącznie z czasem w kolejce)
+XTB_COMMAND_TIMEOUT = 15
+
+# XTB wymaga odstępu min. 200 ms między komendami na jednym połączeniu
+# i zrywa połączenia, które go notorycznie łamią.
+XTB_COMMAND_RATE = 5.0     # ile komend na sekundę (uzupełnianie kubełka)
+XTB_COMMAND_BURST = 1      # pojemność kubełka - 1 = równe odstępy, bez serii
+
+# Klasy priorytetów (mniejsza liczba = wcześniej)
+PRIORITY_TRADE = 0         # tradeTransaction, login
+PRIORITY_QUOTE = 1         # getSymbol, getTrades
+PRIORITY_HOUSEKEEPING = 2  # ping
+
+PRIORITY_NAMES = {
+    PRIORITY_TRADE: "trade",
+    PRIORITY_QUOTE: "quote",
+    PRIORITY_HOUSEKEEPING: "housekeeping",
+}
+
+
+class TokenBucket:
+    """
+    Kubełek żetonów: `rate` żetonów na sekundę, najwyżej `capacity` naraz.
+    """
+
+    def __init__(self, rate: float = XTB_COMMAND_RATE, capacity: float = XTB_COMMAND_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Ile sekund do dostępności jednego żetonu (0 = dostępny teraz)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class _WaitStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": self.count,
+            "avg_wait_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "max_wait_ms": round(self.max * 1000, 1),
+        }
+
+
+class XTBChannel:
+    """
+    Multiplekser komend na jednym websockecie XTB.
+    Każda komenda dostaje unikalny `customTag` (XTB odsyła go w odpowiedzi),
+    a jedno zadanie czytające rozdziela odpowiedzi do czekających futures.
+    Dzięki temu np. getSymbol, tradeTransaction i ping mogą być w locie
+    jednocześnie na tym samym połączeniu i żadna korutyna nie odbierze cudzej odpowiedzi.
+
+    Wysyłka idzie przez kolejkę priorytetową i kubełek żetonów (limit XTB):
+    zlecenia wyprzedzają notowania, a notowania - ping, więc czas wysłania
+    zlecenia nie rośnie z liczbą odświeżanych symboli.
+    """
+
+    def __init__(self, ws, label: str = "", rate: float = XTB_COMMAND_RATE, burst: float = XTB_COMMAND_BURST):
+        self.ws = ws
+        self.label = label
+        self.closed = False
+        self._pending = {}  # customTag -> asyncio.Future
+        self._tags = itertools.count(1)
+        self._seq = itertools.count()
+        self._bucket = TokenBucket(rate, burst)
+        self._queue = asyncio.PriorityQueue()  # (priority, seq, enqueued_at, payload, future)
+        self._queued = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: _WaitStats() for p in PRIORITY_NAMES}
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self._sender_task = asyncio.create_task(self._send_loop())
+
+    def _timestamp(self):
+        return datetime.datetime.utcnow().isoformat()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        """
+        Metryki harmonogramu: głębokość kolejki i czas oczekiwania na wysłanie per klasa priorytetu.
+        """
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": {name: self._queued[p] for p, name in PRIORITY_NAMES.items()},
+            "wait": {name: self._waits[p].as_dict() for p, name in PRIORITY_NAMES.items()},
+        }
+
+    async def request(self, msg: dict, priority: int = PRIORITY_QUOTE, timeout: float = XTB_COMMAND_TIMEOUT) -> dict:
+        """
+        Kolejkuje komendę z danym priorytetem i czeka na odpowiedź z tym samym customTag.
+        Rzuca ConnectionError, gdy kanał jest zamknięty, i asyncio.TimeoutError po `timeout`.
+        """
+        if self.closed:
+            raise ConnectionError("XTB channel closed")
+
+        tag = f"{self.label}:{next(self._tags)}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tag] = future
+        self._queued[priority] += 1
+        self._queue.put_nowait((priority, next(self._seq), time.monotonic(), json.dumps({**msg, "customTag": tag}), future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(tag, None)
+
+    async def _send_loop(self):
+        try:
+            while True:
+                item = await self._queue.get()
+                priority, _, enqueued_at, payload, future = item
+
+                wait = self._bucket.wait_time()
+                if wait > 0:
+                    # Odkładamy i czekamy na żeton - po przerwie bierzemy najpilniejszą komendę
+                    self._queue.put_nowait(item)
+                    await asyncio.sleep(wait)
+                    continue
+
+                self._queued[priority] -= 1
+                if future.done():
+                    # Komenda przeterminowana albo anulowana w kolejce - nie wysyłamy
+                    continue
+
+                self._bucket.take()
+                self._waits[priority].add(time.monotonic() - enqueued_at)
+                try:
+                    await self.ws.send(payload)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(ConnectionError(str(e)))
+        except asyncio.CancelledError:
+            return
+
+    async def _read_loop(self):
+        error = None
+        try:
+            while True:
+                msg = json.loads(await self.ws.recv())
+                future = self._pending.get(msg.get("customTag"))
+                if future is None:
+                    print(f"[{self._timestamp()}] [{self.label}] Odpowiedź bez oczekującej komendy: {msg}")
+                elif not future.done():
+                    future.set_result(msg)
+        except asyncio.CancelledError:
+            error = ConnectionError("XTB channel closed")
+        except Exception as e:
+            print(f"[{self._timestamp()}] [{self.label}] Reader error: {e}")
+            error = ConnectionError(str(e))
+        self._fail_pending(error)
+
+    def _fail_pending(self, error: Exception):
+        """
+        Zamyka kanał: zatrzymuje wysyłkę, opróżnia kolejkę i kończy błędem wszystkie czekające komendy.
+        """
+        self.closed = True
+        if self._sender_task and self._sender_task is not asyncio.current_task():
+            self._sender_task.cancel()
+        while True:
+            try:
+                future = self._queue.get_nowait()[4]
+            except asyncio.QueueEmpty:
+                break
+            if not future.done():
+                future.set_exception(error)
+        for priority in self._queued:
+            self._queued[priority] = 0
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def close(self):
+        """
+        Zatrzymuje czytanie i wysyłkę, zamyka websocket; komendy w locie dostają ConnectionError.
+        """
+        self.closed = True
+        for task in (self._reader_task, self._sender_task):
+            if task and task is not asyncio.current_task():
+                task.cancel()
+        self._fail_pending(ConnectionError("XTB channel closed"))
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
@@ -10,21 +10,27 @@ from django.db.models import Q
 from asgiref.sync import sync_to_async
 
 from .models import MicroserviceBot, Trade
-from .xtb_manager import xtb_manager, instrument_prices
+from .broker import publish_bot_status, save_closed_trade
+from .xtb_manager import xtb_manager, instrument_prices, wait_for_tick
+from .bot_state import BotState, get_bot_state, drop_bot_state
 
 # Słownik: bot_id -> asyncio.Lock (aby uniknąć kolizji w obsłudze jednego bota)
 _bot_locks = defaultdict(asyncio.Lock)
 
+# Słownik: bot_id -> asyncio.Task z monitor_price (anulowany przy odłączeniu bota)
+_monitor_tasks = {}
+
 def _timestamp():
     """Generuje aktualny timestamp (UTC)."""
     return datetime.datetime.utcnow().isoformat()
 
-def get_current_price(bot_id: int, symbol: str):
+def get_current_price(symbol: str):
     """
-    Pobiera bieżącą cenę instrumentu z globalnego słownika `instrument_prices`.
+    Pobiera bieżącą cenę instrumentu z globalnego słownika `instrument_prices`
+    (wspólnego dla wszystkich botów obserwujących dany symbol).
     Możesz zwracać np. (ask + bid)/2 lub cokolwiek innego.
     """
-    data = instrument_prices.get((bot_id, symbol), {})
+    data = instrument_prices.get(symbol, {})
     ask = data.get("ask")
     bid = data.get("bid")
     if ask is not None and bid is not None:
@@ -41,136 +47,172 @@ def get_current_price(bot_id: int, symbol: str):
     return None
 
 
-async def monitor_price(bot_id: int, symbol: str, interval: float = 0.5):
+async def monitor_price(bot_id: int, symbol: str, timeout: float = 60.0):
     """
-    Task monitorujący cenę. Gdy cena się zmieni, wywołuje logikę handlu (_apply_levels_logic).
+    Task monitorujący cenę. Śpi do nadejścia ticka dla symbolu (wait_for_tick),
+    a gdy cena się zmieni, wywołuje logikę handlu (_apply_levels_logic).
+    `timeout` to tylko zabezpieczenie - co tyle sekund cena jest sprawdzana mimo braku ticków.
+    Zatrzymany lub usunięty bot jest wyłapywany przez run_main_loop (anuluje ten task);
+    sam monitor kończy się, gdy stan bota w pamięci przestaje być RUNNING (np. FINISHED).
     """
     last_price = None
     while True:
         try:
-            current_price = get_current_price(bot_id, symbol)
-            if current_price is not None:
-                if current_price != last_price:
-                    # Blokada per-bot, by nie wchodzić w kolizje
-                    async with _bot_locks[bot_id]:
-                        # Pobieramy bota z bazy
-                        bot = await sync_to_async(MicroserviceBot.objects.get)(pk=bot_id)
-                        await _apply_levels_logic(bot, current_price)
-                    last_price = current_price
-                    print(f"[{_timestamp()}] [Bot {bot_id}] Updated price: {current_price}")
-                else:
-                    print(f"[{_timestamp()}] [Bot {bot_id}] Price unchanged: {current_price}")
+            current_price = get_current_price(symbol)
+            if current_price is None or current_price == last_price:
+                await wait_for_tick(symbol, timeout)
+                continue
+
+            # Blokada per-bot, by nie wchodzić w kolizje
+            async with _bot_locks[bot_id]:
+                # Stan bota z pamięci (z bazy tylko przy pierwszym ticku)
+                state = await get_bot_state(bot_id)
+                if state is None:
+                    return
+                if state.bot.status != 'RUNNING':
+                    await drop_bot_state(bot_id)
+                    print(f"[{_timestamp()}] [Bot {bot_id}] Status {state.bot.status} - monitor stopped.")
+                    return
+                await _apply_levels_logic(state, current_price)
+            last_price = current_price
+            print(f"[{_timestamp()}] [Bot {bot_id}] Updated price: {current_price}")
         except Exception as e:
             print(f"[ERROR] [Bot {bot_id}] Error in monitoring price: {e}")
             await asyncio.sleep(5)  # Poczekaj chwilę i spróbuj ponownie
 
-        await asyncio.sleep(interval)
-
 
-async def _apply_levels_logic(bot: MicroserviceBot, current_price: float):
+async def _apply_levels_logic(state: BotState, current_price: float):
     """
     Główna logika *grid*:
     - Mamy listę poziomów lv1..lvN i mapę sell_levels: np. lv3 -> lv2.
     - W PASMIE SPRZEDAŻY (top->down) sprawdzamy, czy cena jest na tyle wysoka, by sprzedać otwarty poziom.
     - W PASMIE KUPNA (down->top) sprawdzamy, czy cena jest na tyle niska, by otworzyć (kupić) dany poziom.
     - Dodatkowo, jeśli cena przekroczy lv1, zamykamy wszystkie otwarte pozycje i kończymy bota (FINISHED).
+    Stan poziomów pochodzi z pamięci (BotState); po transakcji zapisujemy go od razu,
+    same zmiany flag trafiają do bazy z opóźnieniem (mark_dirty).
     """
+    bot = state.bot
 
     # 1. Jeśli bot nie ma levels_data albo nie jest RUNNING, nic nie robimy
     if bot.status != "RUNNING":
         return
-    if not bot.levels_data:
+    if not state.data:
         return
 
-    data = json.loads(bot.levels_data)
+    data = state.data
     flags = data.get("flags", {})
-    caps = data.get("caps", {})
-    buy_price = data.get("buy_price", {})
-    buy_volume = data.get("buy_volume", {})
-    sell_levels = data.get("sell_levels", {})
+    grid = state.grid
 
     # 2. Odczyt kursu USDPLN (dla ewentualnej konwersji)
-    usdpln_rate = instrument_prices.get((bot.id, "USDPLN"), {}).get("bid", 1.0)
+    usdpln_rate = instrument_prices.get("USDPLN", {}).get("bid", 1.0)
     if bot.account_currency != bot.asset_currency and abs(usdpln_rate - 1.0) < 1e-9:
         # Brak poprawnego kursu => pomijamy logikę
         return
 
-    # 3. Zbierz poziomy lvX -> cena
-    lv_prices = {}
-    for k, v in data.items():
-        if k.startswith("lv") and isinstance(v, (int, float)):
-            lv_prices[k] = float(v)
-
-    # == SELL PASS (od najwyższej ceny do najniższej) ==
-    sorted_lv_desc = sorted(lv_prices.items(), key=lambda x: x[1], reverse=True)
-    for lv_buy, lv_buy_price in sorted_lv_desc:
-        if lv_buy not in sell_levels:
-            continue
-        lv_sell = sell_levels[lv_buy]  # np. lv4 -> lv3
-        lv_sell_price = lv_prices.get(lv_sell, 0.0)
-
+    # == SELL PASS (od najwyższej ceny do najniższej, tylko poziomy z przekroczonym progiem) ==
+    for lv_buy in grid.sell_candidates(current_price):
         if flags.get(f"{lv_buy}_bought") and not flags.get(f"{lv_buy}_in_progress"):
-            if current_price >= lv_sell_price:
-                flags[f"{lv_buy}_in_progress"] = True
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
-
-                await sell_level(bot, lv_buy, current_price, data, usdpln_rate)
+            flags[f"{lv_buy}_in_progress"] = True
+            filled = await sell_level(bot, lv_buy, current_price, data, usdpln_rate)
+            await _finish_order(state, lv_buy, filled)
 
-                flags[f"{lv_buy}_in_progress"] = False
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
+        if not flags.get(f"{lv_buy}_bought"):
+            grid.sell_done(lv_buy)
 
-    # == BUY PASS (od najniższej ceny do najwyższej) ==
-    sorted_lv_asc = sorted(lv_prices.items(), key=lambda x: x[1])
-    for lv_buy, lv_buy_price in sorted_lv_asc:
+    # == BUY PASS (od najniższej ceny do najwyższej, tylko poziomy z przekroczonym progiem) ==
+    for lv_buy in grid.buy_candidates(current_price):
         if not flags.get(f"{lv_buy}_bought") and not flags.get(f"{lv_buy}_in_progress"):
-            if current_price <= lv_buy_price:
-                flags[f"{lv_buy}_in_progress"] = True
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
-
-                await buy_level(bot, lv_buy, current_price, data, usdpln_rate)
+            flags[f"{lv_buy}_in_progress"] = True
+            filled = await buy_level(bot, lv_buy, current_price, data, usdpln_rate)
+            await _finish_order(state, lv_buy, filled)
 
-                flags[f"{lv_buy}_in_progress"] = False
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
+        if flags.get(f"{lv_buy}_bought"):
+            grid.buy_done(lv_buy)
 
-    # 4. Zapisujemy dotychczasowe zmiany (bo w kolejnym kroku możemy coś modyfikować)
-    bot.levels_data = json.dumps(data)
-    await sync_to_async(bot.save)()
+    grid.advance(current_price)
 
-    # 5. Dodatkowa logika: jeśli current_price > lv1 => zamykamy wszystkie otwarte pozycje i kończymy bota
-    lv1_price = lv_prices.get("lv1")
+    # 3. Dodatkowa logika: jeśli current_price > lv1 => zamykamy wszystkie otwarte pozycje i kończymy bota
+    lv1_price = grid.price_of.get("lv1")
     if lv1_price and current_price > lv1_price:
         # Znajdź wszystkie poziomy, które są otwarte
-        for lv_buy, lv_buy_price in lv_prices.items():
+        for lv_buy in grid.names:
             if flags.get(f"{lv_buy}_bought") and not flags.get(f"{lv_buy}_in_progress"):
                 # Oznacz poziom jako "w trakcie" zamykania, aby uniknąć kolizji
                 flags[f"{lv_buy}_in_progress"] = True
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
+                filled = await sell_level(bot, lv_buy, current_price, data, usdpln_rate)
+                await _finish_order(state, lv_buy, filled)
 
-                # Sprzedaj
-                await sell_level(bot, lv_buy, current_price, data, usdpln_rate)
-
-                flags[f"{lv_buy}_in_progress"] = False
-                bot.levels_data = json.dumps(data)
-                await sync_to_async(bot.save)()
+        # Zlecenie ponawiane w tle albo niezamknięta pozycja - kończymy przy kolejnym ticku
+        if any(flags.get(f"{lv}_bought") or flags.get(f"{lv}_in_progress") for lv in grid.names):
+            return
 
         # Po zamknięciu wszystkich pozycji ustawiamy status bota na FINISHED
-        bot.status = 'FINISHED'
-        bot.levels_data = json.dumps(data)
-        await sync_to_async(bot.save)()
+        await state.flush(status='FINISHED')
+        publish_bot_status(bot.id, bot.user_id, 'FINISHED')
+
+
+async def _persist(state: BotState, filled: bool):
+    """
+    Po wykonanej transakcji zapisujemy stan od razu, zmiany samych flag - z opóźnieniem.
+    """
+    state.mark_dirty()
+    if filled:
+        await state.flush()
+
+
+async def _finish_order(state: BotState, lv_buy: str, filled):
+    """
+    filled=None oznacza zlecenie ponawiane w tle - poziom zostaje "w trakcie",
+    aż wynik przyjdzie przez callbacki z _order_callbacks.
+    """
+    if filled is not None:
+        state.data["flags"][f"{lv_buy}_in_progress"] = False
+    await _persist(state, bool(filled))
+
+
+def _fill_rates(symbol: str, price: float, usdpln_rate: float):
+    """
+    Cena i kurs USDPLN w chwili wykonania zlecenia ponowionego w tle
+    (z wartościami z chwili decyzji jako zapasowymi).
+    """
+    return get_current_price(symbol) or price, instrument_prices.get("USDPLN", {}).get("bid", usdpln_rate)
+
+
+def _order_callbacks(bot_id: int, lv_buy: str, record):
+    """
+    Callbacki dla zlecenia ponawianego w tle. `record(state, resp)` zapisuje wykonaną transakcję.
+    Wołane spoza monitor_price, więc same biorą blokadę bota.
+    """
+    async def on_filled(intent, resp):
+        async with _bot_locks[bot_id]:
+            # Zlecenie jest wykonane w XTB - zapisujemy je nawet, jeśli bota w międzyczasie zatrzymano
+            state = await get_bot_state(bot_id, running_only=False)
+            if state is None:
+                print(f"[ERROR] [Bot {bot_id}] {intent.key} filled, but the bot no longer exists => {resp}")
+                return
+            await record(state, resp)
+            await _finish_order(state, lv_buy, True)
+
+    async def on_failed(intent, resp):
+        async with _bot_locks[bot_id]:
+            state = await get_bot_state(bot_id, running_only=False)
+            if state is None:
+                return
+            print(f"[{_timestamp()}] [Bot {bot_id}] {intent.key} failed after {intent.attempts} attempts => {resp}")
+            # XTBManager ustawia w bazie status ERROR - pętla bota przestaje handlować od razu
+            state.bot.status = 'ERROR'
+            await _finish_order(state, lv_buy, False)
+
+    return on_filled, on_failed
 
 
 async def sell_level(bot: MicroserviceBot, lv_buy: str, current_price: float, data: dict, usdpln_rate: float):
     """
     Pomocnicza funkcja do sprzedawania poziomu lv_buy (cmd=1).
+    Zwraca True, jeśli transakcja została wykonana, False przy porażce
+    i None, gdy zlecenie jest ponawiane w tle (wynik zapisze _record_sell z callbacku).
     """
     flags = data["flags"]
-    caps = data["caps"]
-    buy_price = data["buy_price"]
     buy_volume = data["buy_volume"]
 
     vol = float(buy_volume.get(lv_buy, 0.0))
@@ -178,62 +220,85 @@ async def sell_level(bot: MicroserviceBot, lv_buy: str, current_price: float, da
         # Nic do sprzedania
         flags[f"{lv_buy}_bought"] = False
         flags[f"{lv_buy}_sold"] = True
-        return
+        return False
 
-    resp = await xtb_manager.trade_bot(bot.id, bot.instrument, vol, cmd=1)  # SELL
-    if resp.get("status"):
-        open_p = float(buy_price.get(lv_buy, 0.0))
-        profit_asset = (current_price - open_p) * vol
-        profit_acc = profit_asset
-        if bot.account_currency != bot.asset_currency:
-            profit_acc = profit_asset * usdpln_rate
+    async def record(state, resp):
+        price, rate = _fill_rates(bot.instrument, current_price, usdpln_rate)
+        await _record_sell(state.bot, lv_buy, price, vol, state.data, rate)
 
-        # Odejmij 2% od zysku jako zabezpieczenie przed spreadem i innymi kosztami
-        profit_acc_with_fee = profit_acc * 0.98  # 2% odjęte od zysku
+    on_filled, on_failed = _order_callbacks(bot.id, lv_buy, record)
+    resp = await xtb_manager.trade_bot(bot.id, bot.instrument, vol, cmd=1, level=lv_buy,
+                                       on_filled=on_filled, on_failed=on_failed)  # SELL
+    if resp.get("status"):
+        await _record_sell(bot, lv_buy, current_price, vol, data, usdpln_rate)
+        return True
+    elif resp.get("errorCode") == "RETRY_SCHEDULED":
+        print(f"[{_timestamp()}] [Bot {bot.id}] SELL {lv_buy} retrying in background ({resp.get('intent')})")
+        return None
+    else:
+        print(f"[{_timestamp()}] [Bot {bot.id}] SELL {lv_buy} failed => {resp}")
+        bot.status = 'ERROR'  # XTBManager ustawił już ERROR w bazie
+        return False
 
-        # Dołóż zysk (po odjęciu 2%) do puli lv_buy
-        caps[lv_buy] = float(caps.get(lv_buy, 0.0)) + profit_acc_with_fee
 
-        # Oznacz, że już nie mamy pozycji
-        flags[f"{lv_buy}_bought"] = False
-        flags[f"{lv_buy}_sold"] = True
+async def _record_sell(bot: MicroserviceBot, lv_buy: str, current_price: float, vol: float, data: dict, usdpln_rate: float):
+    """
+    Zapisuje wykonaną sprzedaż poziomu: zysk do puli, flagi i zamknięcie transakcji w bazie.
+    """
+    flags = data["flags"]
+    caps = data["caps"]
+    buy_price = data["buy_price"]
 
-        # Znajdź w DB transakcję OPEN i zamknij
-        trade_qs = await sync_to_async(Trade.objects.filter)(bot=bot, level=lv_buy, status='OPEN')
-        if await sync_to_async(trade_qs.exists)():
-            t = await sync_to_async(trade_qs.first)()
-            t.close_price = Decimal(str(current_price))
-            t.profit = Decimal(str(profit_acc_with_fee))  # Zapisujemy zysk po odjęciu 2%
-            t.close_time = datetime.datetime.utcnow()
-            t.status = 'SOLD'
-            await sync_to_async(t.save)()
-        else:
-            # Na wypadek gdyby nie było w bazie
-            await sync_to_async(Trade.objects.create)(
-                bot=bot,
-                level=lv_buy,
-                open_price=Decimal(str(open_p)),
-                close_price=Decimal(str(current_price)),
-                profit=Decimal(str(profit_acc_with_fee)),  # Zapisujemy zysk po odjęciu 2%
-                status='SOLD'
-            )
-        print(f"[{_timestamp()}] [Bot {bot.id}] SELL {lv_buy}, volume={vol}, profit={profit_acc_with_fee:.2f} (after 2% fee)")
+    open_p = float(buy_price.get(lv_buy, 0.0))
+    profit_asset = (current_price - open_p) * vol
+    profit_acc = profit_asset
+    if bot.account_currency != bot.asset_currency:
+        profit_acc = profit_asset * usdpln_rate
+
+    # Odejmij 2% od zysku jako zabezpieczenie przed spreadem i innymi kosztami
+    profit_acc_with_fee = profit_acc * 0.98  # 2% odjęte od zysku
+
+    # Dołóż zysk (po odjęciu 2%) do puli lv_buy
+    caps[lv_buy] = float(caps.get(lv_buy, 0.0)) + profit_acc_with_fee
+
+    # Oznacz, że już nie mamy pozycji
+    flags[f"{lv_buy}_bought"] = False
+    flags[f"{lv_buy}_sold"] = True
+
+    # Znajdź w DB transakcję OPEN i zamknij
+    trade_qs = await sync_to_async(Trade.objects.filter)(bot=bot, level=lv_buy, status='OPEN')
+    if await sync_to_async(trade_qs.exists)():
+        t = await sync_to_async(trade_qs.first)()
+        t.close_price = Decimal(str(current_price))
+        t.profit = Decimal(str(profit_acc_with_fee))  # Zapisujemy zysk po odjęciu 2%
+        t.close_time = datetime.datetime.utcnow()
+        t.status = 'SOLD'
+        await sync_to_async(save_closed_trade)(t)
     else:
-        print(f"[{_timestamp()}] [Bot {bot.id}] SELL {lv_buy} failed => {resp}")
+        # Na wypadek gdyby nie było w bazie
+        await sync_to_async(save_closed_trade)(Trade(
+            bot=bot,
+            level=lv_buy,
+            open_price=Decimal(str(open_p)),
+            close_price=Decimal(str(current_price)),
+            profit=Decimal(str(profit_acc_with_fee)),  # Zapisujemy zysk po odjęciu 2%
+            status='SOLD'
+        ))
+    print(f"[{_timestamp()}] [Bot {bot.id}] SELL {lv_buy}, volume={vol}, profit={profit_acc_with_fee:.2f} (after 2% fee)")
+
 
 async def buy_level(bot: MicroserviceBot, lv_buy: str, current_price: float, data: dict, usdpln_rate: float):
     """
     Pomocnicza funkcja do kupowania poziomu lv_buy (cmd=0).
+    Zwraca True, jeśli transakcja została wykonana, False przy porażce
+    i None, gdy zlecenie jest ponawiane w tle (wynik zapisze _record_buy z callbacku).
     """
-    flags = data["flags"]
     caps = data["caps"]
-    buy_price = data["buy_price"]
-    buy_volume = data["buy_volume"]
 
     portion_acc = float(caps.get(lv_buy, 0.0))  # kapitał w walucie konta
     if portion_acc <= 1e-9:
         # Brak środków? nic nie kupujemy
-        return
+        return False
 
     portion_asset = portion_acc
     if bot.account_currency != bot.asset_currency:
@@ -241,25 +306,45 @@ async def buy_level(bot: MicroserviceBot, lv_buy: str, current_price: float, dat
 
     vol = round(portion_asset / current_price, 4)
     if vol <= 1e-9:
-        return
+        return False
 
-    resp = await xtb_manager.trade_bot(bot.id, bot.instrument, vol, cmd=0)  # BUY
-    if resp.get("status"):
-        buy_price[lv_buy] = float(current_price)
-        buy_volume[lv_buy] = float(vol)
-        flags[f"{lv_buy}_bought"] = True
-        flags[f"{lv_buy}_sold"] = False
+    async def record(state, resp):
+        price, _ = _fill_rates(bot.instrument, current_price, usdpln_rate)
+        await _record_buy(state.bot, lv_buy, price, vol, state.data)
 
-        # Dodaj wpis w modelu Trade
-        await sync_to_async(Trade.objects.create)(
-            bot=bot,
-            level=lv_buy,
-            open_price=Decimal(str(current_price)),
-            status='OPEN'
-        )
-        print(f"[{_timestamp()}] [Bot {bot.id}] BUY {lv_buy}, volume={vol}")
+    on_filled, on_failed = _order_callbacks(bot.id, lv_buy, record)
+    resp = await xtb_manager.trade_bot(bot.id, bot.instrument, vol, cmd=0, level=lv_buy,
+                                       on_filled=on_filled, on_failed=on_failed)  # BUY
+    if resp.get("status"):
+        await _record_buy(bot, lv_buy, current_price, vol, data)
+        return True
+    elif resp.get("errorCode") == "RETRY_SCHEDULED":
+        print(f"[{_timestamp()}] [Bot {bot.id}] BUY {lv_buy} retrying in background ({resp.get('intent')})")
+        return None
     else:
         print(f"[{_timestamp()}] [Bot {bot.id}] BUY {lv_buy} failed => {resp}")
+        bot.status = 'ERROR'  # XTBManager ustawił już ERROR w bazie
+        return False
+
+
+async def _record_buy(bot: MicroserviceBot, lv_buy: str, current_price: float, vol: float, data: dict):
+    """
+    Zapisuje wykonany zakup poziomu: cena/wolumen, flagi i transakcja OPEN w bazie.
+    """
+    flags = data["flags"]
+    data["buy_price"][lv_buy] = float(current_price)
+    data["buy_volume"][lv_buy] = float(vol)
+    flags[f"{lv_buy}_bought"] = True
+    flags[f"{lv_buy}_sold"] = False
+
+    # Dodaj wpis w modelu Trade
+    await sync_to_async(Trade.objects.create)(
+        bot=bot,
+        level=lv_buy,
+        open_price=Decimal(str(current_price)),
+        status='OPEN'
+    )
+    print(f"[{_timestamp()}] [Bot {bot.id}] BUY {lv_buy}, volume={vol}")
 
 
 async def run_main_loop():
@@ -274,22 +359,31 @@ async def run_main_loop():
         bots = await sync_to_async(list)(MicroserviceBot.objects.filter(status='RUNNING'))
         active_bot_ids = {bot.id for bot in bots}
 
-        # Odłącz boty, które nie są już RUNNING
-        for bot_id in list(xtb_manager._connections.keys()):
+        # Odłącz boty, które nie są już RUNNING (także te z samym taskiem monitora)
+        for bot_id in set(xtb_manager._connections) | set(_monitor_tasks):
             if bot_id not in active_bot_ids:
+                # Najpierw zatrzymujemy monitor - inaczej kolejny tick wczytałby stan bota od nowa
+                task = _monitor_tasks.pop(bot_id, None)
+                if task:
+                    task.cancel()
                 await xtb_manager.disconnect_bot(bot_id)
+                await drop_bot_state(bot_id)
                 print(f"[{_timestamp()}] [Bot {bot_id}] Disconnected due to inactivity.")
 
         # Podłącz nowe boty (jeszcze nieposiadające połączenia w xtb_manager)
         for bot in bots:
             if bot.id not in xtb_manager._connections:
                 ok = await xtb_manager.connect_bot(bot.id)
-                if ok:
-                    print(f"[{_timestamp()}] [Bot {bot.id}] XTB connected.")
-                    # Uruchamiamy task monitor_price, by nasłuchiwał zmian ceny
-                    asyncio.create_task(monitor_price(bot.id, bot.instrument))
-                else:
+                if not ok:
                     print(f"[{_timestamp()}] [Bot {bot.id}] Failed to connect.")
+                    continue
+                print(f"[{_timestamp()}] [Bot {bot.id}] XTB connected.")
+
+            # Uruchamiamy task monitor_price, by nasłuchiwał zmian ceny
+            # (także ponownie, gdy poprzedni zakończył się, a bota wznowiono przed odłączeniem)
+            task = _monitor_tasks.get(bot.id)
+            if task is None or task.done():
+                _monitor_tasks[bot.id] = asyncio.create_task(monitor_price(bot.id, bot.instrument))
 
         await asyncio.sleep(10)
 
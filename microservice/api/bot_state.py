@@ -0,0 +1,121 @@
+# api/bot_state.py
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+
+from .models import MicroserviceBot
+from .level_grid import LevelGrid
+
+# Po ilu sekundach zapisujemy do bazy zmiany samych flag (kolejne zmiany w tym oknie są łączone)
+FLUSH_DELAY = 2.0
+
+
+class BotState:
+    """
+    Stan bota trzymany w pamięci workera (wczytany z bazy raz).
+    `data` to zdekodowane levels_data i jest źródłem prawdy dla logiki grid;
+    do bazy trafia przez write-behind:
+      - mark_dirty() - zmiana samych flag, zapis odroczony o FLUSH_DELAY,
+      - flush()      - natychmiastowy zapis (np. po wykonanej transakcji).
+    """
+
+    def __init__(self, bot: MicroserviceBot):
+        self.bot = bot
+        self.data = json.loads(bot.levels_data) if bot.levels_data else {}
+        self.grid = LevelGrid(self.data) if self.data else None
+        # Zlecenia ponawiane w tle żyją tylko w pamięci workera - po restarcie
+        # flaga "w trakcie" z bazy nie ma już właściciela i blokowałaby poziom na zawsze.
+        flags = self.data.get("flags", {})
+        for key in [k for k, v in flags.items() if k.endswith("_in_progress") and v]:
+            flags[key] = False
+        self._dirty = False
+        self._flush_task = None
+        self._pending_fields = {}
+        # levels_data w postaci ostatnio zapisanej do bazy - mark_dirty() porównuje z nim stan
+        self._saved = json.dumps(self.data)
+
+    def mark_dirty(self):
+        """
+        Planuje zapis, jeśli stan różni się od zapisanego (np. flaga _in_progress
+        ustawiona i zdjęta w tym samym ticku nie powoduje UPDATE).
+        """
+        if json.dumps(self.data) == self._saved:
+            return
+        self._dirty = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done() or self._flush_task is asyncio.current_task():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        try:
+            await self.flush()
+        except Exception as e:
+            # flush() zaplanował już kolejną próbę
+            print(f"[ERROR] [Bot {self.bot.id}] Write-behind flush failed: {e}")
+
+    async def flush(self, **fields):
+        """
+        Zapisuje levels_data (i ewentualnie podane pola, np. status='FINISHED')
+        jednym UPDATE tylko tych kolumn. Przy błędzie zmiany zostają oznaczone
+        jako niezapisane i zapis jest ponawiany po FLUSH_DELAY.
+        """
+        self._pending_fields.update(fields)
+        if not self._dirty and not self._pending_fields:
+            return
+        fields = self._pending_fields
+        self._pending_fields = {}
+        self._dirty = False
+        for name, value in fields.items():
+            setattr(self.bot, name, value)
+        levels_data = json.dumps(self.data)
+        try:
+            await sync_to_async(
+                MicroserviceBot.objects.filter(pk=self.bot.id).update
+            )(levels_data=levels_data, **fields)
+        except Exception:
+            self._dirty = True
+            self._pending_fields = {**fields, **self._pending_fields}
+            self._schedule_flush()
+            raise
+        self.bot.levels_data = levels_data
+        self._saved = levels_data
+
+
+# Słownik: bot_id -> BotState
+_bot_states = {}
+
+
+async def get_bot_state(bot_id: int, running_only: bool = True):
+    """
+    Zwraca stan bota z pamięci, przy pierwszym użyciu wczytuje go z bazy.
+    Do pamięci trafiają tylko boty RUNNING - dla zatrzymanego bota zwraca None
+    (a przy running_only=False stan wczytany jednorazowo, bez zapamiętywania,
+    np. żeby zapisać wynik zlecenia wykonanego już po zatrzymaniu bota).
+    """
+    state = _bot_states.get(bot_id)
+    if state is not None:
+        return state
+
+    bot = await sync_to_async(MicroserviceBot.objects.filter(pk=bot_id).first)()
+    if bot is None:
+        return None
+    if bot.status != 'RUNNING':
+        return None if running_only else BotState(bot)
+    state = _bot_states[bot_id] = BotState(bot)
+    return state
+
+
+async def drop_bot_state(bot_id: int):
+    """
+    Usuwa stan bota z pamięci, zapisując wcześniej niezapisane zmiany.
+    """
+    state = _bot_states.pop(bot_id, None)
+    if state:
+        if state._flush_task:
+            state._flush_task.cancel()
+        await state.flush()
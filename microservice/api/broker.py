@@ -0,0 +1,31 @@
+# api/broker.py
+"""
+Wspólne moduły botcore podpięte do modeli serwisu XTB.
+"""
+
+from botcore.columnar_export import TradeExport
+from botcore.pnl import PnlSummary
+from botcore.status_events import StatusPublisher
+from botcore.token_cache import TokenCache
+
+from .models import MicroserviceBot, Trade, BotPnlSummary, LevelPnlSummary, UserProfile
+
+BROKER_TYPE = "XTB"
+
+status_events = StatusPublisher(BROKER_TYPE)
+publish_bot_status = status_events.publish
+
+pnl = PnlSummary(MicroserviceBot, Trade, BotPnlSummary, LevelPnlSummary,
+                 closed_filter={"status": "SOLD"}, level_field="level")
+save_closed_trade = pnl.save_closed_trade
+rebuild_pnl_summary = pnl.rebuild
+
+token_cache = TokenCache(UserProfile)
+user_for_token = token_cache.user_for_token
+
+trade_export = TradeExport(
+    BROKER_TYPE, MicroserviceBot, Trade, date_field="open_time",
+    # bot_id, level, side, quantity, open_price, close_price, profit, status, opened_at, closed_at
+    fields=("bot_id", "level", None, None, "open_price", "close_price", "profit", "status", "open_time", "close_time"),
+)
+user_trades = trade_export.user_trades
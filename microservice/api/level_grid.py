@@ -0,0 +1,83 @@
+# api/level_grid.py
+
+from bisect import bisect_left, bisect_right
+
+
+class LevelGrid:
+    """
+    Posortowana siatka poziomów bota (budowana raz z levels_data).
+
+    Zamiast przechodzić po wszystkich poziomach przy każdym ticku, szukamy
+    binarnie (bisect) tylko tych, których próg znalazł się między poprzednią
+    a bieżącą ceną:
+      - KUPNO: warunek current_price <= cena poziomu,
+      - SPRZEDAŻ: warunek current_price >= cena poziomu sprzedaży (sell_levels).
+    Poziomy, które spełniły warunek, ale nie zmieniły stanu (np. nieudane zlecenie),
+    zostają w zbiorze "pending" i są sprawdzane w kolejnych tickach, dopóki warunek trwa.
+    """
+
+    def __init__(self, levels_data: dict):
+        levels = sorted(
+            (float(v), k) for k, v in levels_data.items()
+            if k.startswith("lv") and isinstance(v, (int, float))
+        )
+        self.prices = [p for p, _ in levels]
+        self.names = [k for _, k in levels]
+        self.price_of = {k: p for p, k in levels}
+
+        # Progi sprzedaży: lv_buy sprzedajemy, gdy cena dojdzie do ceny lv_sell
+        sell_levels = levels_data.get("sell_levels", {})
+        sells = sorted(
+            (self.price_of.get(lv_sell, 0.0), lv_buy)
+            for lv_buy, lv_sell in sell_levels.items()
+            if lv_buy in self.price_of
+        )
+        self.sell_prices = [p for p, _ in sells]
+        self.sell_names = [k for _, k in sells]
+        self.sell_price_of = {k: p for p, k in sells}
+
+        self.last_price = None
+        self._pending_buy = set()
+        self._pending_sell = set()
+
+    def buy_candidates(self, current_price: float):
+        """
+        Poziomy do sprawdzenia w PAŚMIE KUPNA (od najniższej ceny do najwyższej).
+        """
+        lo = bisect_left(self.prices, current_price)
+        if self.last_price is None:
+            hi = len(self.prices)
+        elif current_price < self.last_price:
+            hi = bisect_left(self.prices, self.last_price)
+        else:
+            hi = lo
+        self._pending_buy.update(self.names[lo:hi])
+        self._pending_buy = {lv for lv in self._pending_buy if current_price <= self.price_of[lv]}
+        return sorted(self._pending_buy, key=self.price_of.get)
+
+    def sell_candidates(self, current_price: float):
+        """
+        Poziomy do sprawdzenia w PAŚMIE SPRZEDAŻY (od najwyższej ceny poziomu do najniższej).
+        """
+        hi = bisect_right(self.sell_prices, current_price)
+        if self.last_price is None:
+            lo = 0
+        elif current_price > self.last_price:
+            lo = bisect_right(self.sell_prices, self.last_price)
+        else:
+            lo = hi
+        self._pending_sell.update(self.sell_names[lo:hi])
+        self._pending_sell = {lv for lv in self._pending_sell if current_price >= self.sell_price_of[lv]}
+        return sorted(self._pending_sell, key=self.price_of.get, reverse=True)
+
+    def buy_done(self, lv: str):
+        self._pending_buy.discard(lv)
+
+    def sell_done(self, lv: str):
+        self._pending_sell.discard(lv)
+
+    def advance(self, current_price: float):
+        """
+        Zapamiętuje cenę, od której liczymy przecięcia w następnym ticku.
+        """
+        self.last_price = current_price
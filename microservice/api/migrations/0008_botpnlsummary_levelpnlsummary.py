@@ -0,0 +1,71 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_summaries(apps, schema_editor):
+    """
+    Wypełnia podsumowania P&L z istniejącej historii transakcji.
+    """
+    Trade = apps.get_model('api', 'Trade')
+    BotPnlSummary = apps.get_model('api', 'BotPnlSummary')
+    LevelPnlSummary = apps.get_model('api', 'LevelPnlSummary')
+
+    rows = Trade.objects.filter(status='SOLD').values('bot_id', 'level').annotate(
+        tp=Count('id'),
+        profit=Sum('profit')
+    )
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    level_rows = []
+    for row in rows:
+        profit = row['profit'] or Decimal("0")
+        level_rows.append(LevelPnlSummary(
+            bot_id=row['bot_id'], level=row['level'], tp_count=row['tp'], total_profit=profit
+        ))
+        totals[row['bot_id']][0] += row['tp']
+        totals[row['bot_id']][1] += profit
+
+    LevelPnlSummary.objects.bulk_create(level_rows)
+    BotPnlSummary.objects.bulk_create([
+        BotPnlSummary(bot_id=bot_id, tp_count=tp, total_profit=profit)
+        for bot_id, (tp, profit) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_remove_microservicebot_min_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotPnlSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tp_count', models.PositiveIntegerField(default=0)),
+                ('total_profit', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pnl_summary', to='api.microservicebot')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LevelPnlSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(max_length=10)),
+                ('tp_count', models.PositiveIntegerField(default=0)),
+                ('total_profit', models.DecimalField(decimal_places=8, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='level_pnl', to='api.microservicebot')),
+            ],
+            options={
+                'unique_together': {('bot', 'level')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_botpnlsummary_levelpnlsummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='auth_token',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='microservicebot',
+            index=models.Index(fields=['status'], name='api_bot_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='microservicebot',
+            index=models.Index(fields=['user_id', 'status'], name='api_bot_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['bot', 'level', 'status'], name='api_trade_bot_lvl_status_idx'),
+        ),
+    ]
@@ -9,7 +9,7 @@ class UserProfile(models.Model):
     user_id = models.IntegerField(unique=True)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     reserved_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    auth_token = models.CharField(max_length=255, blank=True, null=True)
+    auth_token = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     def __str__(self):
         return f"UserProfile(user_id={self.user_id}, balance={self.balance}, reserved={self.reserved_balance})"
 
@@ -41,6 +41,13 @@ class MicroserviceBot(models.Model):
     levels_data = models.TextField(blank=True, null=True)  # Zapis wolumenów dla poziomów
     xtb_login = models.CharField(max_length=50, blank=True, null=True)
     xtb_password_enc = models.BinaryField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='api_bot_status_idx'),
+            models.Index(fields=['user_id', 'status'], name='api_bot_user_status_idx'),
+        ]
+
     def __str__(self):
         return f"MicroserviceBot {self.name} (user={self.user_id}, {self.instrument}, {self.status})"
 
@@ -74,6 +81,34 @@ class MicroserviceBot(models.Model):
             total_profit=models.Sum('profit')
         )['total_profit'] or 0.0
 
+    def get_level_stats(self):
+        """
+        Zwraca słownik {nazwa poziomu: {'tp': liczba TP, 'profit': zysk}}.
+        Czyta gotowe wiersze LevelPnlSummary (po jednym na poziom); bez nich
+        (np. przed rebuild_pnl_summary) liczy je jednym zapytaniem GROUP BY level.
+        """
+        stats = {
+            row.level: {
+                'tp': row.tp_count,
+                'profit': float(row.total_profit)
+            }
+            for row in self.level_pnl.all()
+        }
+        if stats:
+            return stats
+
+        qs = self.trade_set.filter(status='SOLD').values('level').annotate(
+            tp=models.Count('id'),
+            total_profit=models.Sum('profit')
+        )
+        return {
+            item['level']: {
+                'tp': item['tp'],
+                'profit': float(item['total_profit'] or 0)
+            }
+            for item in qs
+        }
+
 class Trade(models.Model):
     STATUS_CHOICES = [
         ('OPEN', 'Open'),
@@ -89,10 +124,47 @@ class Trade(models.Model):
     close_time = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OPEN')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['bot', 'level', 'status'], name='api_trade_bot_lvl_status_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if self.close_price and not self.profit:
             self.profit = self.close_price - self.open_price  # Przykładowa kalkulacja zysku
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.bot.name} - {self.level} - {self.status}"
\ No newline at end of file
+        return f"{self.bot.name} - {self.level} - {self.status}"
+
+
+class BotPnlSummary(models.Model):
+    """
+    Zmaterializowane podsumowanie P&L bota: liczba TP i łączny zysk.
+    Aktualizowane w tej samej transakcji co zapis zamkniętej transakcji (broker.save_closed_trade),
+    odbudowywane z historii komendą rebuild_pnl_summary.
+    """
+    bot = models.OneToOneField(MicroserviceBot, on_delete=models.CASCADE, related_name='pnl_summary')
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"BotPnlSummary(bot_id={self.bot_id}, tp={self.tp_count}, profit={self.total_profit})"
+
+
+class LevelPnlSummary(models.Model):
+    """
+    Podsumowanie P&L jednego poziomu bota (jeden wiersz na poziom).
+    """
+    bot = models.ForeignKey(MicroserviceBot, on_delete=models.CASCADE, related_name='level_pnl')
+    level = models.CharField(max_length=10)
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('bot', 'level')
+
+    def __str__(self):
+        return f"LevelPnlSummary(bot_id={self.bot_id}, {self.level}, tp={self.tp_count}, profit={self.total_profit})"
@@ -0,0 +1,161 @@
+# api/order_pipeline.py
+
+import asyncio
+import datetime
+import uuid
+
+ORDER_MAX_ATTEMPTS = 5     # łączna liczba prób wysłania zlecenia
+ORDER_BACKOFF_BASE = 5     # opóźnienie pierwszego ponowienia (s), podwajane przy każdej próbie
+ORDER_BACKOFF_MAX = 300
+
+# Błędy, przy których ponawianie nie ma sensu: złe parametry zlecenia, brak środków,
+# zablokowany login/instrument, zakaz pozycji przeciwnych/krótkich.
+FATAL_ERROR_CODES = {
+    "BE002", "BE003", "BE004", "BE005", "BE007", "BE009", "BE011", "BE012", "BE018",
+}
+# Wynik niepewny - zlecenie mogło dotrzeć do XTB mimo braku odpowiedzi.
+# Przed ponowieniem sprawdzamy po kluczu idempotencji, czy pozycja już istnieje.
+AMBIGUOUS_ERROR_CODES = {"CONNECTION_ERROR", "TIMEOUT"}
+
+
+def classify_error(resp: dict) -> str:
+    """
+    Klasyfikuje nieudaną odpowiedź: "fatal", "ambiguous" albo "retryable"
+    (m.in. NO_PRICE, NOT_CONNECTED, requote/zmiana ceny, zbyt częste zlecenia, rynek zamknięty).
+    """
+    code = (resp or {}).get("errorCode")
+    if code in FATAL_ERROR_CODES:
+        return "fatal"
+    if code in AMBIGUOUS_ERROR_CODES:
+        return "ambiguous"
+    return "retryable"
+
+
+def backoff(attempts: int) -> float:
+    return min(ORDER_BACKOFF_BASE * (2 ** (attempts - 1)), ORDER_BACKOFF_MAX)
+
+
+class OrderIntent:
+    """
+    Zamiar złożenia zlecenia dla poziomu bota.
+    `key` to klucz idempotencji - trafia do customComment zlecenia w XTB,
+    więc po niepewnej próbie można sprawdzić, czy zlecenie już zostało wykonane.
+    """
+
+    def __init__(self, bot_id: int, level: str, symbol: str, volume: float, cmd: int,
+                 on_filled=None, on_failed=None):
+        self.bot_id = bot_id
+        self.level = level
+        self.symbol = symbol
+        self.volume = volume
+        self.cmd = cmd
+        self.on_filled = on_filled  # async (intent, resp) - wołane po wykonaniu w tle
+        self.on_failed = on_failed  # async (intent, resp) - wołane po ostatecznej porażce w tle
+        self.key = f"grid-{bot_id}-{level}-{'B' if cmd == 0 else 'S'}-{uuid.uuid4().hex[:8]}"
+        self.attempts = 0
+        self.ambiguous = False
+        self.last_response = None
+        self.task = None
+
+    @property
+    def slot(self):
+        return (self.bot_id, self.level, self.cmd)
+
+
+def _timestamp():
+    return datetime.datetime.utcnow().isoformat()
+
+
+class OrderPipeline:
+    """
+    Kolejka zamiarów zleceń z własnym harmonogramem ponowień.
+    Pierwsza próba idzie od razu (wynik wraca do wołającego). Jeśli błąd da się ponowić,
+    zamiar trafia do zadania w tle (backoff wykładniczy), a wołający dostaje RETRY_SCHEDULED
+    i nie czeka - pętla bota obsługuje w tym czasie kolejne ticki i inne poziomy.
+    Na jeden (bot, poziom, kierunek) przypada najwyżej jeden aktywny zamiar.
+    """
+
+    def __init__(self, execute, lookup):
+        self._execute = execute  # async (intent) -> resp
+        self._lookup = lookup    # async (intent) -> resp albo None (szukanie zlecenia po intent.key)
+        self._intents = {}       # slot -> OrderIntent
+
+    def pending(self, bot_id: int = None):
+        return [i for i in self._intents.values() if bot_id is None or i.bot_id == bot_id]
+
+    async def submit(self, intent: OrderIntent) -> dict:
+        existing = self._intents.get(intent.slot)
+        if existing:
+            return {"status": False, "errorCode": "RETRY_SCHEDULED", "intent": existing.key}
+
+        resp = await self._attempt(intent)
+        if resp.get("status") or classify_error(resp) == "fatal" or intent.attempts >= ORDER_MAX_ATTEMPTS:
+            return resp
+
+        self._intents[intent.slot] = intent
+        intent.task = asyncio.create_task(self._retry_loop(intent))
+        return {
+            "status": False,
+            "errorCode": "RETRY_SCHEDULED",
+            "errorDescr": resp.get("errorDescr"),
+            "intent": intent.key,
+        }
+
+    async def _attempt(self, intent: OrderIntent) -> dict:
+        if intent.ambiguous:
+            # Poprzednia próba mogła przejść - nie składamy zlecenia drugi raz
+            try:
+                found = await self._lookup(intent)
+            except Exception as e:
+                intent.attempts += 1
+                intent.last_response = {"status": False, "errorCode": "CONNECTION_ERROR", "errorDescr": str(e)}
+                return intent.last_response
+            if found:
+                print(f"[{_timestamp()}] [Bot {intent.bot_id}] Zlecenie {intent.key} już wykonane - bez ponowienia.")
+                return found
+            intent.ambiguous = False
+
+        intent.attempts += 1
+        try:
+            resp = await self._execute(intent)
+        except Exception as e:
+            resp = {"status": False, "errorCode": "CONNECTION_ERROR", "errorDescr": str(e)}
+
+        if not resp.get("status") and classify_error(resp) == "ambiguous":
+            intent.ambiguous = True
+        intent.last_response = resp
+        return resp
+
+    async def _retry_loop(self, intent: OrderIntent):
+        try:
+            while intent.attempts < ORDER_MAX_ATTEMPTS:
+                delay = backoff(intent.attempts)
+                print(f"[{_timestamp()}] [Bot {intent.bot_id}] {intent.key}: próba {intent.attempts} nieudana "
+                      f"({intent.last_response.get('errorCode')}), ponowienie za {delay}s")
+                await asyncio.sleep(delay)
+
+                resp = await self._attempt(intent)
+                if resp.get("status"):
+                    if intent.on_filled:
+                        await intent.on_filled(intent, resp)
+                    return
+                if classify_error(resp) == "fatal":
+                    break
+
+            if intent.on_failed:
+                await intent.on_failed(intent, intent.last_response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] [Bot {intent.bot_id}] Order pipeline error for {intent.key}: {e}")
+        finally:
+            self._intents.pop(intent.slot, None)
+
+    def cancel(self, bot_id: int):
+        """
+        Przerywa ponawianie zleceń bota (np. bot zatrzymany).
+        """
+        for intent in self.pending(bot_id):
+            if intent.task:
+                intent.task.cancel()
+            self._intents.pop(intent.slot, None)
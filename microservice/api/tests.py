@@ -1,3 +1,334 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from botcore import xtb_transport
+from botcore.xtb_transport import (
+    PRIORITY_HOUSEKEEPING, PRIORITY_QUOTE, PRIORITY_TRADE, TokenBucket, XTBChannel,
+)
+
+from . import order_pipeline
+from .level_grid import LevelGrid
+from .models import MicroserviceBot, Trade, UserProfile
+from .order_pipeline import OrderIntent, OrderPipeline, backoff, classify_error
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), "plan format znany tylko dla MySQL/SQLite")
+class HotPathIndexTests(TestCase):
+    """
+    Zapytania z gorącej ścieżki (pętla workerów, autoryzacja tokenem, otwarte transakcje)
+    muszą mieć w planie (EXPLAIN) indeksy z migracji 0009_hot_path_indexes.
+    """
+
+    def assertPlanUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} nie występuje w planie:\n{plan}")
+
+    def test_running_bots_use_status_index(self):
+        self.assertPlanUses(MicroserviceBot.objects.filter(status='RUNNING'), 'api_bot_status_idx')
+
+    def test_user_bots_use_user_status_index(self):
+        self.assertPlanUses(MicroserviceBot.objects.filter(user_id=1, status='RUNNING'), 'api_bot_user_status_idx')
+
+    def test_token_lookup_uses_auth_token_index(self):
+        self.assertPlanUses(UserProfile.objects.filter(auth_token='token'), 'auth_token')
+
+    def test_open_trades_use_composite_index(self):
+        # Przy pustej tabeli planer może wybrać dowolny indeks - potrzebne są dane,
+        # w których sam bot_id jest mało selektywny (wiele poziomów i statusów na bota)
+        bots = [
+            MicroserviceBot.objects.create(
+                user_id=1, name=f'bot{i}', instrument='EURUSD', max_price=100, percent=5, capital=1000
+            )
+            for i in range(2)
+        ]
+        Trade.objects.bulk_create([
+            Trade(bot=bot, level=f'lv{lv}', open_price=100, status=status)
+            for bot in bots for lv in range(10) for status in ('OPEN', 'SOLD') for _ in range(10)
+        ])
+        self.assertPlanUses(Trade.objects.filter(bot_id=bots[0].id, level='lv1', status='OPEN'), 'api_trade_bot_lvl_status_idx')
+
+
+class LevelGridTests(SimpleTestCase):
+
+    def grid(self):
+        return LevelGrid({
+            "lv1": 100.0, "lv2": 90.0, "lv3": 80.0,
+            "sell_levels": {"lv2": "lv1", "lv3": "lv2"},
+            "lv_note": "pomijane - nie liczba",
+        })
+
+    def test_levels_are_sorted_by_price(self):
+        grid = self.grid()
+        self.assertEqual(grid.names, ["lv3", "lv2", "lv1"])
+        self.assertEqual(grid.sell_names, ["lv3", "lv2"])
+        self.assertEqual(grid.sell_price_of, {"lv3": 90.0, "lv2": 100.0})
+
+    def test_first_tick_returns_every_level_at_or_above_price(self):
+        self.assertEqual(self.grid().buy_candidates(85.0), ["lv2", "lv1"])
+
+    def test_falling_price_returns_only_crossed_levels(self):
+        grid = self.grid()
+        for lv in grid.buy_candidates(95.0):
+            grid.buy_done(lv)
+        grid.advance(95.0)
+
+        self.assertEqual(grid.buy_candidates(75.0), ["lv3", "lv2"])
+
+    def test_unfilled_level_stays_pending_while_condition_holds(self):
+        grid = self.grid()
+        grid.buy_candidates(85.0)
+        grid.buy_done("lv1")
+        grid.advance(85.0)
+
+        # lv2 nie został kupiony (np. nieudane zlecenie) - wraca w kolejnym ticku
+        self.assertEqual(grid.buy_candidates(88.0), ["lv2"])
+        grid.advance(88.0)
+        # Cena wyszła ponad poziom - warunek już nie trwa
+        self.assertEqual(grid.buy_candidates(91.0), [])
+
+    def test_rising_price_returns_sells_from_highest_level(self):
+        grid = self.grid()
+        self.assertEqual(grid.sell_candidates(95.0), ["lv3"])
+        grid.advance(95.0)
+
+        self.assertEqual(grid.sell_candidates(101.0), ["lv2", "lv3"])
+        grid.sell_done("lv2")
+        grid.sell_done("lv3")
+        grid.advance(101.0)
+
+        self.assertEqual(grid.sell_candidates(99.0), [])
+
+
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(xtb_transport.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_refills_at_rate(self):
+        bucket = TokenBucket(rate=5.0, capacity=1)
+        self.assertEqual(bucket.wait_time(), 0.0)
+
+        bucket.take()
+        self.assertAlmostEqual(bucket.wait_time(), 0.2)
+        self.now += 0.1
+        self.assertAlmostEqual(bucket.wait_time(), 0.1)
+        self.now += 0.1
+        self.assertEqual(bucket.wait_time(), 0.0)
+
+    def test_idle_time_does_not_exceed_capacity(self):
+        bucket = TokenBucket(rate=5.0, capacity=1)
+        self.now += 60
+        bucket.take()
+        self.assertAlmostEqual(bucket.wait_time(), 0.2)
+
+
+class FakeWebSocket:
+    """
+    Websocket XTB w pamięci: zapisuje wysłane komendy i odpowiada z tym samym customTag.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.replies = asyncio.Queue()
+
+    async def send(self, payload):
+        msg = json.loads(payload)
+        self.sent.append(msg["command"])
+        await self.replies.put({"status": True, "customTag": msg["customTag"], "returnData": msg["command"]})
+
+    async def recv(self):
+        reply = await self.replies.get()
+        if isinstance(reply, Exception):
+            raise reply
+        return json.dumps(reply)
+
+    async def close(self):
+        pass
+
+
+class XTBChannelTests(SimpleTestCase):
+
+    async def test_replies_are_routed_by_custom_tag(self):
+        channel = XTBChannel(FakeWebSocket(), "test", rate=1000, burst=10)
+        responses = await asyncio.gather(
+            channel.request({"command": "getSymbol"}),
+            channel.request({"command": "ping"}, priority=PRIORITY_HOUSEKEEPING),
+        )
+        self.assertEqual([r["returnData"] for r in responses], ["getSymbol", "ping"])
+        self.assertEqual(channel.in_flight, 0)
+        await channel.close()
+
+    async def test_trades_are_sent_before_quotes_and_pings(self):
+        ws = FakeWebSocket()
+        channel = XTBChannel(ws, "test", rate=50, burst=1)
+        # Pierwsza komenda zużywa żeton - kolejne czekają w kolejce na następny
+        first = asyncio.create_task(channel.request({"command": "getTrades"}))
+        while not ws.sent:
+            await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(channel.request({"command": "ping"}, priority=PRIORITY_HOUSEKEEPING)),
+            asyncio.create_task(channel.request({"command": "getSymbol"}, priority=PRIORITY_QUOTE)),
+            asyncio.create_task(channel.request({"command": "tradeTransaction"}, priority=PRIORITY_TRADE)),
+        ]
+        await asyncio.gather(first, *queued)
+
+        self.assertEqual(ws.sent, ["getTrades", "tradeTransaction", "getSymbol", "ping"])
+        stats = channel.stats()
+        self.assertEqual(stats["queue_depth"], {"trade": 0, "quote": 0, "housekeeping": 0})
+        self.assertEqual(stats["wait"]["trade"]["sent"], 1)
+        await channel.close()
+
+    async def test_reader_error_fails_queued_commands(self):
+        ws = FakeWebSocket()
+        channel = XTBChannel(ws, "test", rate=0.001, burst=1)
+        first = asyncio.create_task(channel.request({"command": "getSymbol"}))
+        while not ws.sent:
+            await asyncio.sleep(0)
+        queued = asyncio.create_task(channel.request({"command": "tradeTransaction"}, priority=PRIORITY_TRADE))
+        await asyncio.sleep(0)
+
+        await first
+        await ws.replies.put(ConnectionResetError("socket closed"))
+        with self.assertRaises(ConnectionError):
+            await queued
+
+        self.assertTrue(channel.closed)
+        self.assertEqual(channel.stats()["queue_depth"]["trade"], 0)
+        with self.assertRaises(ConnectionError):
+            await channel.request({"command": "ping"})
+        await channel.close()
+
+
+class OrderPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        # Ponowienia bez czekania
+        patcher = mock.patch.object(order_pipeline, "ORDER_BACKOFF_BASE", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_error_classification(self):
+        self.assertEqual(classify_error({"errorCode": "BE004"}), "fatal")
+        self.assertEqual(classify_error({"errorCode": "TIMEOUT"}), "ambiguous")
+        self.assertEqual(classify_error({"errorCode": "CONNECTION_ERROR"}), "ambiguous")
+        self.assertEqual(classify_error({"errorCode": "NO_PRICE"}), "retryable")
+        self.assertEqual(classify_error(None), "retryable")
+
+    def test_backoff_doubles_up_to_limit(self):
+        with mock.patch.object(order_pipeline, "ORDER_BACKOFF_BASE", 5):
+            self.assertEqual([backoff(n) for n in (1, 2, 3)], [5, 10, 20])
+            self.assertEqual(backoff(20), order_pipeline.ORDER_BACKOFF_MAX)
+
+    def pipeline(self, responses, found=None):
+        calls = []
+
+        async def execute(intent):
+            calls.append(intent.key)
+            resp = responses.pop(0)
+            if isinstance(resp, Exception):
+                raise resp
+            return resp
+
+        async def lookup(intent):
+            return found
+
+        return OrderPipeline(execute, lookup), calls
+
+    def intent(self, events):
+        async def on_filled(intent, resp):
+            events.append(("filled", resp))
+
+        async def on_failed(intent, resp):
+            events.append(("failed", resp))
+
+        return OrderIntent(1, "lv1", "EURUSD", 0.1, 0, on_filled=on_filled, on_failed=on_failed)
+
+    async def test_success_is_returned_to_caller(self):
+        pipeline, calls = self.pipeline([{"status": True, "returnData": {"order": 7}}])
+        resp = await pipeline.submit(self.intent([]))
+        self.assertTrue(resp["status"])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(pipeline.pending(), [])
+
+    async def test_fatal_error_is_not_retried(self):
+        pipeline, calls = self.pipeline([{"status": False, "errorCode": "BE004"}])
+        resp = await pipeline.submit(self.intent([]))
+        self.assertEqual(resp["errorCode"], "BE004")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(pipeline.pending(), [])
+
+    async def test_retryable_error_is_retried_in_background(self):
+        events = []
+        pipeline, calls = self.pipeline([
+            {"status": False, "errorCode": "NO_PRICE"},
+            {"status": False, "errorCode": "BE9999"},
+            {"status": True, "returnData": {"order": 7}},
+        ])
+        intent = self.intent(events)
+
+        resp = await pipeline.submit(intent)
+        self.assertEqual(resp["errorCode"], "RETRY_SCHEDULED")
+        # Drugi zamiar na ten sam poziom i kierunek nie składa kolejnego zlecenia
+        again = await pipeline.submit(self.intent(events))
+        self.assertEqual(again["intent"], intent.key)
+
+        await intent.task
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(events, [("filled", {"status": True, "returnData": {"order": 7}})])
+        self.assertEqual(pipeline.pending(), [])
+
+    async def test_fatal_error_during_retry_reports_failure(self):
+        events = []
+        pipeline, calls = self.pipeline([
+            {"status": False, "errorCode": "NO_PRICE"},
+            {"status": False, "errorCode": "BE005"},
+        ])
+        intent = self.intent(events)
+        await pipeline.submit(intent)
+        await intent.task
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(events, [("failed", {"status": False, "errorCode": "BE005"})])
+
+    async def test_gives_up_after_max_attempts(self):
+        events = []
+        pipeline, calls = self.pipeline([{"status": False, "errorCode": "NO_PRICE"}] * order_pipeline.ORDER_MAX_ATTEMPTS)
+        intent = self.intent(events)
+        await pipeline.submit(intent)
+        await intent.task
+
+        self.assertEqual(len(calls), order_pipeline.ORDER_MAX_ATTEMPTS)
+        self.assertEqual([e[0] for e in events], ["failed"])
+
+    async def test_ambiguous_attempt_is_looked_up_instead_of_resent(self):
+        events = []
+        found = {"status": True, "returnData": {"order": 7}, "recovered": True}
+        pipeline, calls = self.pipeline([ConnectionError("timeout")], found=found)
+        intent = self.intent(events)
+
+        resp = await pipeline.submit(intent)
+        self.assertEqual(resp["errorCode"], "RETRY_SCHEDULED")
+        await intent.task
+
+        # Zlecenie doszło mimo błędu - nie wysyłamy go drugi raz
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(events, [("filled", found)])
+
+    async def test_cancel_stops_retries(self):
+        pipeline, calls = self.pipeline([{"status": False, "errorCode": "NO_PRICE"}])
+        intent = self.intent([])
+        with mock.patch.object(order_pipeline, "ORDER_BACKOFF_BASE", 60):
+            await pipeline.submit(intent)
+            pipeline.cancel(1)
+            with self.assertRaises(asyncio.CancelledError):
+                await intent.task
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(pipeline.pending(), [])
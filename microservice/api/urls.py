@@ -9,6 +9,9 @@ urlpatterns = [
     path('get_bot_details/<int:bot_id>/', views.get_bot_details, name='get_bot_details'), 
     path('register_token/', views.register, name='register_token'),
     path('get_bot_status/<int:bot_id>/', views.get_bot_status, name='get_bot_status'),
+    path('bot_statuses/', views.get_bot_statuses, name='get_bot_statuses'),
     path('export_bot_trades_csv/<int:bot_id>/', views.export_bot_trades_csv, name='export_bot_trades_csv'),
+    path('export_trades/', views.export_trades_columnar, name='export_trades_columnar'),
+    path('export_trades/<int:bot_id>/', views.export_trades_columnar, name='export_bot_trades_columnar'),
     path('check_xtb_connection/<int:bot_id>/', views.check_xtb_connection, name='check_xtb_connection'),
 ]
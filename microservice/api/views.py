@@ -29,7 +29,11 @@ from asgiref.sync import async_to_sync
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from botcore.csv_stream import ROW_CHUNK_SIZE, parse_date_range, filter_date_range, streaming_csv_response
+from botcore.columnar_export import FORMATS, columnar_available, stream_columnar
+from botcore.bot_statuses import bot_statuses_view
+from .broker import token_cache, user_for_token, user_trades
 from django.shortcuts import get_object_or_404
 from api.models import MicroserviceBot
 
@@ -45,11 +49,9 @@ class CustomAuthentication(BaseAuthentication):
     def authenticate(self, request):
         # Pobranie nagłówka Authorization
         auth = get_authorization_header(request).split()
-        print(f"[AUTH] Otrzymany nagłówek Authorization: {auth}")
 
         # Sprawdzenie obecności nagłówka
         if not auth:
-            print("[AUTH] Brak nagłówka Authorization.")
             return None  # brak nagłówka => brak autentykacji
 
         # Sprawdzenie prefixu "Token"
@@ -67,7 +69,6 @@ class CustomAuthentication(BaseAuthentication):
 
         try:
             token_key = auth[1].decode()
-            print(f"[AUTH] Otrzymany token: {token_key}")
         except UnicodeError:
             print("[AUTH] Token zawiera niedozwolone znaki (nie ASCII).")
             raise AuthenticationFailed("Invalid token header. Token must be ASCII.")
@@ -75,30 +76,12 @@ class CustomAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token_key)
 
     def authenticate_credentials(self, key):
-        from .models import UserProfile  # Import lokalny, aby uniknąć błędów cyklicznych
-
-        print(f"[AUTH] Sprawdzanie tokena w bazie danych: {key}")
-        
-        try:
-            # Szukamy tokenu w UserProfile
-            user_profile = UserProfile.objects.get(auth_token=key)
-            print(f"[AUTH] Znaleziono użytkownika z user_id={user_profile.user_id}")
-        except UserProfile.DoesNotExist:
+        # Token -> User z cache w pamięci procesu (baza tylko przy pierwszym użyciu / po TTL)
+        user_mock = user_for_token(key)
+        if user_mock is None:
             print("[AUTH] Nie znaleziono użytkownika z podanym tokenem.")
             raise AuthenticationFailed("Invalid token")
 
-        # Tworzymy tymczasowy obiekt User z biblioteki Django
-        user_mock = User(
-            id=user_profile.user_id,
-            username=f"micro_{user_profile.user_id}",
-            is_active=True,
-            is_staff=True,
-            is_superuser=True
-        )
-        user_mock.set_unusable_password()
-
-        print(f"[AUTH] Tymczasowy użytkownik: {user_mock.username}, ID: {user_mock.id}")
-
         return (user_mock, None)
 
 class MicroserviceUser(AnonymousUser):
@@ -167,6 +150,7 @@ def register(request):
     user_profile, created = UserProfile.objects.get_or_create(user_id=user_id)
     user_profile.auth_token = token
     user_profile.save()
+    token_cache.invalidate_user(user_id)
 
     print("[register] -> UserProfile", "utworzony" if created else "zaktualizowany", f"dla user_id={user_id}")
     print("[register] Zapisany token =", token)
@@ -365,6 +349,13 @@ def get_bot_details(request, bot_id):
             "total_profit": total_profit,
         }, status=400)
     
+    # TP i zysk wszystkich poziomów jednym zapytaniem (z cache)
+    try:
+        level_stats = bot.get_level_stats()
+    except Exception as e:
+        level_stats = {}
+        print(f"Error in get_level_stats for bot_id={bot_id}: {e}")
+
     for key in lv_keys:
         lv_number = key  # np. 'lv1'
         try:
@@ -376,17 +367,9 @@ def get_bot_details(request, bot_id):
         bought = flags.get(f"{lv_number}_bought", False)
         sold = flags.get(f"{lv_number}_sold", False)
         
-        try:
-            tp = bot.get_tp_count(lv_number)
-        except Exception as e:
-            tp = 0
-            print(f"Error in get_tp_count for bot_id={bot_id}, lv_number={lv_number}: {e}")
-        
-        try:
-            profit = float(bot.get_profit(lv_number))
-        except Exception as e:
-            profit = 0.0
-            print(f"Error in get_profit for bot_id={bot_id}, lv_number={lv_number}: {e}")
+        stats = level_stats.get(lv_number, {})
+        tp = stats.get('tp', 0)
+        profit = stats.get('profit', 0.0)
         
         capital = float(levels_data.get("caps", {}).get(lv_number, 0.0))  # Poprawne odwołanie do `caps`
         
@@ -398,7 +381,10 @@ def get_bot_details(request, bot_id):
             "bought": bought,
             "sold": sold
         }
-        total_profit += profit
+
+    # Łączny zysk ze zmaterializowanego podsumowania (jeden wiersz)
+    summary = BotPnlSummary.objects.filter(bot=bot).first()
+    total_profit = float(summary.total_profit) if summary else 0.0
 
     return Response({
         "flags": levels_data.get("flags", {}),
@@ -409,6 +395,10 @@ def get_bot_details(request, bot_id):
     })
 
 
+# Zbiorczy status botów usera (POST /bot_statuses/) - wspólny widok z botcore
+get_bot_statuses = bot_statuses_view(MicroserviceBot, CustomAuthentication)
+
+
 @api_view(['GET'])
 @authentication_classes([CustomAuthentication])
 @permission_classes([IsAuthenticated])
@@ -441,65 +431,82 @@ def get_bot_status(request, bot_id):
 #################################
 # Download trades in csv#
 # api/views.py (Mikroserwis)
-from django.http import HttpResponse
-import csv
-from io import StringIO
 
 @api_view(['GET'])
 @authentication_classes([CustomAuthentication])
 @permission_classes([IsAuthenticated])
 def export_bot_trades_csv(request, bot_id):
     """
-    Zwraca transakcje (Trade) danego bota w formacie CSV,
+    Zwraca transakcje (Trade) danego bota w formacie CSV (strumieniowo),
     zastępując kropkę przecinkiem w cenach.
+    Opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD (po open_time).
     """
     try:
         bot = MicroserviceBot.objects.get(id=bot_id, user_id=request.user.id)
     except MicroserviceBot.DoesNotExist:
         return Response({"error": "Bot not found or not owned by user"}, status=404)
 
-    # Pobieramy transakcje
-    trades = Trade.objects.filter(bot=bot).order_by('open_time')
-
-    # Generujemy CSV w pamięci
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';')  # np. średnik, by Excel łatwiej to łyknął
-
-    # NAGŁÓWEK CSV
-    writer.writerow([
-        "Level", 
-        "Open Price", 
-        "Close Price", 
-        "Profit", 
-        "Open Time", 
-        "Close Time", 
-        "Status"
-    ])
-
-    for t in trades:
-        # Zamiana kropki na przecinek w stringach:
-        open_str = str(t.open_price).replace('.', ',') if t.open_price else ""
-        close_str = str(t.close_price).replace('.', ',') if t.close_price else ""
-        profit_str = str(t.profit).replace('.', ',') if t.profit else ""
-
-        # Formatowanie dat
-        open_time_str = t.open_time.strftime("%Y-%m-%d %H:%M") if t.open_time else ""
-        close_time_str = t.close_time.strftime("%Y-%m-%d %H:%M") if t.close_time else ""
-
-        writer.writerow([
-            t.level,
-            open_str,
-            close_str,
-            profit_str,
-            open_time_str,
-            close_time_str,
-            t.status
-        ])
-
-    response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Pobieramy transakcje paczkami, bez cache'owania instancji modeli
+    trades = filter_date_range(Trade.objects.filter(bot=bot), 'open_time', date_from, date_to)
+    trades = trades.order_by('open_time').values_list(
+        'level', 'open_price', 'close_price', 'profit', 'open_time', 'close_time', 'status'
+    ).iterator(chunk_size=ROW_CHUNK_SIZE)
+
+    def rows():
+        for level, open_price, close_price, profit, open_time, close_time, status in trades:
+            # Zamiana kropki na przecinek w stringach:
+            open_str = str(open_price).replace('.', ',') if open_price else ""
+            close_str = str(close_price).replace('.', ',') if close_price else ""
+            profit_str = str(profit).replace('.', ',') if profit else ""
+
+            # Formatowanie dat
+            open_time_str = open_time.strftime("%Y-%m-%d %H:%M") if open_time else ""
+            close_time_str = close_time.strftime("%Y-%m-%d %H:%M") if close_time else ""
+
+            yield [level, open_str, close_str, profit_str, open_time_str, close_time_str, status]
+
+    # NAGŁÓWEK CSV (średnik, by Excel łatwiej to łyknął)
+    header = ["Level", "Open Price", "Close Price", "Profit", "Open Time", "Close Time", "Status"]
+    return streaming_csv_response(request, f"bot_{bot_id}_trades.csv", header, rows())
+
+@api_view(['GET'])
+@authentication_classes([CustomAuthentication])
+@permission_classes([IsAuthenticated])
+def export_trades_columnar(request, bot_id=None):
+    """
+    Transakcje usera (wszystkich botów albo jednego) w formacie kolumnowym, z zachowaniem typów:
+    ?output=arrow (Arrow IPC stream, domyślnie) lub ?output=parquet,
+    opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD.
+    """
+    if not columnar_available():
+        return Response({"error": "Columnar export requires pyarrow"}, status=501)
+
+    output = request.GET.get('output', 'arrow')
+    if output not in FORMATS:
+        return Response({"error": f"Unknown output format: {output}"}, status=400)
+
+    if bot_id is not None and not MicroserviceBot.objects.filter(id=bot_id, user_id=request.user.id).exists():
+        return Response({"error": "Bot not found or not owned by user"}, status=404)
+
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    content_type, extension = FORMATS[output]
+    rows = user_trades(request.user.id, bot_id, date_from, date_to)
+    filename = f"bot_{bot_id}_trades.{extension}" if bot_id else f"xtb_trades.{extension}"
+
+    response = StreamingHttpResponse(stream_columnar(rows, output), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
+
 ###########################################################
 #### Sprawdzenie połączenia z klientem xtb ###########
 from .xtb_manager import xtb_manager  # <-- import managera
@@ -535,5 +542,6 @@ def check_xtb_connection(request, bot_id):
     # Skoro tu doszliśmy, to bot ma już is_connected == True
     return Response({
         "ok": True,
-        "message": "Bot ma aktywne połączenie z XTB (is_connected)."
+        "message": "Bot ma aktywne połączenie z XTB (is_connected).",
+        "scheduler": xtb_manager.scheduler_stats(bot_id)
     }, status=200)
\ No newline at end of file
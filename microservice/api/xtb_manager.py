@@ -2,15 +2,291 @@ import asyncio
 import datetime
 import json
 import websockets
+from collections import defaultdict
 
 from asgiref.sync import sync_to_async
 from .models import MicroserviceBot
+from .broker import publish_bot_status
+from botcore.xtb_transport import XTBChannel, PRIORITY_TRADE, PRIORITY_QUOTE, PRIORITY_HOUSEKEEPING
+from .order_pipeline import OrderIntent, OrderPipeline
 
 XTB_MAIN_URL = "wss://ws.xtb.com/demo"
+XTB_STREAM_URL = "wss://ws.xtb.com/demoStream"
+
+# Co ile sekund wysyłamy ping (XTB zrywa nieaktywne sesje po ok. 10 minutach)
+XTB_PING_INTERVAL = 60
 
 # Globalny słownik do przechowywania cen instrumentów
+# klucz: symbol -> {"ask": float, "bid": float, "timestamp": "ISO8601"}
 instrument_prices = {}
 
+# symbol -> asyncio.Event ustawiany przy następnym ticku (potem zastępowany nowym)
+_price_events = {}
+
+
+def _publish_price(symbol: str, ask, bid, timestamp: str):
+    """
+    Zapisuje tick w `instrument_prices` i budzi wszystkie korutyny czekające na ten symbol.
+    """
+    instrument_prices[symbol] = {"ask": ask, "bid": bid, "timestamp": timestamp}
+    event = _price_events.pop(symbol, None)
+    if event:
+        event.set()
+
+
+async def wait_for_tick(symbol: str, timeout: float = None) -> bool:
+    """
+    Usypia do czasu nadejścia kolejnego ticka dla symbolu.
+    Zwraca False, jeśli minął timeout.
+    """
+    event = _price_events.get(symbol)
+    if event is None:
+        event = _price_events[symbol] = asyncio.Event()
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class _PriceFeedHub:
+    """
+    Wspólny feed cen dla wszystkich botów.
+    Jedna sesja streamingowa XTB (getTickPrices) i jedna subskrypcja na symbol,
+    niezależnie od liczby botów, które go obserwują. Ticki trafiają do
+    `instrument_prices[symbol]`, skąd czytają je wszystkie boty danego symbolu.
+    Sesja jest zalogowana danymi jednego z subskrybentów; gdy ten bot odchodzi
+    (albo jego login przestaje działać), hub loguje się danymi kolejnego.
+    """
+
+    def __init__(self):
+        # symbol -> zbiór bot_id, które go obserwują
+        self._subscribers = defaultdict(set)
+        # bot_id -> (login, hasło) - dane logowania każdego subskrybenta
+        self._credentials = {}
+        # bot_id, którego dane logowania ma bieżąca sesja
+        self._session_bot = None
+
+        self.main_ws = None
+        self.stream_ws = None
+        self.stream_session_id = None
+        self.is_connected = False
+
+        self._lock = asyncio.Lock()
+        self._reader_task = None
+        self._ping_task = None
+        self._reconnect_task = None
+
+    def _timestamp(self):
+        return datetime.datetime.utcnow().isoformat()
+
+    def symbols(self):
+        return [s for s, bots in self._subscribers.items() if bots]
+
+    async def subscribe(self, bot_id: int, symbols, login: str, password: str):
+        """
+        Rejestruje bota jako odbiorcę ticków dla podanych symboli.
+        Dane logowania są zapamiętywane - sesja może ich użyć, gdy obecny właściciel odejdzie.
+        """
+        async with self._lock:
+            self._credentials[bot_id] = (login, password)
+
+            new_symbols = []
+            for symbol in symbols:
+                if not self._subscribers[symbol]:
+                    new_symbols.append(symbol)
+                self._subscribers[symbol].add(bot_id)
+
+            if not self.is_connected:
+                await self._connect()
+                if not self.is_connected:
+                    self._schedule_reconnect()
+                return self.is_connected
+
+            for symbol in new_symbols:
+                try:
+                    await self._subscribe_symbol(symbol)
+                except Exception as e:
+                    # Po reconnect subskrypcje są odnawiane dla wszystkich symboli
+                    print(f"[{self._timestamp()}] [PriceFeed] getTickPrices {symbol} error: {e}")
+            return True
+
+    async def unsubscribe(self, bot_id: int):
+        """
+        Wyrejestrowuje bota. Symbole bez odbiorców są zatrzymywane (stopTickPrices)
+        i usuwane z `instrument_prices`. Jeśli sesja była zalogowana danymi tego bota,
+        hub loguje się ponownie danymi innego subskrybenta.
+        """
+        async with self._lock:
+            self._credentials.pop(bot_id, None)
+            for symbol in list(self._subscribers.keys()):
+                bots = self._subscribers[symbol]
+                bots.discard(bot_id)
+                if bots:
+                    continue
+                del self._subscribers[symbol]
+                instrument_prices.pop(symbol, None)
+                event = _price_events.pop(symbol, None)
+                if event:
+                    event.set()
+                if self.is_connected:
+                    try:
+                        await self._send(self.stream_ws, {"command": "stopTickPrices", "symbol": symbol})
+                    except Exception as e:
+                        print(f"[{self._timestamp()}] [PriceFeed] stopTickPrices {symbol} error: {e}")
+                print(f"[{self._timestamp()}] [PriceFeed] Unsubscribed {symbol} (no bots left).")
+
+            if not self.symbols():
+                await self._close()
+                self._session_bot = None
+            elif self._session_bot == bot_id:
+                print(f"[{self._timestamp()}] [PriceFeed] Bot {bot_id} owned the session - re-login with another subscriber.")
+                await self._close()
+                await self._connect()
+                if not self.is_connected:
+                    self._schedule_reconnect()
+
+    def _login_candidates(self):
+        """
+        Boty, których danymi można zalogować sesję: najpierw dotychczasowy właściciel,
+        potem pozostali subskrybenci.
+        """
+        subscribed = set().union(*self._subscribers.values()) if self._subscribers else set()
+        bots = [b for b in self._credentials if b in subscribed]
+        if self._session_bot in bots:
+            bots.remove(self._session_bot)
+            bots.insert(0, self._session_bot)
+        return bots
+
+    async def _login(self):
+        """
+        Otwiera main_ws i loguje się danymi kolejnych kandydatów. Zwraca odpowiedź loginu albo None.
+        """
+        for bot_id in self._login_candidates():
+            login, password = self._credentials[bot_id]
+            self.main_ws = await websockets.connect(XTB_MAIN_URL)
+            await self._send(self.main_ws, {
+                "command": "login",
+                "arguments": {"userId": login, "password": password}
+            })
+            resp = json.loads(await self.main_ws.recv())
+            if resp.get("status"):
+                self._session_bot = bot_id
+                return resp
+
+            print(f"[{self._timestamp()}] [PriceFeed] Login failed for bot {bot_id}: {resp}")
+            await self.main_ws.close()
+            self.main_ws = None
+        return None
+
+    async def _send(self, ws, msg: dict):
+        await ws.send(json.dumps(msg))
+
+    async def _subscribe_symbol(self, symbol: str):
+        await self._send(self.stream_ws, {
+            "command": "getTickPrices",
+            "streamSessionId": self.stream_session_id,
+            "symbol": symbol,
+            "minArrivalTime": 0,
+            "maxLevel": 0
+        })
+        print(f"[{self._timestamp()}] [PriceFeed] Subscribed {symbol} ({len(self._subscribers[symbol])} bots).")
+
+    async def _connect(self):
+        try:
+            resp = await self._login()
+            if resp is None:
+                print(f"[{self._timestamp()}] [PriceFeed] No subscriber credentials could log in.")
+                await self._close()
+                return
+
+            self.stream_session_id = resp.get("streamSessionId")
+            self.stream_ws = await websockets.connect(XTB_STREAM_URL)
+            self.is_connected = True
+            for symbol in self.symbols():
+                await self._subscribe_symbol(symbol)
+        except Exception as e:
+            print(f"[{self._timestamp()}] [PriceFeed] Cannot connect: {e}")
+            await self._close()
+            return
+
+        print(f"[{self._timestamp()}] [PriceFeed] Stream connected.")
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self._ping_task = asyncio.create_task(self._ping_loop())
+
+    async def _read_loop(self):
+        """
+        Odbiera ticki ze streamu, zapisuje je w `instrument_prices` pod kluczem symbolu
+        i budzi boty czekające na dany symbol.
+        """
+        try:
+            while self.is_connected:
+                msg = json.loads(await self.stream_ws.recv())
+                if msg.get("command") != "tickPrices":
+                    continue
+                data = msg.get("data", {})
+                if data.get("level", 0) != 0:
+                    continue
+                symbol = data.get("symbol")
+                if symbol not in self._subscribers:
+                    continue
+                _publish_price(symbol, data.get("ask"), data.get("bid"), self._timestamp())
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"[{self._timestamp()}] [PriceFeed] Stream error: {e}")
+
+        self._schedule_reconnect()
+
+    async def _ping_loop(self):
+        try:
+            while self.is_connected:
+                await asyncio.sleep(XTB_PING_INTERVAL)
+                await self._send(self.main_ws, {"command": "ping"})
+                await self.main_ws.recv()
+                await self._send(self.stream_ws, {"command": "ping", "streamSessionId": self.stream_session_id})
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"[{self._timestamp()}] [PriceFeed] Ping error: {e}")
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._reconnect_task and not self._reconnect_task.done():
+            return
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        async with self._lock:
+            await self._close()
+        while self.symbols():
+            await asyncio.sleep(5)  # Poczekaj przed próbą reconnect
+            async with self._lock:
+                if self.is_connected or not self.symbols():
+                    return
+                print(f"[{self._timestamp()}] [PriceFeed] Reconnecting...")
+                await self._connect()
+
+    async def _close(self):
+        self.is_connected = False
+        current = asyncio.current_task()
+        for task in (self._reader_task, self._ping_task):
+            if task and task is not current:
+                task.cancel()
+        self._reader_task = None
+        self._ping_task = None
+        for ws in (self.stream_ws, self.main_ws):
+            if ws:
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+        self.stream_ws = None
+        self.main_ws = None
+        self.stream_session_id = None
+
+
+price_feed = _PriceFeedHub()
 
 
 class _XTBConnection:
@@ -20,26 +296,27 @@ class _XTBConnection:
         self.password = password
         self.instrument = instrument
 
-        self.main_ws = None
+        self.channel = None
         self.is_connected = False
-        self._price_update_task = None
-        self._recv_lock = asyncio.Lock()
+        self._ping_task = None
 
     def _timestamp(self):
         return datetime.datetime.utcnow().isoformat()
 
-    async def send_message(self, ws, msg: dict, label: str = ""):
-        msg_text = json.dumps(msg)
-        await ws.send(msg_text)
-
-    async def receive_message(self, ws, label: str = "") -> dict:
-        async with self._recv_lock:
-            msg_text = await ws.recv()
-            return json.loads(msg_text)
+    async def send_command(self, msg: dict, label: str = "", priority: int = PRIORITY_QUOTE) -> dict:
+        """
+        Wysyła komendę i czeka na odpowiedź. Odpowiedzi są przypisywane po customTag,
+        więc ping i tradeTransaction mogą być w locie jednocześnie na tym samym sockecie.
+        `priority` decyduje o kolejności wysyłki przy limicie XTB (zlecenia przed pingiem).
+        """
+        if self.channel is None:
+            raise ConnectionError("Not connected to XTB API.")
+        return await self.channel.request(msg, priority=priority)
 
     async def connect(self) -> bool:
         try:
-            self.main_ws = await websockets.connect(XTB_MAIN_URL)
+            main_ws = await websockets.connect(XTB_MAIN_URL)
+            self.channel = XTBChannel(main_ws, f"Bot {self.bot_id}")
             print(f"[{self._timestamp()}] [Bot {self.bot_id}] Connected main ws.")
         except Exception as e:
             print(f"[{self._timestamp()}] [Bot {self.bot_id}] Cannot connect main ws: {e}")
@@ -50,8 +327,7 @@ class _XTBConnection:
             "arguments": {"userId": self.login, "password": self.password}
         }
         try:
-            await self.send_message(self.main_ws, login_req, "login")
-            resp = await self.receive_message(self.main_ws, "login")
+            resp = await self.send_command(login_req, "login", PRIORITY_TRADE)
             if not resp.get("status"):
                 print(f"[{self._timestamp()}] [Bot {self.bot_id}] Login failed: {resp}")
                 await self.close()
@@ -63,69 +339,34 @@ class _XTBConnection:
 
         print(f"[{self._timestamp()}] [Bot {self.bot_id}] Logged in to XTB.")
         self.is_connected = True
-        self._price_update_task = asyncio.create_task(self._update_prices_loop())
+        self._ping_task = asyncio.create_task(self._ping_loop())
         return True
 
-    async def _update_prices_loop(self):
+    async def _ping_loop(self):
         """
-        W pętli pobieramy:
-         1) Główny instrument (self.instrument),
-         2) Dodatkowo USDPLN (jeśli bot potrzebuje przeliczeń PLN->USD).
+        Ceny przychodzą ze wspólnego `price_feed`, więc to połączenie służy tylko
+        do zleceń. Utrzymujemy je przy życiu pingiem.
         """
-        global instrument_prices
         while self.is_connected:
+            await asyncio.sleep(XTB_PING_INTERVAL)
             try:
-                # 1) Pobierz dane głównego instrumentu (np. RIOT.US)
-                cmd_main = {
-                    "command": "getSymbol",
-                    "arguments": {"symbol": self.instrument}
-                }
-                await self.send_message(self.main_ws, cmd_main, "getSymbol")
-                resp_main = await self.receive_message(self.main_ws, "getSymbol")
-                if resp_main.get("status"):
-                    rd_main = resp_main.get("returnData", {})
-                    instrument_prices[(self.bot_id, self.instrument)] = {
-                        "ask": rd_main.get("ask"),
-                        "bid": rd_main.get("bid"),
-                        "timestamp": self._timestamp()
-                    }
-                    print(f"[{self._timestamp()}] [Bot {self.bot_id}] Updated price for {self.instrument}: {instrument_prices[(self.bot_id, self.instrument)]}")
-                else:
-                    print(f"[{self._timestamp()}] [Bot {self.bot_id}] Error in getSymbol response (main): {resp_main}")
-
-                # 2) Pobierz kurs USDPLN, by móc liczyć wolumen dla PLN -> USD
-                cmd_usdpln = {
-                    "command": "getSymbol",
-                    "arguments": {"symbol": "USDPLN"}
-                }
-                await self.send_message(self.main_ws, cmd_usdpln, "getSymbol")
-                resp_usdpln = await self.receive_message(self.main_ws, "getSymbol")
-                if resp_usdpln.get("status"):
-                    rd_usdpln = resp_usdpln.get("returnData", {})
-                    instrument_prices[(self.bot_id, "USDPLN")] = {
-                        "ask": rd_usdpln.get("ask"),
-                        "bid": rd_usdpln.get("bid"),
-                        "timestamp": self._timestamp()
-                    }
-                    print(f"[{self._timestamp()}] [Bot {self.bot_id}] Updated price for USDPLN: {instrument_prices[(self.bot_id, 'USDPLN')]}")
-                else:
-                    print(f"[{self._timestamp()}] [Bot {self.bot_id}] Error in getSymbol response (USDPLN): {resp_usdpln}")
-
+                resp = await self.send_command({"command": "ping"}, "ping", PRIORITY_HOUSEKEEPING)
+                if not resp.get("status"):
+                    print(f"[{self._timestamp()}] [Bot {self.bot_id}] Ping failed: {resp}")
             except Exception as e:
-                print(f"[{self._timestamp()}] [Bot {self.bot_id}] Price update error: {e}")
+                print(f"[{self._timestamp()}] [Bot {self.bot_id}] Ping error: {e}")
                 await asyncio.sleep(5)  # Poczekaj przed próbą reconnect
-                await self.reconnect()
-
-            await asyncio.sleep(1)
+                asyncio.create_task(self.reconnect())
+                return
 
     async def reconnect(self):
         print(f"[{self._timestamp()}] [Bot {self.bot_id}] Reconnecting...")
         await self.close()
         await self.connect()
 
-    async def trade_transaction(self, symbol, volume, cmd):
+    async def trade_transaction(self, symbol, volume, cmd, comment: str = "Market order"):
         # Ustawienie ceny: ASK dla BUY, BID dla SELL
-        current_price = instrument_prices.get((self.bot_id, symbol), {}).get("ask" if cmd == 0 else "bid", 0)
+        current_price = instrument_prices.get(symbol, {}).get("ask" if cmd == 0 else "bid", 0)
 
         if current_price == 0:
             #print(f"[{self._timestamp()}] [Bot {self.bot_id}] Błąd: Brak aktualnej ceny dla {symbol}.")
@@ -142,7 +383,7 @@ class _XTBConnection:
                     "type": 0,
                     "sl": 0.0,
                     "tp": 0.0,
-                    "customComment": "Market order"
+                    "customComment": comment
                 }
             }
         }
@@ -150,31 +391,43 @@ class _XTBConnection:
         print(f"[{self._timestamp()}] [Bot {self.bot_id}] Wysyłanie zlecenia: {trade_data}")
 
         try:
-            await self.send_message(self.main_ws, trade_data, "tradeTransaction")
-            response = await self.receive_message(self.main_ws, "tradeTransaction")
+            response = await self.send_command(trade_data, "tradeTransaction", PRIORITY_TRADE)
             print(f"[{self._timestamp()}] [Bot {self.bot_id}] Odpowiedź XTB: {response}")
             return response
         except Exception as e:
             print(f"[{self._timestamp()}] [Bot {self.bot_id}] Błąd transakcji: {e}")
             return {"status": False, "errorCode": "CONNECTION_ERROR", "errorDescr": str(e)}
 
+    async def find_trade_by_comment(self, comment: str):
+        """
+        Szuka otwartej pozycji z danym customComment (klucz idempotencji zlecenia).
+        Zwraca odpowiedź w formacie tradeTransaction albo None.
+        """
+        resp = await self.send_command(
+            {"command": "getTrades", "arguments": {"openedOnly": True}}, "getTrades", PRIORITY_TRADE
+        )
+        if not resp.get("status"):
+            raise ConnectionError(f"getTrades failed: {resp}")
+        for trade in resp.get("returnData", []):
+            if trade.get("customComment") == comment:
+                return {"status": True, "returnData": {"order": trade.get("order")}, "recovered": True}
+        return None
+
     async def close(self):
         self.is_connected = False
-        if self._price_update_task:
-            self._price_update_task.cancel()
-            self._price_update_task = None
-        if self.main_ws:
-            try:
-                await self.main_ws.close()
-            except Exception:
-                pass
-            self.main_ws = None
+        if self._ping_task and self._ping_task is not asyncio.current_task():
+            self._ping_task.cancel()
+        self._ping_task = None
+        if self.channel:
+            await self.channel.close()
+            self.channel = None
         print(f"[{self._timestamp()}] [Bot {self.bot_id}] Connection closed.")
 
 
 class XTBManager:
     def __init__(self):
         self._connections = {}
+        self.orders = OrderPipeline(self._execute_intent, self._find_intent_trade)
 
     def _timestamp(self):
         return datetime.datetime.utcnow().isoformat()
@@ -190,66 +443,83 @@ class XTBManager:
             print(f"[{self._timestamp()}] [connect_bot] Bot {bot_id} is already connected.")
             return True
 
-        conn = _XTBConnection(bot_id=bot.id, login=bot.xtb_login, password=bot.get_xtb_password(), instrument=bot.instrument)
+        password = bot.get_xtb_password()
+        conn = _XTBConnection(bot_id=bot.id, login=bot.xtb_login, password=password, instrument=bot.instrument)
         ok = await conn.connect()
         if ok:
             self._connections[bot_id] = conn
+            # Ceny: jedna subskrypcja na symbol we wspólnym feedzie (plus USDPLN do przeliczeń)
+            symbols = [bot.instrument]
+            if bot.account_currency != bot.asset_currency:
+                symbols.append("USDPLN")
+            if not await price_feed.subscribe(bot.id, symbols, bot.xtb_login, password):
+                print(f"[{self._timestamp()}] [connect_bot] Bot {bot_id} price feed not connected yet.")
         return ok
 
-    async def trade_bot(self, bot_id: int, symbol: str, volume: float, cmd=0):
-        max_retries = 5
-        attempt = 0
-
-        # Sprawdzenie połączenia
-        if bot_id not in self._connections or not self._connections[bot_id].is_connected:
-            print(f"[{self._timestamp()}] [trade_bot] Bot {bot_id} not connected or missing!")
+    async def trade_bot(self, bot_id: int, symbol: str, volume: float, cmd=0, level: str = None,
+                        on_filled=None, on_failed=None):
+        """
+        Składa zlecenie jako OrderIntent w kolejce `self.orders`.
+        Pierwsza próba jest wykonywana od razu i jej wynik wraca do wołającego.
+        Błąd, który da się ponowić, kończy się odpowiedzią RETRY_SCHEDULED - zlecenie jest
+        ponawiane w tle (backoff wykładniczy), a wynik trafia do on_filled / on_failed.
+        Błąd krytyczny albo wyczerpanie prób ustawia status bota na ERROR.
+        """
+        intent = OrderIntent(bot_id, level or symbol, symbol, volume, cmd)
+
+        async def failed(intent, resp):
+            if on_failed:
+                await on_failed(intent, resp)
+            await self._set_error(bot_id, resp)
+
+        intent.on_filled = on_filled
+        intent.on_failed = failed
+
+        print(f"[{self._timestamp()}] [Bot {bot_id}] {intent.key}: trade_transaction({symbol}, vol={volume}, cmd={cmd})")
+        response = await self.orders.submit(intent)
+
+        if response.get("status"):
+            print(f"[{self._timestamp()}] [Bot {bot_id}] Trade successful: {response}")
+        elif response.get("errorCode") != "RETRY_SCHEDULED":
+            # Błąd krytyczny (albo brak prób do ponowienia) - bota nie da się dalej prowadzić
+            print(f"[{self._timestamp()}] [Bot {bot_id}] Trade failed -> errorCode={response.get('errorCode')}, descr={response.get('errorDescr')}")
+            await self._set_error(bot_id, response)
+        return response
+
+    async def _execute_intent(self, intent: OrderIntent) -> dict:
+        conn = self._connections.get(intent.bot_id)
+        if conn is None or not conn.is_connected:
             return {"status": False, "errorCode": "NOT_CONNECTED"}
+        return await conn.trade_transaction(intent.symbol, intent.volume, intent.cmd, comment=intent.key)
 
-        # (Jeśli usunąłeś logikę salda user_profile to jej tu nie ma)
+    async def _find_intent_trade(self, intent: OrderIntent):
+        conn = self._connections.get(intent.bot_id)
+        if conn is None or not conn.is_connected:
+            raise ConnectionError("Not connected to XTB API.")
+        return await conn.find_trade_by_comment(intent.key)
 
-        # Pobranie aktualnej ceny instrumentu
-        current_price = instrument_prices.get((bot_id, symbol), {}).get("ask" if cmd == 0 else "bid", 0)
-        if current_price == 0:
-            print(f"[{self._timestamp()}] [Bot {bot_id}] Brak aktualnej ceny dla {symbol}.")
-            return {"status": False, "errorCode": "NO_PRICE"}
-
-        while attempt < max_retries:
-            try:
-                print(f"[{self._timestamp()}] [Bot {bot_id}] attempt={attempt+1}, trade_transaction({symbol}, vol={volume}, cmd={cmd})")
-                response = await self._connections[bot_id].trade_transaction(symbol, volume, cmd)
-
-                # TU KLUCZOWY PRINT:
-                print(f"[DEBUG] [trade_bot] XTB raw response: {response}")
-
-                if response.get("status"):
-                    print(f"[{self._timestamp()}] [Bot {bot_id}] Trade successful: {response}")
-                    return response
-                else:
-                    # Tu zobaczysz kod błędu i opis
-                    print(f"[{self._timestamp()}] [Bot {bot_id}] Trade failed -> errorCode={response.get('errorCode')}, descr={response.get('errorDescr')}")
-                    print(f"[{self._timestamp()}] [Bot {bot_id}] Trade failed, retrying in 5 minutes... Attempt {attempt + 1}")
-                    attempt += 1
-                    await asyncio.sleep(300)  # 5 minut
-            except Exception as e:
-                print(f"[{self._timestamp()}] [Bot {bot_id}] Trade error: {e}")
-                attempt += 1
-                await asyncio.sleep(300)
-
-        # Po 5 nieudanych próbach zmień status bota na ERROR
+    async def _set_error(self, bot_id: int, resp: dict):
         bot = await sync_to_async(MicroserviceBot.objects.get)(pk=bot_id)
-        bot.status = 'ERROR'
-        await sync_to_async(bot.save)()
-        print(f"[{self._timestamp()}] [Bot {bot_id}] Too many failed attempts. Status set to ERROR.")
-        return {"status": False, "errorCode": "MAX_RETRIES_EXCEEDED"}
+        await sync_to_async(MicroserviceBot.objects.filter(pk=bot_id).update)(status='ERROR')
+        publish_bot_status(bot.id, bot.user_id, 'ERROR')
+        print(f"[{self._timestamp()}] [Bot {bot_id}] Order failed ({(resp or {}).get('errorCode')}). Status set to ERROR.")
+
+    def scheduler_stats(self, bot_id: int):
+        """
+        Metryki kolejki komend połączenia bota (głębokość kolejki, czas oczekiwania) albo None.
+        """
+        conn = self._connections.get(bot_id)
+        if conn is None or conn.channel is None:
+            return None
+        return conn.channel.stats()
 
     async def disconnect_bot(self, bot_id: int):
+        # Bot zatrzymany - przerywamy ponawianie jego zleceń
+        self.orders.cancel(bot_id)
         if bot_id in self._connections:
             await self._connections[bot_id].close()
-            instrument = self._connections[bot_id].instrument
-            key = (bot_id, instrument)
-            if key in instrument_prices:
-                del instrument_prices[key]
-                print(f"[{self._timestamp()}] [disconnect_bot] Removed instrument {key} from instrument_prices.")
+            # Symbol znika z instrument_prices dopiero, gdy nie obserwuje go żaden bot
+            await price_feed.unsubscribe(bot_id)
             del self._connections[bot_id]
 
 
@@ -0,0 +1,155 @@
+# home/microservice_client.py
+
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# (connect, read) - połączenie z mikroserwisem w sieci lokalnej powinno być natychmiastowe
+DEFAULT_TIMEOUT = (2, 5)
+POOL_MAXSIZE = 20          # ile połączeń keep-alive na mikroserwis (wątki serwera)
+FAILURE_THRESHOLD = 5      # ile kolejnych błędów otwiera obwód
+RESET_TIMEOUT = 30         # po ilu sekundach przepuszczamy próbne zapytanie
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Mikroserwis uznany za niedostępny - zapytanie odrzucone bez łączenia się.
+    Dziedziczy po requests.ConnectionError, więc istniejące `except requests.RequestException`
+    obsługują je bez zmian.
+    """
+
+
+class CircuitBreaker:
+    """
+    Prosty wyłącznik obwodu:
+      - CLOSED: zapytania przechodzą, liczymy kolejne błędy,
+      - OPEN: po FAILURE_THRESHOLD błędach odrzucamy zapytania od razu (bez czekania na timeout),
+      - HALF_OPEN: po RESET_TIMEOUT przepuszczamy jedno próbne zapytanie;
+        sukces zamyka obwód, błąd otwiera go ponownie.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "CLOSED"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "HALF_OPEN"
+        return "OPEN"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "CLOSED":
+                return True
+            if state == "HALF_OPEN" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class MicroserviceClient:
+    """
+    Klient jednego mikroserwisu (XTB, BNB, D10):
+    wspólna sesja HTTP z pulą połączeń keep-alive i własny wyłącznik obwodu.
+    Adres bazowy czytany jest z ustawień przy każdym zapytaniu (np. settings.MICROSERVICE_URL2).
+    """
+
+    def __init__(self, name: str, url_setting: str, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.url_setting = url_setting
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def base_url(self) -> str:
+        return getattr(settings, self.url_setting).rstrip("/")
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Wykonuje zapytanie do mikroserwisu. Błędy połączenia, timeouty i odpowiedzi 5xx
+        liczą się jako awaria; przy otwartym obwodzie rzuca CircuitOpenError.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Mikroserwis {self.name} chwilowo niedostępny (circuit open).")
+
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            resp = self.session.request(method, self.url(path), **kwargs)
+        except Exception:
+            # Każdy błąd zapytania (nie tylko połączenia/timeout) zwalnia próbę HALF_OPEN -
+            # inaczej obwód zostałby na zawsze otwarty
+            self.breaker.record_failure()
+            raise
+
+        if resp.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return resp
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    # Wersje async dla widoków ASGI - zapytanie idzie przez tę samą pulę połączeń
+    # w wątku roboczym, więc pętla zdarzeń nie jest blokowana.
+    async def arequest(self, method: str, path: str, **kwargs) -> requests.Response:
+        return await sync_to_async(self.request, thread_sensitive=False)(method, path, **kwargs)
+
+    async def aget(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("GET", path, **kwargs)
+
+    async def apost(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("POST", path, **kwargs)
+
+
+xtb_service = MicroserviceClient("XTB", "MICROSERVICE_URL2")
+bnb_service = MicroserviceClient("BNB", "BNB_MICROSERVICE_URL")
+d10_service = MicroserviceClient("D10", "XTB_D")
+
+_services_by_broker = {
+    'XTB': xtb_service,
+    'BNB': bnb_service,
+    'D10': d10_service,
+}
+
+
+def service_for_broker(broker_type: str):
+    """
+    Zwraca klienta mikroserwisu dla broker_type bota albo None dla nieznanego typu.
+    """
+    return _services_by_broker.get(broker_type)
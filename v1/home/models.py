@@ -87,12 +87,12 @@ class XTBConnection(models.Model):
         return fernet.decrypt(self.password).decode('utf-8')
 
     def connect_to_xtb(self):
-        connector = XTBApiConnector(self.xtb_id, self.get_password())
-        if connector.connect():
-            self.is_live = True
-            self.stream_session_id = connector.stream_session_id
-            self.save()
-            connector.disconnect()  # rozłącz po logowaniu, jeśli nie potrzebujesz stale połączone
+        from .xtb_connection_manager import connection_manager  # import lokalny - manager importuje modele
+
+        # Dane logowania mogły się zmienić - zamykamy starą sesję i logujemy się od nowa.
+        # Nowa sesja zostaje w puli, więc kolejne widoki nie logują się ponownie.
+        connection_manager.disconnect(self.user_id)
+        if connection_manager.connect(self):
             return True
         else:
             self.is_live = False
@@ -107,15 +107,11 @@ def get_symbol_from_xtb(user, symbol):
         # Brak aktywnej sesji
         return {"ask": None, "bid": None, "error": "No active XTB session."}
 
-    xtb_id = xtb_connection.xtb_id
-    xtb_password = xtb_connection.get_password()
-    stream_session_id = xtb_connection.stream_session_id
-
-    connector = XTBApiConnector(xtb_id, xtb_password, stream_session_id)
+    from .xtb_connection_manager import connection_manager
 
-    if connector.connect():
-        response = connector.send_command("getSymbol", {"symbol": symbol})
-        connector.disconnect()
+    # Sesja z puli połączeń (login tylko, gdy user nie ma jeszcze otwartej sesji)
+    if connection_manager.connect(xtb_connection):
+        response = connection_manager.send_command(user.id, "getSymbol", {"symbol": symbol})
         if response and response.get("status"):
             data = response.get("returnData", {})
             ask = data.get("ask")
@@ -126,37 +122,21 @@ def get_symbol_from_xtb(user, symbol):
     else:
         return {"ask": None, "bid": None, "error": "Failed to connect to XTB."}
 def get_all_symbols_from_xtb(user):
+    from .symbol_catalog import get_catalog  # import lokalny - symbol_catalog importuje modele
+
     xtb_connection = getattr(user, 'xtb_connection', None)
     if not xtb_connection or not xtb_connection.is_live:
         return []
-    
-    xtb_id = xtb_connection.xtb_id
-    xtb_password = xtb_connection.get_password()
-    stream_session_id = xtb_connection.stream_session_id
-
-    connector = XTBApiConnector(xtb_id, xtb_password, stream_session_id)
-    if connector.connect():
-        response = connector.send_command("getAllSymbols")
-        connector.disconnect()
-        if response and response.get("status"):
-            # Zwraca listę SYMBOL_RECORD
-            symbols_data = response.get("returnData", [])
-            # Zmapuj je do formatu {symbol: 'XYZ', description: '...'}
-            result = []
-            for s in symbols_data:
-                symbol_name = s.get('symbol')
-                description = s.get('description', '')
-                # Możesz opcjonalnie odfiltrować, aby zwracać tylko ważne dane
-                result.append({
-                    "symbol": symbol_name,
-                    "description": description
-                })
-            return result
-        
-        else:
-            return []
-    else:
+
+    # Lista z wspólnego katalogu symboli (odświeżanego okresowo), bez osobnego logowania do XTB
+    catalog = get_catalog(user)
+    if catalog is None:
         return []
+    # Zmapuj je do formatu {symbol: 'XYZ', description: '...'}
+    return [
+        {"symbol": s.get('symbol'), "description": s.get('description', '')}
+        for s in catalog.records
+    ]
     
 
 ##########################################
@@ -0,0 +1,156 @@
+# home/symbol_catalog.py
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .models import XTBConnection
+from .xtb_connection_manager import connection_manager
+
+CATALOG_REFRESH_INTERVAL = 3600   # co ile sekund pobieramy listę symboli z XTB ponownie
+CATALOG_CACHE_KEY = "xtb_symbol_catalog"
+SEARCH_LIMIT = 10
+
+# Pola zwracane przez show_symbols (pełny SYMBOL_RECORD zostaje w records)
+SUMMARY_FIELDS = ('symbol', 'currency', 'categoryName', 'description', 'leverage')
+
+
+class SymbolCatalog:
+    """
+    Niezmienny snapshot listy symboli XTB (getAllSymbols) z indeksami do wyszukiwania:
+      - posortowana lista nazw symboli -> wyszukiwanie po prefiksie (bisect),
+      - indeks trigramów -> wyszukiwanie po fragmencie nazwy bez skanowania całej listy.
+    Odświeżenie tworzy nowy obiekt, więc czytający nie potrzebują blokady.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.loaded_at = time.monotonic()
+        self.summary = [{field: r.get(field) for field in SUMMARY_FIELDS} for r in records]
+
+        names = [(r.get('symbol') or '').upper() for r in records]
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self._sorted_names = [names[i] for i in order]
+        self._sorted_ids = order
+        self._names = names
+
+        trigrams = {}
+        for i, name in enumerate(names):
+            for j in range(len(name) - 2):
+                trigrams.setdefault(name[j:j + 3], set()).add(i)
+        self._trigrams = trigrams
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    def _prefix_ids(self, query: str):
+        pos = bisect_left(self._sorted_names, query)
+        while pos < len(self._sorted_names) and self._sorted_names[pos].startswith(query):
+            yield self._sorted_ids[pos]
+            pos += 1
+
+    def _substring_ids(self, query: str):
+        if len(query) < 3:
+            # Za krótkie na trigramy - przy 1-2 znakach dopełniamy wynik skanem (kończy się po `limit`)
+            candidates = self._sorted_ids
+        else:
+            sets = [self._trigrams.get(query[j:j + 3], set()) for j in range(len(query) - 2)]
+            candidates = sorted(set.intersection(*sorted(sets, key=len)), key=self._names.__getitem__)
+        for i in candidates:
+            if query in self._names[i]:
+                yield i
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT):
+        """
+        Symbole zawierające `query` (bez względu na wielkość liter):
+        najpierw pasujące od początku nazwy, potem pozostałe - alfabetycznie.
+        """
+        query = query.strip().upper()
+        if not query:
+            return self.records[:limit]
+
+        found = []
+        for ids in (self._prefix_ids(query), self._substring_ids(query)):
+            for i in ids:
+                if i not in found:
+                    found.append(i)
+                    if len(found) >= limit:
+                        return [self.records[i] for i in found]
+        return [self.records[i] for i in found]
+
+
+_catalog = None
+_refresh_lock = threading.Lock()
+
+
+def _fetch_symbols(user_id):
+    """
+    Pobiera listę symboli z XTB przez sesję danego usera z puli połączeń.
+    """
+    xtb_connection = XTBConnection.objects.filter(user_id=user_id, is_live=True).first()
+    if not xtb_connection:
+        return None
+
+    if not connection_manager.connect(xtb_connection=xtb_connection):
+        return None
+    response = connection_manager.send_command(user_id, "getAllSymbols")
+
+    if response and response.get("status"):
+        return response.get("returnData", [])
+    return None
+
+
+def refresh_catalog(user_id):
+    """
+    Pobiera świeżą listę symboli i podmienia katalog. Zwraca nowy katalog albo None.
+    """
+    global _catalog
+    records = _fetch_symbols(user_id)
+    if not records:
+        print(f"[SYMBOLS] Nie udało się odświeżyć katalogu symboli (user {user_id}).")
+        return None
+
+    _catalog = SymbolCatalog(records)
+    # Pozostałe procesy (przy współdzielonym backendzie cache) startują z tej samej listy
+    cache.set(CATALOG_CACHE_KEY, records, CATALOG_REFRESH_INTERVAL)
+    print(f"[SYMBOLS] Katalog symboli odświeżony: {len(records)} symboli.")
+    return _catalog
+
+
+def _refresh_in_background(user_id):
+    try:
+        refresh_catalog(user_id)
+    finally:
+        close_old_connections()
+        _refresh_lock.release()
+
+
+def get_catalog(user):
+    """
+    Zwraca wspólny katalog symboli.
+    - pusty katalog: wczytanie z cache albo (jednorazowo) synchronicznie z XTB,
+    - katalog starszy niż CATALOG_REFRESH_INTERVAL: odpowiadamy starym,
+      a odświeżenie idzie w tle (najwyżej jedno naraz).
+    Zwraca None, gdy katalogu nie da się zbudować (np. brak połączenia XTB).
+    """
+    global _catalog
+    catalog = _catalog
+
+    if catalog is None:
+        records = cache.get(CATALOG_CACHE_KEY)
+        if records:
+            catalog = _catalog = SymbolCatalog(records)
+        else:
+            with _refresh_lock:
+                if _catalog is None:
+                    refresh_catalog(user.id)
+            return _catalog
+
+    if catalog.age > CATALOG_REFRESH_INTERVAL and _refresh_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_in_background, args=(user.id,), daemon=True).start()
+
+    return catalog
@@ -1,15 +1,29 @@
 # sync_bot_middleware.py
 
+import threading
+
 from django.conf import settings
-import requests
+from django.core.cache import cache
+from django.db import close_old_connections
 from home.models import Bot
+from home.microservice_client import service_for_broker
 from django.utils import timezone
-from django.contrib.auth.models import AnonymousUser
+
+# Co ile sekund (najczęściej) robimy zapasową synchronizację statusów botów danego usera.
+# Na co dzień statusy przychodzą z mikroserwisów przez bot_status_webhook.
+RESYNC_INTERVAL = getattr(settings, 'BOT_STATUS_RESYNC_INTERVAL', 300)
+# Co ile sekund (najczęściej) wejście na listę botów odświeża w tle statusy botów danego brokera.
+LIST_RESYNC_INTERVAL = getattr(settings, 'BOT_LIST_RESYNC_INTERVAL', 30)
+
 
 class SyncBotMiddleware:
     """
-    Middleware do synchronizacji statusu botów (XTB, BNB, D10)
-    z odpowiednimi mikroserwisami.
+    Middleware do synchronizacji statusu botów (XTB, BNB, D10).
+
+    Statusy są wypychane przez mikroserwisy do portalu (bot_status_webhook),
+    więc żądanie czyta już tylko lokalny Bot.status. Na wypadek zgubionego
+    zdarzenia raz na RESYNC_INTERVAL uruchamiamy w tle synchronizację
+    z mikroserwisami - nigdy w ścieżce żądania.
     """
 
     def __init__(self, get_response):
@@ -17,58 +31,92 @@ class SyncBotMiddleware:
 
     def __call__(self, request):
         if request.user.is_authenticated:
-            self.sync_bot_status(request)
-        else:
-            print("[SYNC BOT] Użytkownik niezalogowany, pomijam synchronizację botów.")
+            self.schedule_resync(request.user)
         response = self.get_response(request)
         return response
 
-    def sync_bot_status(self, request):
-        # Szukamy botów usera o statusie NEW lub RUNNING
-        bots = Bot.objects.filter(user=request.user, status__in=['NEW', 'RUNNING'])
-        for bot in bots:
-            try:
-                # Sprawdzamy, czy user ma token
-                if not hasattr(request.user, 'auth_token'):
-                    print(f"[SYNC BOT] Użytkownik {request.user.id} nie ma auth_token – pomijam.")
-                    continue
-                token = request.user.auth_token.key
-
-                # Bez microservice_bot_id nie możemy się komunikować
-                if not bot.microservice_bot_id:
-                    print(f"[SYNC BOT] Bot {bot.id} nie ma microservice_bot_id. Pomijam.")
-                    continue
-
-                # Rozróżniamy broker_type
-                if bot.broker_type == 'XTB':
-                    base_url = settings.MICROSERVICE_URL2
-                elif bot.broker_type == 'BNB':
-                    base_url = settings.BNB_MICROSERVICE_URL
-                else:
-                    # Zakładamy, że reszta to 'D10'
-                    base_url = settings.XTB_D
-
-                api_endpoint = f"{base_url}/get_bot_status/{bot.microservice_bot_id}/"
-
-                headers = {
-                    'Authorization': f'Token {token}'
-                }
-
-                resp = requests.get(api_endpoint, headers=headers, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    print(f"[SYNC BOT] Dane z mikroserwisu {bot.broker_type} dla bota {bot.id}: {data}")
-                    new_status = data.get("status")
-
-                    if new_status and bot.status != new_status:
-                        bot.status = new_status
-                        if new_status == 'FINISHED' and not bot.finished_at:
-                            bot.finished_at = timezone.now()
-                            print(f"[SYNC BOT] finished_at dla bota {bot.id} = {bot.finished_at}")
-                        bot.save()
-                        print(f"[SYNC BOT] Bot {bot.id} (micro_id={bot.microservice_bot_id}) zaktualizowany: {bot.status}")
-                else:
-                    print(f"[SYNC BOT] Błąd sync bota {bot.id}: {resp.status_code} {resp.text}")
-            except Exception as e:
-                print(f"[SYNC BOT] Błąd podczas sync bota {bot.id}: {e}")
+    def schedule_resync(self, user):
+        # cache.add jest atomowe - tylko jedno żądanie w oknie RESYNC_INTERVAL uruchamia wątek
+        if not cache.add(f"bot_status_resync:{user.id}", True, RESYNC_INTERVAL):
+            return
+        if not hasattr(user, 'auth_token'):
+            return
+        start_background_sync(user.id, user.auth_token.key)
+
+
+def schedule_list_resync(user, broker_type):
+    """
+    Widoki list botów pokazują statusy wypchnięte przez mikroserwisy (lokalny Bot.status).
+    Zapasowe odświeżenie statusów botów danego brokera idzie w tle,
+    najwyżej raz na LIST_RESYNC_INTERVAL - lista nie czeka na mikroserwis.
+    """
+    if not cache.add(f"bot_status_resync:{user.id}:{broker_type}", True, LIST_RESYNC_INTERVAL):
+        return
+    if not hasattr(user, 'auth_token'):
+        return
+    start_background_sync(user.id, user.auth_token.key, broker_types=[broker_type])
+
+
+def start_background_sync(user_id, token, broker_types=None):
+    threading.Thread(
+        target=_sync_in_background,
+        args=(user_id, token, broker_types),
+        daemon=True
+    ).start()
+
+
+def _sync_in_background(user_id, token, broker_types=None):
+    try:
+        sync_bot_status(user_id, token, broker_types=broker_types)
+    finally:
+        close_old_connections()
+
+
+def sync_bot_status(user_id, token, broker_types=None):
+    """
+    Synchronizuje status botów NEW/RUNNING usera z mikroserwisami:
+    jedno zapytanie POST /bot_statuses/ na mikroserwis, niezależnie od liczby botów.
+    """
+    # Szukamy botów usera o statusie NEW lub RUNNING
+    bots = Bot.objects.filter(user_id=user_id, status__in=['NEW', 'RUNNING'])
+    if broker_types:
+        bots = bots.filter(broker_type__in=broker_types)
+
+    # Grupujemy boty po mikroserwisie (zakładamy, że nieznane typy to 'D10')
+    by_broker = {}
+    for bot in bots:
+        # Bez microservice_bot_id nie możemy się komunikować
+        if not bot.microservice_bot_id:
+            print(f"[SYNC BOT] Bot {bot.id} nie ma microservice_bot_id. Pomijam.")
+            continue
+        broker = bot.broker_type if service_for_broker(bot.broker_type) else 'D10'
+        by_broker.setdefault(broker, {})[bot.microservice_bot_id] = bot
+
+    headers = {
+        'Authorization': f'Token {token}'
+    }
+
+    for broker, bots_by_micro_id in by_broker.items():
+        try:
+            resp = service_for_broker(broker).post(
+                "/bot_statuses/",
+                json={'bot_ids': list(bots_by_micro_id)},
+                headers=headers
+            )
+            if resp.status_code != 200:
+                print(f"[SYNC BOT] Błąd sync botów {broker}: {resp.status_code} {resp.text}")
+                continue
+
+            for item in resp.json().get('bots', []):
+                bot = bots_by_micro_id.get(item.get('bot_id'))
+                new_status = item.get('status')
 
+                if bot and new_status and bot.status != new_status:
+                    bot.status = new_status
+                    if new_status == 'FINISHED' and not bot.finished_at:
+                        bot.finished_at = timezone.now()
+                        print(f"[SYNC BOT] finished_at dla bota {bot.id} = {bot.finished_at}")
+                    bot.save(update_fields=['status', 'finished_at'])
+                    print(f"[SYNC BOT] Bot {bot.id} (micro_id={bot.microservice_bot_id}) zaktualizowany: {bot.status}")
+        except Exception as e:
+            print(f"[SYNC BOT] Błąd podczas sync botów {broker}: {e}")
@@ -1,3 +1,122 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from . import microservice_client
+from .microservice_client import CircuitBreaker, CircuitOpenError, MicroserviceClient
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(microservice_client.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, "CLOSED")
+        self.assertTrue(self.breaker.allow())
+
+        self.fail(1)
+        self.assertEqual(self.breaker.state, "OPEN")
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failure_count(self):
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, "CLOSED")
+
+    def test_half_open_lets_one_trial_request_through(self):
+        self.fail(3)
+        self.now += 30
+        self.assertEqual(self.breaker.state, "HALF_OPEN")
+        self.assertTrue(self.breaker.allow())
+        # Drugie zapytanie czeka na wynik próbnego
+        self.assertFalse(self.breaker.allow())
+
+    def test_trial_success_closes_circuit(self):
+        self.fail(3)
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "CLOSED")
+        self.assertTrue(self.breaker.allow())
+
+    def test_trial_failure_reopens_circuit(self):
+        self.fail(3)
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "OPEN")
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(TEST_SERVICE_URL="http://service.local/")
+class MicroserviceClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.client = MicroserviceClient("TEST", "TEST_SERVICE_URL")
+        self.client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        patcher = mock.patch.object(self.client.session, "request")
+        self.session_request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, status_code):
+        self.session_request.return_value = mock.Mock(status_code=status_code)
+
+    def test_builds_url_and_default_timeout(self):
+        self.respond(200)
+        self.client.get("/bots/")
+        self.session_request.assert_called_once_with(
+            "GET", "http://service.local/bots/", timeout=microservice_client.DEFAULT_TIMEOUT
+        )
+
+    def test_server_errors_open_circuit(self):
+        self.respond(503)
+        self.client.get("bots/")
+        self.client.get("bots/")
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.get("bots/")
+        self.assertEqual(self.session_request.call_count, 2)
+
+    def test_connection_errors_count_as_failures(self):
+        self.session_request.side_effect = requests.ConnectionError("refused")
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.client.post("bots/")
+        self.assertEqual(self.client.breaker.state, "OPEN")
+
+    def test_failed_trial_request_releases_half_open_slot(self):
+        breaker = self.client.breaker
+        breaker.opened_at = microservice_client.time.monotonic() - breaker.reset_timeout
+        self.session_request.side_effect = requests.TooManyRedirects("loop")
+        with self.assertRaises(requests.TooManyRedirects):
+            self.client.get("bots/")
+
+        # Kolejna próba po RESET_TIMEOUT musi znów przejść do mikroserwisu
+        breaker.opened_at -= breaker.reset_timeout
+        self.respond(200)
+        self.session_request.side_effect = None
+        self.client.get("bots/")
+        self.assertEqual(self.session_request.call_count, 2)
+        self.assertEqual(breaker.state, "CLOSED")
+
+    def test_client_errors_do_not_open_circuit(self):
+        self.respond(404)
+        for _ in range(3):
+            self.client.get("bots/999/")
+        self.assertEqual(self.client.breaker.state, "CLOSED")
+        self.assertEqual(self.session_request.call_count, 3)
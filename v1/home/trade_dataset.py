@@ -0,0 +1,118 @@
+# home/trade_dataset.py
+
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow jest opcjonalny - bez niego scalony eksport zwraca 501
+    pa = None
+    pq = None
+
+import requests
+
+from .microservice_client import xtb_service, bnb_service, d10_service
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Mikroserwisy zwracają ten sam schemat kolumn (broker, bot_id, level, ...)
+SERVICES = [
+    ("XTB", xtb_service),
+    ("BNB", bnb_service),
+    ("D10", d10_service),
+]
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Plik tylko do zapisu, z którego po każdej paczce odbieramy zapisane bajty.
+    tell() liczy wszystkie bajty, więc offsety w stopce Parquet są poprawne.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def open_broker_streams(token: str, params: dict):
+    """
+    Otwiera eksport Arrow IPC w każdym mikroserwisie.
+    Zwraca (readers, missing): listę (broker, response, reader) i listę brokerów,
+    których eksportu nie udało się pobrać.
+    """
+    headers = {"Authorization": f"Token {token}"}
+    readers = []
+    missing = []
+    for broker, service in SERVICES:
+        try:
+            resp = service.get(
+                "/export_trades/",
+                headers=headers,
+                params={**params, "output": "arrow"},
+                stream=True,
+                timeout=(2, 30)
+            )
+            if resp.status_code != 200:
+                print(f"[DATASET] {broker}: {resp.status_code} {resp.text[:200]}")
+                resp.close()
+                missing.append(broker)
+                continue
+            resp.raw.decode_content = True
+            readers.append((broker, resp, pa.ipc.open_stream(resp.raw)))
+        except (requests.RequestException, pa.ArrowInvalid) as e:
+            print(f"[DATASET] {broker}: {e}")
+            missing.append(broker)
+    return readers, missing
+
+
+def stream_merged(readers, output: str):
+    """
+    Przepisuje kolejne RecordBatch'e ze wszystkich mikroserwisów do jednego
+    pliku Arrow/Parquet - w pamięci jest naraz tylko jedna paczka.
+    """
+    schema = readers[0][2].schema
+    sink = _ChunkSink()
+    out = pa.PythonFile(sink, mode="w")
+    if output == "parquet":
+        writer = pq.ParquetWriter(out, schema)
+        write = lambda batch: writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+        write = writer.write_batch
+
+    try:
+        for broker, resp, reader in readers:
+            for batch in reader:
+                write(batch)
+                data = sink.drain()
+                if data:
+                    yield data
+        writer.close()
+        yield sink.drain()
+    finally:
+        for _, resp, _ in readers:
+            resp.close()
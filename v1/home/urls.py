@@ -43,6 +43,8 @@ urlpatterns = [
     path('d10/<int:bot_id>/remove/', views.d10_remove, name='d10_remove'),
     path('bot/<int:bot_id>/check_d10_connection/', views.check_d10_connection, name='check_d10_connection'),
     path('bot/<int:bot_id>/export_d10_trades/', views.export_d10_trades, name='export_d10_trades'),
+    path('export/trades/', views.export_trades_dataset, name='export_trades_dataset'),
+    path('bot_status_webhook/', views.bot_status_webhook, name='bot_status_webhook'),
 
 ]
 
@@ -1,5 +1,6 @@
 # views.py
 
+import hmac
 import logging
 import requests
 from django.conf import settings
@@ -12,16 +13,21 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.views.decorators.http import require_GET
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from .forms import CustomUserCreationForm, XTBConnectionForm, BotForm, BinanceApiForm
 from .models import XTBConnection, Bot
-from .xtb_connection_manager import XTBConnectionManager
+from .xtb_connection_manager import connection_manager
+from .microservice_client import xtb_service, bnb_service, d10_service, service_for_broker
+from .sync_bot_middleware import schedule_list_resync
+from .symbol_catalog import get_catalog
+from . import trade_dataset
 from .utils import get_token
 from datetime import datetime, timezone, timedelta
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone as django_timezone
 import csv
 from io import StringIO
 from .models import UserProfile
@@ -180,7 +186,7 @@ def history_view(request):
     """
     Przykładowa historia transakcji XTB.
     """
-    manager = XTBConnectionManager()
+    manager = connection_manager
     trade_history = []
 
     xtb_connection = XTBConnection.objects.filter(user=request.user, is_live=True).first()
@@ -198,7 +204,7 @@ def history_view(request):
 
     return render(request, 'history.html', {
         'history': trade_history,
-        'is_live': manager.connections.get(request.user.id, {}).get('is_connected', False)
+        'is_live': manager.is_connected(request.user.id)
     })
 
 
@@ -227,7 +233,7 @@ def register_view(request):
             microservices = [
                 {
                     'name': 'XTB',
-                    'url': f"{settings.MICROSERVICE_URL2}/register_token/",
+                    'client': xtb_service,
                     'headers': {
                         'Authorization': f'Bearer {settings.MICROSERVICE_API_TOKEN}',
                         'Content-Type': 'application/json',
@@ -235,7 +241,7 @@ def register_view(request):
                 },
                 {
                     'name': 'BNB',
-                    'url': f"{settings.BNB_MICROSERVICE_URL}/register_token/",
+                    'client': bnb_service,
                     'headers': {
                         'Authorization': f'Bearer {settings.MICROSERVICE_API_TOKEN}',
                         'Content-Type': 'application/json',
@@ -243,7 +249,7 @@ def register_view(request):
                 },
                 {
                     'name': 'D510',
-                    'url': f"{settings.XTB_D}/register_token/",
+                    'client': d10_service,
                     'headers': {
                         'Authorization': f'Bearer {settings.MICROSERVICE_API_TOKEN}',
                         'Content-Type': 'application/json',
@@ -257,11 +263,10 @@ def register_view(request):
                         'user_id': user.id,
                         'token': token.key
                     }
-                    response = requests.post(
-                        service['url'],
+                    response = service['client'].post(
+                        "/register_token/",
                         json=payload,
-                        headers=service['headers'],
-                        timeout=5
+                        headers=service['headers']
                     )
                     if response.status_code == 200:
                         messages.success(request, f"Token wysłany do mikroserwisu {service['name']}.")
@@ -290,7 +295,7 @@ def dashboard_view(request):
     """
     Prosty widok 'dashboard' np. do XTB (otwarte pozycje, pending orders itd.)
     """
-    manager = XTBConnectionManager()
+    manager = connection_manager
     open_trades = []
     pending_orders = []
     recent_trades = []
@@ -312,7 +317,7 @@ def dashboard_view(request):
         recent_trades = closed_response.get("returnData", [])
 
     return render(request, 'dashboard.html', {
-        'is_live': manager.connections.get(request.user.id, {}).get('is_connected', False),
+        'is_live': manager.is_connected(request.user.id),
         'open_trades': open_trades,
         'pending_orders': pending_orders,
         'recent_trades': recent_trades,
@@ -324,7 +329,7 @@ def get_balance_data(request):
     """
     Przykład pobrania stanu konta XTB (marginLevel).
     """
-    manager = XTBConnectionManager()
+    manager = connection_manager
     xtb_connection = XTBConnection.objects.filter(user=request.user, is_live=True).first()
     if not xtb_connection:
         return JsonResponse({"error": "No active XTB connection."}, status=400)
@@ -353,7 +358,7 @@ def get_instrument_price(request):
     """
     Przykład pobierania ceny z XTB (getSymbol).
     """
-    manager = XTBConnectionManager()
+    manager = connection_manager
     symbol = request.GET.get('symbol', '').strip()
     if not symbol:
         return JsonResponse({"error": "Parameter 'symbol' is required."}, status=400)
@@ -376,55 +381,25 @@ def get_instrument_price(request):
 @login_required
 def search_instruments(request):
     """
-    Przykład wyszukiwania instrumentów w XTB (getAllSymbols).
+    Podpowiedzi instrumentów XTB - z katalogu symboli w pamięci (bez zapytania do XTB).
     """
-    manager = XTBConnectionManager()
-    query = request.GET.get('q', '').upper()
-    matches = []
+    catalog = get_catalog(request.user)
+    if catalog is None:
+        return JsonResponse({"error": "Symbol catalog unavailable (no active XTB connection)."}, status=400)
 
-    xtb_connection = XTBConnection.objects.filter(user=request.user, is_live=True).first()
-    if not xtb_connection:
-        return JsonResponse({"error": "No active XTB connection."}, status=400)
-
-    if not manager.connect(xtb_connection=xtb_connection):
-        return JsonResponse({"error": "Failed to connect to XTB API."}, status=400)
-
-    response = manager.send_command(request.user.id, "getAllSymbols")
-    if response and response.get("status"):
-        all_symbols = response.get("returnData", [])
-        matches = [s for s in all_symbols if query in s.get('symbol', '').upper()]
-
-    return JsonResponse(matches[:10], safe=False)
+    return JsonResponse(catalog.search(request.GET.get('q', '')), safe=False)
 
 
 @login_required
 def show_symbols_view(request):
     """
-    Przykład wypisania wszystkich symboli z XTB (getAllSymbols).
+    Lista wszystkich symboli XTB (getAllSymbols) z wspólnego katalogu symboli.
     """
-    manager = XTBConnectionManager()
-    selected_data = []
-
-    xtb_connection = XTBConnection.objects.filter(user=request.user, is_live=True).first()
-    if not xtb_connection:
-        return JsonResponse({"error": "No active XTB connection."}, status=400)
-
-    if not manager.connect(xtb_connection=xtb_connection):
-        return JsonResponse({"error": "Failed to connect to XTB API."}, status=400)
+    catalog = get_catalog(request.user)
+    if catalog is None:
+        return JsonResponse({"error": "Symbol catalog unavailable (no active XTB connection)."}, status=400)
 
-    response = manager.send_command(request.user.id, "getAllSymbols")
-    if response and response.get("status"):
-        all_symbols = response.get("returnData", [])
-        for sym_info in all_symbols:
-            selected_data.append({
-                "symbol": sym_info.get('symbol'),
-                "currency": sym_info.get('currency'),
-                "categoryName": sym_info.get('categoryName'),
-                "description": sym_info.get('description'),
-                "leverage": sym_info.get('leverage'),
-            })
-
-    return JsonResponse(selected_data, safe=False)
+    return JsonResponse(catalog.summary, safe=False)
 
 
 def get_stock_market_status():
@@ -519,9 +494,11 @@ def bot_list(request):
     """
     Pokazuje listę wszystkich botów zalogowanego użytkownika, które są BNB.
     """
+    schedule_list_resync(request.user, 'XTB')
     user_bots = Bot.objects.filter(user=request.user, broker_type='XTB').order_by('-created_at')
     return render(request, 'bot_list.html', {'bots': user_bots})
 
+
 #######################################################################
 #              PODSTAWOWE WIDOKI do OBSŁUGI XTB (EXAMPLE)             #
 #######################################################################
@@ -574,7 +551,7 @@ def bot_add(request):
         }
 
         try:
-            resp = requests.post(f"{settings.MICROSERVICE_URL2}/create_bot/", json=payload, headers=headers, timeout=5)
+            resp = xtb_service.post("/create_bot/", json=payload, headers=headers)
             if resp.status_code == 200:
                 data = resp.json()
                 new_bot.microservice_bot_id = data.get("bot_id")
@@ -600,7 +577,7 @@ def bot_detail(request, bot_id):
     bot = get_object_or_404(Bot, id=bot_id, user=request.user)
     
     # Endpoint mikroserwisu do pobierania danych bota
-    api_endpoint = f"{settings.MICROSERVICE_URL2}/get_bot_details/{bot.microservice_bot_id}/"
+    api_endpoint = f"/get_bot_details/{bot.microservice_bot_id}/"
     
     # Pobierz dynamiczny token
     microservice_token = get_token(request.user.id)
@@ -613,7 +590,7 @@ def bot_detail(request, bot_id):
     }
     
     try:
-        response = requests.get(api_endpoint, headers=headers, timeout=5)
+        response = xtb_service.get(api_endpoint, headers=headers)
         response.raise_for_status()
         bot_details = response.json()
         
@@ -651,7 +628,7 @@ def bot_remove(request, bot_id):
             messages.success(request, "Bot usunięty lokalnie (brak identyfikatora w mikroserwisie).")
             return redirect('bot_list')
 
-        microservice_remove_url = f"{settings.MICROSERVICE_URL2}/remove_bot/{bot.microservice_bot_id}/"
+        microservice_remove_url = f"/remove_bot/{bot.microservice_bot_id}/"
 
         # Pobierz dynamiczny token zamiast używać ustawień
         microservice_token = get_token(request.user.id)
@@ -670,7 +647,7 @@ def bot_remove(request, bot_id):
         }
 
         try:
-            resp = requests.post(microservice_remove_url, json=payload, headers=headers, timeout=5)
+            resp = xtb_service.post(microservice_remove_url, json=payload, headers=headers)
             if resp.status_code == 200:
                 # Mikroserwis potwierdził usunięcie -> usuwamy bota lokalnie
                 bot.delete()
@@ -747,12 +724,7 @@ def bnb_create(request):
         }
 
         try:
-            resp = requests.post(
-                f"{settings.BNB_MICROSERVICE_URL}/create_bot/",
-                json=payload,
-                headers=headers,
-                timeout=5
-            )
+            resp = bnb_service.post("/create_bot/", json=payload, headers=headers)
             if resp.status_code == 200:
                 data = resp.json()
                 local_bot.microservice_bot_id = data.get("bot_id")
@@ -793,10 +765,10 @@ def bnb_detail(request, bot_id):
         return redirect('bot_list')
 
     headers = {'Authorization': f'Token {microservice_token}'}
-    url = f"{settings.BNB_MICROSERVICE_URL}/get_bot_details/{bot.microservice_bot_id}/"
+    url = f"/get_bot_details/{bot.microservice_bot_id}/"
 
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = bnb_service.get(url, headers=headers)
         if resp.status_code == 200:
             bot_details = resp.json()
             ms_status = bot_details.get("status")
@@ -844,8 +816,8 @@ def bnb_delete(request, bot_id):
         }
         payload = {"user_id": request.user.id}
         try:
-            url = f"{settings.BNB_MICROSERVICE_URL}/remove_bot/{bot.microservice_bot_id}/"
-            resp = requests.post(url, json=payload, headers=headers, timeout=5)
+            url = f"/remove_bot/{bot.microservice_bot_id}/"
+            resp = bnb_service.post(url, json=payload, headers=headers)
             if resp.status_code == 200:
                 bot.delete()
                 messages.success(request, "Bot usunięty w bnbbot1 i lokalnie.")
@@ -878,10 +850,10 @@ def bnb_status(request, bot_id):
         return JsonResponse({"error": "No microservice token available."}, status=400)
 
     headers = {'Authorization': f'Token {microservice_token}'}
-    url = f"{settings.BNB_MICROSERVICE_URL}/get_bot_details/{bot.microservice_bot_id}/"
+    url = f"/get_bot_details/{bot.microservice_bot_id}/"
 
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = bnb_service.get(url, headers=headers)
         resp.raise_for_status()
         data = resp.json()
         ms_status = data.get("status", "UNKNOWN")
@@ -899,9 +871,35 @@ def bnb_list(request):
     """
     Pokazuje listę wszystkich botów zalogowanego użytkownika, które są BNB.
     """
+    schedule_list_resync(request.user, 'BNB')
     user_bots = Bot.objects.filter(user=request.user, broker_type='BNB').order_by('-created_at')
     return render(request, 'bnb_list.html', {'bots': user_bots})
 
+def _date_range_params(request):
+    """
+    Przekazuje do mikroserwisu opcjonalny zakres dat eksportu (?date_from=&date_to=).
+    """
+    return {k: request.GET[k] for k in ('date_from', 'date_to') if request.GET.get(k)}
+
+
+def _csv_proxy_response(upstream, filename):
+    """
+    StreamingHttpResponse przepuszczający CSV z mikroserwisu kawałkami
+    (w pamięci jest tylko bieżący chunk). Połączenie wraca do puli po zakończeniu.
+    """
+    def chunks():
+        try:
+            for chunk in upstream.iter_content(chunk_size=64 * 1024):
+                if chunk:
+                    yield chunk
+        finally:
+            upstream.close()
+
+    response = StreamingHttpResponse(chunks(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def export_bnb_trades(request, bot_id):
     """
@@ -923,7 +921,7 @@ def export_bnb_trades(request, bot_id):
         return redirect('bnb_detail', bot_id=bot_id)
 
     # Budujemy URL do mikroserwisu:
-    url = f"{settings.BNB_MICROSERVICE_URL}/export_bnb_trades_csv/{bot.microservice_bot_id}/"
+    url = f"/export_bnb_trades_csv/{bot.microservice_bot_id}/"
 
     # Ustawiamy nagłówek autoryzacji:
     headers = {
@@ -932,18 +930,11 @@ def export_bnb_trades(request, bot_id):
 
     try:
         # Odpytujemy mikroserwis, używając stream=True, by pobierać dane kawałkami
-        r = requests.get(url, headers=headers, stream=True, timeout=10)
+        r = bnb_service.get(url, headers=headers, params=_date_range_params(request), stream=True, timeout=(2, 10))
 
         if r.status_code == 200:
-            # Przygotowujemy własną odpowiedź HTTP
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
-
-            # Przepuszczamy strumień do odpowiedzi
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    response.write(chunk)
-            return response
+            # Przepuszczamy strumień do użytkownika bez buforowania całego pliku
+            return _csv_proxy_response(r, f"bot_{bot_id}_trades.csv")
         else:
             # Mikroserwis nie zwrócił 200 => błąd
             messages.error(request, f"Błąd mikroserwisu podczas generowania CSV: {r.status_code} {r.text}")
@@ -964,13 +955,8 @@ def export_bnb_trades(request, bot_id):
 def get_bot_status(request, bot_id):
     bot = get_object_or_404(Bot, id=bot_id, user=request.user)
 
-    if bot.broker_type == 'XTB':
-        base_url = settings.MICROSERVICE_URL2
-    elif bot.broker_type == 'BNB':
-        base_url = settings.BNB_MICROSERVICE_URL
-    elif bot.broker_type == 'D10':
-        base_url = settings.XTB_D
-    else:
+    service = service_for_broker(bot.broker_type)
+    if service is None:
         return JsonResponse({"error": "Unknown broker type."}, status=400)
 
     if not bot.microservice_bot_id:
@@ -981,10 +967,10 @@ def get_bot_status(request, bot_id):
         return JsonResponse({"error": "No microservice token."}, status=400)
 
     headers = {'Authorization': f'Token {microservice_token}'}
-    url = f"{base_url}/get_bot_details/{bot.microservice_bot_id}/"
+    url = f"/get_bot_details/{bot.microservice_bot_id}/"
 
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = service.get(url, headers=headers)
         resp.raise_for_status()
         details = resp.json()
         ms_status = details.get("status")
@@ -1020,7 +1006,7 @@ def export_bot_trades(request, bot_id):
         return redirect('bot_detail', bot_id=bot_id)
 
     # Budujemy URL do mikroserwisu:
-    url = f"{settings.MICROSERVICE_URL2}/export_bot_trades_csv/{bot.microservice_bot_id}/"
+    url = f"/export_bot_trades_csv/{bot.microservice_bot_id}/"
 
     # Ustawiamy nagłówek autoryzacji:
     headers = {
@@ -1029,18 +1015,11 @@ def export_bot_trades(request, bot_id):
 
     try:
         # Odpytujemy mikroserwis, używając stream=True, by pobierać dane kawałkami
-        r = requests.get(url, headers=headers, stream=True, timeout=10)
+        r = xtb_service.get(url, headers=headers, params=_date_range_params(request), stream=True, timeout=(2, 10))
 
         if r.status_code == 200:
-            # Przygotowujemy własną odpowiedź HTTP
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
-
-            # Przepuszczamy strumień do odpowiedzi
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    response.write(chunk)
-            return response
+            # Przepuszczamy strumień do użytkownika bez buforowania całego pliku
+            return _csv_proxy_response(r, f"bot_{bot_id}_trades.csv")
         else:
             # Mikroserwis nie zwrócił 200 => błąd
             messages.error(request, f"Błąd mikroserwisu podczas generowania CSV: {r.status_code} {r.text}")
@@ -1072,12 +1051,12 @@ def check_broker_connection(request, bot_id):
         }, status=400)
 
     # Wołanie mikroserwisu:
-    url = f"{settings.MICROSERVICE_URL2}/check_xtb_connection/{bot.microservice_bot_id}/"
+    url = f"/check_xtb_connection/{bot.microservice_bot_id}/"
     headers = {
         "Authorization": f"Token {microservice_token}"
     }
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = xtb_service.get(url, headers=headers)
         resp_json = resp.json()
         if resp.status_code == 200:
             return JsonResponse({"ok": True, "message": resp_json.get("message")}, status=200)
@@ -1095,6 +1074,7 @@ def d10_list(request):
     """
     Pokazuje listę wszystkich botów zalogowanego użytkownika, które są BNB.
     """
+    schedule_list_resync(request.user, 'D10')
     user_bots = Bot.objects.filter(user=request.user, broker_type='D10').order_by('-created_at')
     return render(request, 'd10_list.html', {'bots': user_bots})
 
@@ -1163,12 +1143,7 @@ def d10_add(request):
         print("[DEBUG d10_add] Payload do mikroserwisu =>", payload)
 
         try:
-            resp = requests.post(
-                f"{settings.XTB_D}/create_bot/",
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
+            resp = d10_service.post("/create_bot/", json=payload, headers=headers, timeout=(2, 10))
             print(f"[DEBUG d10_add] Odpowiedź mikroserwisu => status={resp.status_code}, text={resp.text}")
 
             if resp.status_code == 200:
@@ -1198,7 +1173,7 @@ def d10_add(request):
 def d10_detail(request, bot_id):
     bot = get_object_or_404(Bot, id=bot_id, user=request.user)
     
-    api_endpoint = f"{settings.XTB_D}/get_bot_details/{bot.microservice_bot_id}/"
+    api_endpoint = f"/get_bot_details/{bot.microservice_bot_id}/"
     
     microservice_token = get_token(request.user.id)
     if not microservice_token:
@@ -1207,7 +1182,7 @@ def d10_detail(request, bot_id):
 
     headers = {'Authorization': f"Token {microservice_token}"}
     try:
-        response = requests.get(api_endpoint, headers=headers, timeout=5)
+        response = d10_service.get(api_endpoint, headers=headers)
         response.raise_for_status()
         bot_details = response.json()
 
@@ -1243,7 +1218,7 @@ def d10_remove(request, bot_id):
             messages.success(request, "Bot usunięty lokalnie (brak microservice_bot_id).")
             return redirect('d10_list')
 
-        microservice_remove_url = f"{settings.XTB_D}/remove_bot/{bot.microservice_bot_id}/"
+        microservice_remove_url = f"/remove_bot/{bot.microservice_bot_id}/"
         microservice_token = get_token(request.user.id)
         if not microservice_token:
             bot.delete()
@@ -1257,7 +1232,7 @@ def d10_remove(request, bot_id):
         payload = {'user_id': request.user.id}
 
         try:
-            resp = requests.post(microservice_remove_url, json=payload, headers=headers, timeout=5)
+            resp = d10_service.post(microservice_remove_url, json=payload, headers=headers)
             if resp.status_code == 200:
                 bot.delete()
                 messages.success(request, "Bot usunięty w mikroserwisie i lokalnie.")
@@ -1288,18 +1263,14 @@ def export_d10_trades(request, bot_id):
         messages.error(request, "Brak tokena mikroserwisu – nie można pobrać CSV.")
         return redirect('d10_detail', bot_id=bot_id)
 
-    url = f"{settings.XTB_D}/export_d10_trades_csv/{bot.microservice_bot_id}/"
+    url = f"/export_d10_trades_csv/{bot.microservice_bot_id}/"
     headers = {"Authorization": f"Token {microservice_token}"}
 
     try:
-        r = requests.get(url, headers=headers, stream=True, timeout=10)
+        r = d10_service.get(url, headers=headers, params=_date_range_params(request), stream=True, timeout=(2, 10))
         if r.status_code == 200:
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    response.write(chunk)
-            return response
+            # Przepuszczamy strumień do użytkownika bez buforowania całego pliku
+            return _csv_proxy_response(r, f"bot_{bot_id}_trades.csv")
         else:
             messages.error(
                 request,
@@ -1310,6 +1281,37 @@ def export_d10_trades(request, bot_id):
         messages.error(request, f"Nie można pobrać CSV: {str(e)}")
         return redirect('d10_detail', bot_id=bot_id)
 
+
+@login_required
+def export_trades_dataset(request):
+    """
+    Jeden plik Arrow/Parquet z transakcjami użytkownika ze wszystkich mikroserwisów
+    (XTB, BNB, D10) - do analiz w pandas/polars/DuckDB.
+    ?output=arrow|parquet (domyślnie parquet), opcjonalnie ?date_from=&date_to=.
+    """
+    if not trade_dataset.columnar_available():
+        return JsonResponse({"error": "Eksport kolumnowy wymaga pakietu pyarrow."}, status=501)
+
+    output = request.GET.get('output', 'parquet')
+    if output not in trade_dataset.FORMATS:
+        return JsonResponse({"error": f"Nieznany format: {output}"}, status=400)
+
+    microservice_token = get_token(request.user.id)
+    if not microservice_token:
+        return JsonResponse({"error": "Brak tokena mikroserwisu."}, status=400)
+
+    readers, missing = trade_dataset.open_broker_streams(microservice_token, _date_range_params(request))
+    if not readers:
+        return JsonResponse({"error": "Żaden mikroserwis nie zwrócił danych.", "missing": missing}, status=502)
+
+    content_type, extension = trade_dataset.FORMATS[output]
+    response = StreamingHttpResponse(trade_dataset.stream_merged(readers, output), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="trades.{extension}"'
+    if missing:
+        # Plik jest niepełny - informujemy klienta, których brokerów brakuje
+        response['X-Missing-Brokers'] = ",".join(missing)
+    return response
+
 @login_required
 def check_d10_connection(request, bot_id):
     """
@@ -1330,11 +1332,11 @@ def check_d10_connection(request, bot_id):
             "message": "Brak tokena mikroserwisu."
         }, status=400)
 
-    url = f"{settings.XTB_D}/check_d10_connection/{bot.microservice_bot_id}/"
+    url = f"/check_d10_connection/{bot.microservice_bot_id}/"
     headers = {"Authorization": f"Token {microservice_token}"}
 
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = d10_service.get(url, headers=headers)
         data = resp.json()
         if resp.status_code == 200:
             return JsonResponse({"ok": True, "message": data.get("message")}, status=200)
@@ -1353,13 +1355,8 @@ def check_d10_connection(request, bot_id):
 def get_bot_details_proxy(request, bot_id):
     bot = get_object_or_404(Bot, id=bot_id, user=request.user)
 
-    if bot.broker_type == 'XTB':
-        base_url = settings.MICROSERVICE_URL2
-    elif bot.broker_type == 'BNB':
-        base_url = settings.BNB_MICROSERVICE_URL
-    elif bot.broker_type == 'D10':
-        base_url = settings.XTB_D  # <-- TUTAJ! Musi wskazywać na mikroserwis D10
-    else:
+    service = service_for_broker(bot.broker_type)
+    if service is None:
         return JsonResponse({"error": "Broker type unknown"}, status=400)
 
     if not bot.microservice_bot_id:
@@ -1370,10 +1367,10 @@ def get_bot_details_proxy(request, bot_id):
         return JsonResponse({"error": "No microservice token."}, status=400)
 
     headers = {'Authorization': f'Token {microservice_token}'}
-    url = f"{base_url}/get_bot_details/{bot.microservice_bot_id}/"
+    url = f"/get_bot_details/{bot.microservice_bot_id}/"
 
     try:
-        resp = requests.get(url, headers=headers, timeout=5)
+        resp = service.get(url, headers=headers)
         resp.raise_for_status()
         bot_details = resp.json()
         return JsonResponse(bot_details)
@@ -1386,3 +1383,42 @@ def get_bot_details_proxy(request, bot_id):
     except ValueError as json_err:
         logger.error(f"JSON decode error for bot_id={bot_id}: {json_err}")
         return JsonResponse({"error": "Błąd dekodowania danych z mikroserwisu."}, status=500)
+
+
+#################################
+####### STATUSY Z MIKROSERWISÓW ###########
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def bot_status_webhook(request):
+    """
+    Mikroserwisy (XTB, BNB, D10) zgłaszają tu zmiany statusu swoich botów,
+    dzięki czemu portal nie musi odpytywać ich przy każdym żądaniu.
+    Autoryzacja: nagłówek "Bearer <MICROSERVICE_API_TOKEN>".
+    """
+    # compare_digest - czas porównania nie zdradza, ile znaków tokena się zgadza
+    expected = f"Bearer {settings.MICROSERVICE_API_TOKEN}"
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+        return Response({'error': 'Invalid or missing microservice token'}, status=403)
+
+    broker_type = request.data.get('broker_type')
+    microservice_bot_id = request.data.get('bot_id')
+    user_id = request.data.get('user_id')
+    new_status = request.data.get('status')
+
+    if broker_type not in dict(Bot.BROKER_CHOICES) or new_status not in dict(Bot.STATUS_CHOICES):
+        return Response({'error': 'Unknown broker_type or status'}, status=400)
+    if not microservice_bot_id or not user_id:
+        return Response({'error': 'bot_id and user_id are required'}, status=400)
+
+    bots = Bot.objects.filter(
+        user_id=user_id,
+        broker_type=broker_type,
+        microservice_bot_id=microservice_bot_id
+    )
+    updated = bots.update(status=new_status)
+    if new_status == 'FINISHED':
+        bots.filter(finished_at__isnull=True).update(finished_at=django_timezone.now())
+
+    print(f"[STATUS WEBHOOK] {broker_type} bot {microservice_bot_id} (user={user_id}) -> {new_status}, zaktualizowano: {updated}")
+    return Response({'updated': updated})
@@ -12,100 +12,138 @@ import json
 FERNET_KEY = 'GiLFpoI4-TzsPAheWRYytzPXuOlZVHOz5FrZsjHYZSk='
 fernet = Fernet(FERNET_KEY)
 
+PING_INTERVAL = 300        # co ile sekund pingujemy aktywne sesje (XTB zamyka bezczynne po ~10 min)
+SESSION_IDLE_TTL = 1800    # po ilu sekundach bez komend sesja jest zamykana
+
 class XTBConnectionManager:
+    """
+    Wspólna dla procesu pula zalogowanych sesji XTB (jedna na użytkownika).
+    Widoki używają instancji `connection_manager` - login wykonywany jest tylko raz,
+    kolejne komendy idą po tym samym websockecie.
+    Komendy na jednym sockecie są serializowane (send + recv pod blokadą sesji),
+    bo XTB odpowiada w kolejności zapytań.
+    """
+
     def __init__(self):
         self.connections = {}  # Klucz: user_id, wartość: połączenie
+        self._lock = threading.Lock()
+        self._user_locks = {}  # user_id -> blokada logowania (jeden login naraz na usera)
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def is_connected(self, user_id):
+        conn = self.connections.get(user_id)
+        return bool(conn and conn['is_connected'])
 
     def connect(self, xtb_connection):
         """Łączy się z API XTB i uzyskuje stream_session_id dla danego użytkownika."""
-        user_id = xtb_connection.user.id
+        user_id = xtb_connection.user_id
 
-        if user_id in self.connections and self.connections[user_id]['is_connected']:
-            print(f"🟢 Użytkownik {user_id} jest już połączony z XTB API.")
+        if self.is_connected(user_id):
             return True
 
-        xtb_id = xtb_connection.xtb_id
-        try:
-            password = fernet.decrypt(xtb_connection.password).decode('utf-8')
-        except Exception as e:
-            print(f"🔴 Błąd deszyfrowania hasła dla użytkownika {user_id}: {e}")
-            return False
+        with self._user_lock(user_id):
+            # Inny wątek mógł zalogować usera, gdy czekaliśmy na blokadę
+            if self.is_connected(user_id):
+                return True
 
-        try:
-            ws = websocket.create_connection("wss://ws.xtb.com/demo")
-            login_request = {
-                "command": "login",
-                "arguments": {
-                    "userId": xtb_id,
-                    "password": password
-                }
-            }
-            ws.send(json.dumps(login_request))
-            response = json.loads(ws.recv())
-
-            if response.get("status") is True and "streamSessionId" in response:
-                stream_session_id = response["streamSessionId"]
-                xtb_connection.stream_session_id = stream_session_id
-                xtb_connection.is_live = True
-                xtb_connection.save()
-
-                self.connections[user_id] = {
-                    'ws': ws,
-                    'stream_session_id': stream_session_id,
-                    'is_connected': True
-                }
+            xtb_id = xtb_connection.xtb_id
+            try:
+                password = fernet.decrypt(xtb_connection.password).decode('utf-8')
+            except Exception as e:
+                print(f"🔴 Błąd deszyfrowania hasła dla użytkownika {user_id}: {e}")
+                return False
 
-                print(f"🟢 Połączono użytkownika {user_id} z XTB API. streamSessionId: {stream_session_id}")
-                return True
-            else:
-                print(f"🔴 Nie udało się połączyć użytkownika {user_id} z XTB API: {response}")
+            try:
+                ws = websocket.create_connection("wss://ws.xtb.com/demo")
+                login_request = {
+                    "command": "login",
+                    "arguments": {
+                        "userId": xtb_id,
+                        "password": password
+                    }
+                }
+                ws.send(json.dumps(login_request))
+                response = json.loads(ws.recv())
+
+                if response.get("status") is True and "streamSessionId" in response:
+                    stream_session_id = response["streamSessionId"]
+                    xtb_connection.stream_session_id = stream_session_id
+                    xtb_connection.is_live = True
+                    xtb_connection.save(update_fields=['stream_session_id', 'is_live'])
+
+                    now = time.monotonic()
+                    with self._lock:
+                        self.connections[user_id] = {
+                            'ws': ws,
+                            'stream_session_id': stream_session_id,
+                            'is_connected': True,
+                            'lock': threading.Lock(),
+                            'last_used': now,
+                        }
+
+                    print(f"🟢 Połączono użytkownika {user_id} z XTB API. streamSessionId: {stream_session_id}")
+                    return True
+                else:
+                    ws.close()
+                    print(f"🔴 Nie udało się połączyć użytkownika {user_id} z XTB API: {response}")
+                    return False
+            except Exception as e:
+                print(f"🔴 Błąd połączenia użytkownika {user_id} z XTB API: {e}")
                 return False
-        except Exception as e:
-            print(f"🔴 Błąd połączenia użytkownika {user_id} z XTB API: {e}")
-            return False
 
     def disconnect(self, user_id):
-        """Rozłącza aktywne połączenie dla danego użytkownika."""
-        if user_id in self.connections and self.connections[user_id]['is_connected']:
-            ws = self.connections[user_id]['ws']
-            ws.close()
-            self.connections[user_id]['is_connected'] = False
+        """Rozłącza aktywne połączenie dla danego użytkownika i usuwa je z puli."""
+        with self._lock:
+            conn = self.connections.pop(user_id, None)
+        if conn and conn['is_connected']:
+            conn['is_connected'] = False
+            try:
+                conn['ws'].close()
+            except Exception:
+                pass
             print(f"🟡 Rozłączono użytkownika {user_id} z XTB API.")
 
     def ping(self, user_id):
         """Ping dla utrzymania aktywnej sesji dla danego użytkownika."""
-        if user_id not in self.connections or not self.connections[user_id]['is_connected']:
+        conn = self.connections.get(user_id)
+        if not conn or not conn['is_connected']:
             print(f"🔴 Brak aktywnego połączenia dla użytkownika {user_id} do pingowania.")
             return
 
         try:
             ping_request = {"command": "ping"}
-            ws = self.connections[user_id]['ws']
-            ws.send(json.dumps(ping_request))
-            self.connections[user_id]['last_ping'] = datetime.now()
-            print(f"🟢 Ping wysłany do XTB API dla użytkownika {user_id}.")
+            with conn['lock']:
+                conn['ws'].send(json.dumps(ping_request))
+                # XTB odpowiada na ping {"status": true} - odczytujemy, żeby nie rozjechać kolejki odpowiedzi
+                conn['ws'].recv()
+            conn['last_ping'] = datetime.now()
         except Exception as e:
             print(f"🔴 Błąd pingowania dla użytkownika {user_id}: {e}")
             self.disconnect(user_id)
-            # Opcjonalnie spróbuj ponownie połączyć
-            # self.connect(xtb_connection)
 
     def send_command(self, user_id, command, arguments=None):
         """Wysyła komendę do API XTB dla danego użytkownika."""
-        if user_id not in self.connections or not self.connections[user_id]['is_connected']:
-            print(f"🔴 Nie ma aktywnego połączenia dla użytkownika {user_id}. Próba ponownego połączenia.")
+        if not self.is_connected(user_id):
             xtb_connection = XTBConnection.objects.filter(user_id=user_id, is_live=True).first()
             if not xtb_connection or not self.connect(xtb_connection):
                 return None
 
+        conn = self.connections.get(user_id)
+        if not conn:
+            return None
+
         try:
             request = {
                 "command": command,
                 "arguments": arguments or {}
             }
-            ws = self.connections[user_id]['ws']
-            ws.send(json.dumps(request))
-            response_data = ws.recv()
+            with conn['lock']:
+                conn['last_used'] = time.monotonic()
+                conn['ws'].send(json.dumps(request))
+                response_data = conn['ws'].recv()
             if not response_data.strip():
                 return None
             response = json.loads(response_data)
@@ -115,16 +153,33 @@ class XTBConnectionManager:
             self.disconnect(user_id)
             return None
 
+    def evict_idle(self, idle_ttl=SESSION_IDLE_TTL):
+        """Zamyka sesje, po których nie wysłano komendy od idle_ttl sekund."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [uid for uid, conn in self.connections.items() if now - conn['last_used'] > idle_ttl]
+        for user_id in idle:
+            self.disconnect(user_id)
+
+
+connection_manager = XTBConnectionManager()
+_ping_thread_started = False
+
 
 # Automatyczne pingowanie w tle
 def start_ping_thread():
-    manager = XTBConnectionManager()
+    global _ping_thread_started
+    if _ping_thread_started:
+        return
+    _ping_thread_started = True
+
+    manager = connection_manager
     def ping_loop():
         while True:
-            for user_id, conn in manager.connections.items():
-                if conn['is_connected']:
-                    manager.ping(user_id)
-            time.sleep(300)  # Ping co 5 minut
+            time.sleep(PING_INTERVAL)  # Ping co 5 minut
+            manager.evict_idle()
+            for user_id in list(manager.connections):
+                manager.ping(user_id)
 
     ping_thread = threading.Thread(target=ping_loop, daemon=True)
     ping_thread.start()
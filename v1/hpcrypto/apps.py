@@ -1,6 +1,19 @@
+import sys
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class HpcryptoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hpcrypto'
+
+    def ready(self):
+        # The push dispatcher can be switched off per process (e.g. extra web workers);
+        # it never runs during migrations or tests, which call dispatch_pending() directly
+        if not getattr(settings, 'HPCRYPTO_DISPATCHER_ENABLED', True):
+            return
+        if 'makemigrations' in sys.argv or 'migrate' in sys.argv or 'test' in sys.argv:
+            return
+
+        from .notifications import start_notification_dispatcher
+        start_notification_dispatcher()
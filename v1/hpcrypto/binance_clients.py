@@ -0,0 +1,77 @@
+# hpcrypto/binance_clients.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from binance.client import Client
+from requests.adapters import HTTPAdapter
+
+MAX_CLIENTS = 256        # max number of cached clients (LRU)
+CLIENT_IDLE_TTL = 600    # seconds of inactivity before a client is evicted
+POOL_MAXSIZE = 10        # keep-alive connections per client (server threads)
+
+
+class ClientRegistry:
+    """Process-wide registry of python-binance clients.
+
+    Keyed by (api_key, sha256 of the encrypted secret), so a cache hit needs
+    neither a Fernet decrypt nor a new Client() (no ping, no new HTTPS session).
+    """
+
+    def __init__(self, max_size: int = MAX_CLIENTS, idle_ttl: float = CLIENT_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._clients = OrderedDict()  # key -> (client, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, secret_enc=None, decrypt=None) -> Client:
+        """Return a client for the given keys.
+
+        `decrypt` (a callable returning the plain secret) is only called
+        when the client is not in the registry yet.
+        """
+        secret_hash = hashlib.sha256(bytes(secret_enc)).hexdigest() if secret_enc else ""
+        key = (api_key or "", secret_hash)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                return entry[0]
+
+            # Built under the lock so concurrent callers never create a second, unclosed client
+            api_secret = decrypt() if decrypt else ""
+            client = _create_client(api_key or "", api_secret or "")
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                _, (old_client, _) = self._clients.popitem(last=False)
+                _close_client(old_client)
+        return client
+
+    def _evict_idle(self, now: float):
+        for key in [k for k, (_, used) in self._clients.items() if now - used > self.idle_ttl]:
+            client, _ = self._clients.pop(key)
+            _close_client(client)
+
+
+def _create_client(api_key: str, api_secret: str) -> Client:
+    # ping=False: skip the server ping on construction
+    client = Client(api_key, api_secret, ping=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+    client.session.mount("https://", adapter)
+    return client
+
+
+def _close_client(client: Client):
+    try:
+        client.session.close()
+    except Exception:
+        pass
+
+
+client_registry = ClientRegistry()
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:02
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_triggers(apps, schema_editor):
+    PriceAlert = apps.get_model('hpcrypto', 'PriceAlert')
+    for alert in PriceAlert.objects.select_related('position'):
+        entry_price = alert.position.entry_price
+        threshold = alert.threshold_value
+        alert.ticker = alert.position.ticker
+        if alert.alert_type == 'PRICE_ABOVE':
+            alert.direction, alert.trigger_price = 'UP', threshold
+        elif alert.alert_type == 'PRICE_BELOW':
+            alert.direction, alert.trigger_price = 'DOWN', threshold
+        elif alert.alert_type == 'PCT_INCREASE':
+            alert.direction = 'UP'
+            alert.trigger_price = entry_price * (1 + threshold / Decimal(100)) if entry_price else None
+        elif alert.alert_type == 'PCT_DECREASE':
+            alert.direction = 'DOWN'
+            alert.trigger_price = entry_price * (1 - threshold / Decimal(100)) if entry_price else None
+        alert.save(update_fields=['ticker', 'direction', 'trigger_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hpcrypto', '0003_pricealert_sms_sent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricealert',
+            name='direction',
+            field=models.CharField(blank=True, choices=[('UP', 'Up'), ('DOWN', 'Down')], default='', max_length=4),
+        ),
+        migrations.AddField(
+            model_name='pricealert',
+            name='ticker',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pricealert',
+            name='trigger_price',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['ticker', 'direction', 'is_active', 'triggered', 'trigger_price'], name='hpcrypto_alert_trigger_idx'),
+        ),
+        migrations.RunPython(fill_triggers, migrations.RunPython.noop),
+    ]
@@ -57,6 +57,39 @@ class Position(models.Model):
             return ((self.current_price - self.entry_price) / self.entry_price) * 100
         return None
     
+    # Fields that alert triggers are derived from (see PriceAlert.compute_trigger)
+    TRIGGER_FIELDS = ('ticker', 'entry_price')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._trigger_inputs = instance._current_trigger_inputs()
+        return instance
+
+    def _current_trigger_inputs(self):
+        # Read __dict__ so deferred fields are not loaded just for the comparison
+        return tuple(self.__dict__.get(field) for field in self.TRIGGER_FIELDS)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        super().save(*args, **kwargs)
+
+        inputs = self._current_trigger_inputs()
+        changed = inputs != getattr(self, '_trigger_inputs', None)
+        self._trigger_inputs = inputs
+        if adding or not changed:
+            return
+        if update_fields is not None and not set(update_fields) & set(self.TRIGGER_FIELDS):
+            return
+
+        # Ticker or entry price changed - keep alert triggers in sync
+        alerts = list(self.alerts.all())
+        for alert in alerts:
+            alert.position = self
+            alert.compute_trigger()
+        PriceAlert.objects.bulk_update(alerts, ['ticker', 'direction', 'trigger_price'])
+    
     class Meta:
         ordering = ['-created_at']
 
@@ -85,12 +118,55 @@ class PriceAlert(models.Model):
     # Add the missing SMS field
     sms_sent = models.BooleanField(default=False)
     
+    # Denormalized trigger data (see compute_trigger) - lets update_prices find
+    # crossed alerts with one indexed range query per ticker
+    DIRECTIONS = (
+        ('UP', 'Up'),
+        ('DOWN', 'Down'),
+    )
+    ticker = models.CharField(max_length=20, blank=True, default='')
+    direction = models.CharField(max_length=4, choices=DIRECTIONS, blank=True, default='')
+    trigger_price = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['ticker', 'direction', 'is_active', 'triggered', 'trigger_price'],
+                name='hpcrypto_alert_trigger_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.get_alert_type_display()} @ {self.threshold_value} for {self.position.ticker}"
     
     def __str__(self):
         return f"{self.get_alert_type_display()} @ {self.threshold_value} for {self.position.ticker}"
     
+    def compute_trigger(self):
+        """Convert the alert into an absolute price crossing (direction + trigger_price)"""
+        position = self.position
+        entry_price = position.entry_price
+        threshold = self.threshold_value
+        self.ticker = position.ticker
+        
+        if self.alert_type == 'PRICE_ABOVE':
+            self.direction, self.trigger_price = 'UP', threshold
+        elif self.alert_type == 'PRICE_BELOW':
+            self.direction, self.trigger_price = 'DOWN', threshold
+        elif self.alert_type == 'PCT_INCREASE':
+            self.direction = 'UP'
+            self.trigger_price = entry_price * (1 + threshold / 100) if entry_price else None
+        elif self.alert_type == 'PCT_DECREASE':
+            self.direction = 'DOWN'
+            self.trigger_price = entry_price * (1 - threshold / 100) if entry_price else None
+        else:
+            self.direction, self.trigger_price = '', None
+    
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            self.compute_trigger()
+        super().save(*args, **kwargs)
+    
     def format_notification_message(self):
         """Format notification message based on alert type and threshold"""
         position = self.position
@@ -108,4 +184,34 @@ class PriceAlert(models.Model):
             pct_change = ((position.entry_price - current_price) / position.entry_price) * 100
             return f"{ticker} decreased by {pct_change:.2f}%, above your {self.threshold_value:.2f}% threshold. Current price: ${current_price:.4f}"
         
-        return f"{ticker} price alert triggered. Current price: ${current_price:.4f}"
\ No newline at end of file
+        return f"{ticker} price alert triggered. Current price: ${current_price:.4f}"
+
+
+class NotificationOutbox(models.Model):
+    """Queued push notification, delivered to OneSignal by the background dispatcher"""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_outbox')
+    alert = models.ForeignKey(PriceAlert, on_delete=models.SET_NULL, blank=True, null=True, related_name='notifications')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    url = models.CharField(max_length=255, blank=True, null=True)
+    data = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.title} -> user {self.user_id} ({self.status})"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='hpcrypto_outbox_due_idx'),
+        ]
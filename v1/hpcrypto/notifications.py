@@ -0,0 +1,141 @@
+# hpcrypto/notifications.py
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import NotificationOutbox, PriceAlert
+from .onesignal_utils import send_onesignal_notification
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 5         # seconds between outbox scans when nothing wakes the dispatcher
+BATCH_SIZE = 100          # max outbox rows claimed per pass
+CLAIM_LEASE = 60          # seconds a claimed row is hidden from other dispatchers
+MAX_ATTEMPTS = 6          # after this many failures a row is marked FAILED
+BACKOFF_BASE = 10         # first retry delay in seconds, doubled on every attempt
+BACKOFF_MAX = 3600
+
+_wakeup = threading.Event()
+_dispatcher_started = False
+
+
+def build_notification(user_id, message, title, url=None, data=None, alert=None):
+    """Build an (unsaved) outbox row; save it with queue_notifications()"""
+    return NotificationOutbox(
+        user_id=user_id,
+        alert=alert,
+        title=title,
+        message=message,
+        url=url,
+        data=data,
+    )
+
+
+def queue_notifications(rows):
+    """Store outbox rows in one INSERT and wake the dispatcher once the transaction commits"""
+    if not rows:
+        return
+    NotificationOutbox.objects.bulk_create(rows)
+    transaction.on_commit(_wakeup.set)
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX))
+
+
+def _claim_due_rows():
+    """Lease due PENDING rows so parallel dispatchers (other workers) skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:BATCH_SIZE]
+        )
+        if rows:
+            NotificationOutbox.objects.filter(id__in=[r.id for r in rows]).update(
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE)
+            )
+    return rows
+
+
+def _group_by_user(rows):
+    """One push per user: several alerts for the same user are merged into a digest"""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.user_id, []).append(row)
+
+    for user_id, user_rows in grouped.items():
+        if len(user_rows) == 1:
+            row = user_rows[0]
+            yield user_id, user_rows, row.title, row.message, row.url, row.data
+        else:
+            title = f"STOCKstorm: {len(user_rows)} alerts triggered"
+            message = "\n".join(row.message for row in user_rows)
+            data = {"alert_ids": [row.alert_id for row in user_rows if row.alert_id]}
+            yield user_id, user_rows, title, message, "/hpcrypto/", data
+
+
+def dispatch_pending():
+    """Send one batch of due notifications; returns the number of rows processed"""
+    rows = _claim_due_rows()
+
+    for user_id, user_rows, title, message, url, data in _group_by_user(rows):
+        success, result = send_onesignal_notification(
+            user_id=user_id,
+            message=message,
+            title=title,
+            url=url,
+            data=data
+        )
+        now = timezone.now()
+        ids = [row.id for row in user_rows]
+
+        if success:
+            NotificationOutbox.objects.filter(id__in=ids).update(status='SENT', sent_at=now, last_error=None)
+            alert_ids = [row.alert_id for row in user_rows if row.alert_id]
+            PriceAlert.objects.filter(id__in=alert_ids).update(notification_sent=True, last_notification_sent=now)
+            logger.info(f"Push notification sent to user {user_id} ({len(ids)} messages): {result}")
+            continue
+
+        logger.error(f"Failed to send push notification to user {user_id}: {result}")
+        for row in user_rows:
+            row.attempts += 1
+            row.last_error = str(result)
+            if row.attempts >= MAX_ATTEMPTS:
+                row.status = 'FAILED'
+            else:
+                row.next_attempt_at = now + _backoff(row.attempts)
+        NotificationOutbox.objects.bulk_update(user_rows, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    return len(rows)
+
+
+def _dispatcher_loop():
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            # Drain full batches before going back to sleep
+            while dispatch_pending() >= BATCH_SIZE:
+                pass
+        except Exception as e:
+            logger.error(f"Notification dispatcher error: {e}")
+        finally:
+            close_old_connections()
+
+
+def start_notification_dispatcher():
+    """Start the background sender thread (once per process)"""
+    global _dispatcher_started
+    if _dispatcher_started:
+        return
+    _dispatcher_started = True
+
+    t = threading.Thread(target=_dispatcher_loop, daemon=True, name="onesignal-dispatcher")
+    t.start()
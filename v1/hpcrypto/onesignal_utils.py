@@ -3,15 +3,33 @@ import requests
 import json
 import logging
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+# Can be pointed at a local stub server (e.g. in tests) via settings.ONESIGNAL_API_URL
+DEFAULT_ONESIGNAL_API_URL = "https://onesignal.com/api/v1/notifications"
+ONESIGNAL_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+_session = None
+
+
+def get_session():
+    """Shared keep-alive session for all OneSignal requests"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    return _session
+
+
 def send_onesignal_notification(user_id, message, title="STOCKstorm Alert", url=None, data=None):
     """
     Send a push notification using OneSignal API
     
     Args:
-        user_id (int): User ID to target (will be converted to external_user_id)
+        user_id (int or list): User ID(s) to target (converted to external_user_id)
         message (str): Notification message
         title (str): Notification title
         url (str, optional): URL to open when notification is clicked
@@ -24,6 +42,8 @@ def send_onesignal_notification(user_id, message, title="STOCKstorm Alert", url=
     if not hasattr(settings, 'ONESIGNAL_APP_ID') or not hasattr(settings, 'ONESIGNAL_REST_API_KEY'):
         return False, "OneSignal configuration is incomplete"
     
+    user_ids = user_id if isinstance(user_id, (list, tuple)) else [user_id]
+    
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Basic {settings.ONESIGNAL_REST_API_KEY}"
@@ -33,7 +53,7 @@ def send_onesignal_notification(user_id, message, title="STOCKstorm Alert", url=
         "app_id": settings.ONESIGNAL_APP_ID,
         "contents": {"en": message},
         "headings": {"en": title},
-        "include_external_user_ids": [str(user_id)],
+        "include_external_user_ids": [str(uid) for uid in user_ids],
     }
     
     # Add optional parameters if provided
@@ -44,10 +64,11 @@ def send_onesignal_notification(user_id, message, title="STOCKstorm Alert", url=
         payload["data"] = data
     
     try:
-        response = requests.post(
-            "https://onesignal.com/api/v1/notifications",
+        response = get_session().post(
+            getattr(settings, 'ONESIGNAL_API_URL', DEFAULT_ONESIGNAL_API_URL),
             headers=headers,
-            data=json.dumps(payload)
+            data=json.dumps(payload),
+            timeout=ONESIGNAL_TIMEOUT
         )
         
         response_data = response.json()
@@ -1,3 +1,251 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import notifications
+from .models import HPCategory, NotificationOutbox, Position, PriceAlert
+from .notifications import build_notification, dispatch_pending, _claim_due_rows
+
+
+class PriceAlertTriggerTests(TestCase):
+
+    def alert(self, alert_type, threshold, entry_price='100'):
+        position = Position(ticker='BTC', quantity=Decimal('1'), entry_price=Decimal(entry_price))
+        alert = PriceAlert(position=position, alert_type=alert_type, threshold_value=Decimal(threshold))
+        alert.compute_trigger()
+        return alert
+
+    def test_absolute_price_alerts_use_threshold(self):
+        above = self.alert('PRICE_ABOVE', '120')
+        below = self.alert('PRICE_BELOW', '80')
+        self.assertEqual((above.ticker, above.direction, above.trigger_price), ('BTC', 'UP', Decimal('120')))
+        self.assertEqual((below.direction, below.trigger_price), ('DOWN', Decimal('80')))
+
+    def test_percentage_alerts_are_relative_to_entry_price(self):
+        self.assertEqual(self.alert('PCT_INCREASE', '10').trigger_price, Decimal('110'))
+        self.assertEqual(self.alert('PCT_DECREASE', '25').trigger_price, Decimal('75'))
+        self.assertEqual(self.alert('PCT_DECREASE', '25').direction, 'DOWN')
+
+    def test_percentage_alert_without_entry_price_has_no_trigger(self):
+        alert = self.alert('PCT_INCREASE', '10', entry_price='0')
+        self.assertEqual(alert.direction, 'UP')
+        self.assertIsNone(alert.trigger_price)
+
+    def test_unknown_type_clears_trigger(self):
+        alert = self.alert('SOMETHING_ELSE', '10')
+        self.assertEqual((alert.direction, alert.trigger_price), ('', None))
+
+
+class PositionSaveTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('carol', password='x')
+        category = HPCategory.objects.create(user=user, name='HP1')
+        self.position = Position.objects.create(
+            user=user, category=category, ticker='BTC', quantity=Decimal('1'), entry_price=Decimal('100')
+        )
+        self.alert = PriceAlert.objects.create(position=self.position, alert_type='PCT_INCREASE', threshold_value=Decimal('10'))
+        self.position = Position.objects.get(pk=self.position.pk)
+
+    def test_entry_price_change_recomputes_alert_triggers(self):
+        self.position.entry_price = Decimal('200')
+        self.position.save()
+
+        self.alert.refresh_from_db()
+        self.assertEqual(self.alert.trigger_price, Decimal('220'))
+
+    def test_ticker_change_moves_alerts_to_new_ticker(self):
+        self.position.ticker = 'ETH'
+        self.position.save(update_fields=['ticker'])
+
+        self.alert.refresh_from_db()
+        self.assertEqual(self.alert.ticker, 'ETH')
+
+    def test_unrelated_change_does_not_touch_alerts(self):
+        self.position.notes = 'long term'
+        with self.assertNumQueries(1):
+            self.position.save()
+
+
+class StubPushProvider:
+    """Local stand-in for the OneSignal notifications endpoint"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.failing_users = set()
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub._lock:
+                    stub.requests.append(body)
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                if set(body['include_external_user_ids']) & stub.failing_users:
+                    status, reply = 400, {"errors": ["stub failure"]}
+                else:
+                    status, reply = 200, {"id": f"stub-{len(stub.requests)}"}
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1/notifications"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sent_to(self, user_id):
+        return [r for r in self.requests if str(user_id) in r['include_external_user_ids']]
+
+
+class OutboxTestMixin:
+    stub_delay = 0.0
+
+    def setUp(self):
+        self.provider = StubPushProvider(delay=self.stub_delay).start()
+        self.addCleanup(self.provider.stop)
+        settings_override = override_settings(
+            ONESIGNAL_API_URL=self.provider.url,
+            ONESIGNAL_APP_ID='test-app',
+            ONESIGNAL_REST_API_KEY='test-key',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+
+    def queue(self, user, message, count=1):
+        rows = [build_notification(user.id, f"{message} #{i}", "STOCKstorm Alert") for i in range(count)]
+        NotificationOutbox.objects.bulk_create(rows)
+
+
+class DispatchPendingTests(OutboxTestMixin, TestCase):
+
+    def test_batch_is_sent_as_one_push_per_user(self):
+        self.queue(self.alice, "BTC above 70000", count=2)
+        self.queue(self.bob, "ETH below 3000")
+
+        self.assertEqual(dispatch_pending(), 3)
+
+        self.assertEqual(NotificationOutbox.objects.filter(status='SENT').count(), 3)
+        self.assertFalse(NotificationOutbox.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(len(self.provider.requests), 2)
+
+        digest = self.provider.sent_to(self.alice.id)[0]
+        self.assertEqual(digest['headings']['en'], "STOCKstorm: 2 alerts triggered")
+        self.assertIn("BTC above 70000 #0", digest['contents']['en'])
+        self.assertIn("BTC above 70000 #1", digest['contents']['en'])
+
+        # Nothing left to send
+        self.assertEqual(dispatch_pending(), 0)
+        self.assertEqual(len(self.provider.requests), 2)
+
+    def test_failed_user_is_retried_with_backoff(self):
+        self.queue(self.alice, "BTC above 70000")
+        self.queue(self.bob, "ETH below 3000")
+        self.provider.failing_users.add(str(self.bob.id))
+
+        before = timezone.now()
+        self.assertEqual(dispatch_pending(), 2)
+
+        self.assertEqual(NotificationOutbox.objects.get(user=self.alice).status, 'SENT')
+        failed = NotificationOutbox.objects.get(user=self.bob)
+        self.assertEqual(failed.status, 'PENDING')
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("stub failure", failed.last_error)
+        self.assertGreaterEqual(failed.next_attempt_at, before + timedelta(seconds=notifications.BACKOFF_BASE))
+
+        # Not due yet - the retry waits for its backoff
+        self.assertEqual(dispatch_pending(), 0)
+
+        self.provider.failing_users.clear()
+        NotificationOutbox.objects.filter(id=failed.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_pending(), 1)
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, 'SENT')
+        self.assertEqual(len(self.provider.sent_to(self.alice.id)), 1)
+        self.assertEqual(len(self.provider.sent_to(self.bob.id)), 2)
+
+    def test_row_is_marked_failed_after_max_attempts(self):
+        self.queue(self.bob, "ETH below 3000")
+        self.provider.failing_users.add(str(self.bob.id))
+
+        for _ in range(notifications.MAX_ATTEMPTS):
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+            dispatch_pending()
+
+        row = NotificationOutbox.objects.get()
+        self.assertEqual(row.status, 'FAILED')
+        self.assertEqual(row.attempts, notifications.MAX_ATTEMPTS)
+
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_pending(), 0)
+
+    def test_claimed_rows_are_leased_from_other_dispatchers(self):
+        self.queue(self.alice, "BTC above 70000", count=3)
+
+        claimed = _claim_due_rows()
+        self.assertEqual(len(claimed), 3)
+
+        # A second dispatcher running while the first is still sending finds nothing due
+        self.assertEqual(dispatch_pending(), 0)
+        self.assertEqual(self.provider.requests, [])
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "needs SELECT ... FOR UPDATE SKIP LOCKED")
+class ConcurrentDispatchTests(OutboxTestMixin, TransactionTestCase):
+    stub_delay = 0.2
+
+    def test_two_dispatchers_never_send_the_same_row(self):
+        users = [User.objects.create_user(f'user{i}', password='x') for i in range(20)]
+        for user in users:
+            self.queue(user, "BTC above 70000")
+
+        barrier = threading.Barrier(2)
+        processed = []
+
+        def worker():
+            try:
+                barrier.wait()
+                processed.append(dispatch_pending())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sum(processed), len(users))
+        self.assertEqual(NotificationOutbox.objects.filter(status='SENT').count(), len(users))
+        for user in users:
+            self.assertEqual(len(self.provider.sent_to(user.id)), 1)
@@ -1,8 +1,84 @@
 # hpcrypto/utils.py
+import json
+
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 from django.core.cache import cache
 
+from .binance_clients import client_registry
+
+
+def to_binance_symbol(ticker):
+    """Map a position ticker (e.g. "BTC") to a Binance USDT symbol ("BTCUSDT")."""
+    return ticker if ticker.endswith('USDT') else f"{ticker}USDT"
+
+
+def get_user_binance_client(user):
+    """Return the pooled Binance client for the user's credentials, or None if not configured."""
+    profile = getattr(user, 'profile', None)
+    if not profile or not profile.binance_api_key or not profile.binance_api_secret_enc:
+        return None
+    return client_registry.get(
+        profile.binance_api_key,
+        profile.binance_api_secret_enc,
+        profile.get_binance_api_secret
+    )
+
+
+def get_binance_prices(user, tickers):
+    """
+    Fetch prices for many tickers with a single Binance request.
+    
+    Args:
+        user: The user object (to get API credentials)
+        tickers: Iterable of ticker symbols (e.g., ["BTC", "ETH"])
+        
+    Returns:
+        dict: ticker -> float price (tickers that could not be priced are missing)
+    """
+    symbols = {ticker: to_binance_symbol(ticker) for ticker in set(tickers)}
+    prices = {}
+    
+    # Serve what we can from the 5 second cache
+    missing = set()
+    for ticker, symbol in symbols.items():
+        cached_price = cache.get(f"binance_price_{symbol}")
+        if cached_price:
+            prices[ticker] = cached_price
+        else:
+            missing.add(symbol)
+    
+    if not missing:
+        return prices
+    
+    client = get_user_binance_client(user)
+    if client is None:
+        return prices
+    
+    fetched = {}
+    try:
+        # One request for all symbols: GET /api/v3/ticker/price?symbols=[...]
+        ticker_data = client.get_symbol_ticker(symbols=json.dumps(sorted(missing), separators=(",", ":")))
+        fetched = {t['symbol']: float(t['price']) for t in ticker_data}
+    except BinanceAPIException as e:
+        # The whole batch fails if one symbol is invalid - fall back to single requests
+        print(f"Binance batch price error ({e}), falling back to single requests")
+        for symbol in missing:
+            try:
+                fetched[symbol] = float(client.get_symbol_ticker(symbol=symbol)['price'])
+            except BinanceAPIException as e:
+                print(f"Binance API error for {symbol}: {e}")
+    except Exception as e:
+        print(f"Error fetching Binance prices: {e}")
+    
+    cache.set_many({f"binance_price_{symbol}": price for symbol, price in fetched.items()}, 5)
+    for ticker, symbol in symbols.items():
+        if symbol in fetched:
+            prices[ticker] = fetched[symbol]
+    
+    return prices
+
+
 def get_binance_price(user, ticker):
     """
     Fetch price from Binance for a given ticker.
@@ -15,10 +91,7 @@ def get_binance_price(user, ticker):
         float: Current price or None if error
     """
     # Format ticker for Binance if needed
-    if not ticker.endswith('USDT'):
-        binance_ticker = f"{ticker}USDT"
-    else:
-        binance_ticker = ticker
+    binance_ticker = to_binance_symbol(ticker)
     
     # Check cache first (5 second validity)
     cache_key = f"binance_price_{binance_ticker}"
@@ -27,16 +100,11 @@ def get_binance_price(user, ticker):
         return cached_price
     
     try:
-        # Get user's Binance credentials
-        profile = getattr(user, 'profile', None)
-        if not profile or not profile.binance_api_key or not profile.binance_api_secret_enc:
+        # Reuse a pooled client (secret is decrypted only on first use)
+        client = get_user_binance_client(user)
+        if client is None:
             return None
         
-        api_key = profile.binance_api_key
-        api_secret = profile.get_binance_api_secret()
-        
-        # Create client and fetch price
-        client = Client(api_key, api_secret)
         ticker_data = client.get_symbol_ticker(symbol=binance_ticker)
         price = float(ticker_data['price'])
         
@@ -4,11 +4,16 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
+from django.db.models import Q
+from decimal import Decimal
+import logging
 from .models import HPCategory, Position, PriceAlert
 from .forms import HPCategoryForm, PositionForm, PriceAlertForm
 from home.models import UserProfile
 from django.views.decorators.http import require_POST
-from .onesignal_utils import send_onesignal_notification
+from .notifications import build_notification, queue_notifications
+
+logger = logging.getLogger(__name__)
 
 @login_required
 def position_list(request):
@@ -195,36 +200,42 @@ def update_prices(request):
         return JsonResponse({"success": False, "error": "Binance API credentials not configured"}, status=400)
     
     # Get all positions for this user
-    positions = Position.objects.filter(user=request.user)
-    updated_count = 0
+    positions = list(Position.objects.filter(user=request.user))
     errors = []
     positions_data = []
     
+    # One Binance request for all distinct tickers
+    from hpcrypto.utils import get_binance_prices
+    prices = get_binance_prices(request.user, (position.ticker for position in positions))
+    
+    now = timezone.now()
+    updated_positions = []
     for position in positions:
-        try:
-            from hpcrypto.utils import get_binance_price
-            current_price = get_binance_price(request.user, position.ticker)
-            if current_price:
-                position.current_price = current_price
-                position.last_price_update = timezone.now()
-                position.save()
-                updated_count += 1
-                
-                # Append position data for frontend update
-                positions_data.append({
-                    'id': position.id,
-                    'current_price': float(position.current_price),
-                    'last_update_timestamp': position.last_price_update.isoformat(),
-                    'pnl_dollar': float(position.profit_loss_dollar) if position.profit_loss_dollar is not None else None,
-                    'pnl_percent': float(position.profit_loss_percent) if position.profit_loss_percent is not None else None
-                })
-            else:
-                errors.append(f"Couldn't fetch price for {position.ticker}")
-        except Exception as e:
-            errors.append(f"Error updating {position.ticker}: {str(e)}")
+        current_price = prices.get(position.ticker)
+        if not current_price:
+            errors.append(f"Couldn't fetch price for {position.ticker}")
+            continue
+        
+        position.current_price = Decimal(str(current_price))
+        position.last_price_update = now
+        position.updated_at = now
+        updated_positions.append(position)
+        
+        # Append position data for frontend update
+        positions_data.append({
+            'id': position.id,
+            'current_price': float(position.current_price),
+            'last_update_timestamp': position.last_price_update.isoformat(),
+            'pnl_dollar': float(position.profit_loss_dollar) if position.profit_loss_dollar is not None else None,
+            'pnl_percent': float(position.profit_loss_percent) if position.profit_loss_percent is not None else None
+        })
+    
+    # Single UPDATE round-trip for all priced positions
+    Position.objects.bulk_update(updated_positions, ['current_price', 'last_price_update', 'updated_at'])
+    updated_count = len(updated_positions)
     
     # Check alerts
-    alerts_triggered = check_price_alerts()
+    alerts_triggered = check_price_alerts(updated_positions)
     
     # Get category summary data
     categories_data = []
@@ -255,83 +266,82 @@ def update_prices(request):
 
 
 
-def check_price_alerts():
-    """Check all active price alerts and mark triggered ones, send push notifications if configured"""
-    alerts = PriceAlert.objects.filter(is_active=True, triggered=False)
+def check_price_alerts(positions):
+    """
+    Trigger alerts crossed by the freshly updated positions and queue push notifications if configured.
+    
+    Each alert stores its absolute crossing point (direction + trigger_price, percent alerts
+    converted from the entry price), so the crossed ones are found with one indexed range
+    query per ticker - cost depends on the number of triggered alerts, not on all alerts.
+    """
+    prices = {}
+    for position in positions:
+        prices[position.ticker] = position.current_price
+    if not prices:
+        return []
+    
+    crossed = Q()
+    for ticker, price in prices.items():
+        crossed |= Q(ticker=ticker, direction='UP', trigger_price__lte=price)
+        crossed |= Q(ticker=ticker, direction='DOWN', trigger_price__gte=price)
+    
+    alerts = (
+        PriceAlert.objects
+        .filter(crossed, is_active=True, triggered=False, position__in=positions)
+        .select_related('position__user__profile')
+    )
     triggered = []
+    to_save = []
+    outbox = []
     
     for alert in alerts:
         position = alert.position
-        if not position.current_price:
-            continue
+        now = timezone.now()
+        alert.triggered = True
+        alert.last_triggered = now
         
-        trigger = False
-        if alert.alert_type == 'PRICE_ABOVE' and position.current_price >= alert.threshold_value:
-            trigger = True
-        elif alert.alert_type == 'PRICE_BELOW' and position.current_price <= alert.threshold_value:
-            trigger = True
-        elif alert.alert_type == 'PCT_INCREASE':
-            pct_change = ((position.current_price - position.entry_price) / position.entry_price) * 100
-            if pct_change >= alert.threshold_value:
-                trigger = True
-        elif alert.alert_type == 'PCT_DECREASE':
-            pct_change = ((position.entry_price - position.current_price) / position.entry_price) * 100
-            if pct_change >= alert.threshold_value:
-                trigger = True
+        # Check if user has push notifications enabled
+        user = position.user
+        user_profile = getattr(user, 'profile', None)
         
-        if trigger:
-            now = timezone.now()
-            alert.triggered = True
-            alert.last_triggered = now
-            
-            # Check if user has push notifications enabled
-            user = position.user
-            user_profile = getattr(user, 'profile', None)
+        # Send push notification if user has enabled it
+        if (user_profile and 
+            user_profile.push_notifications_enabled and 
+            not alert.notification_sent):
             
-            # Send push notification if user has enabled it
-            if (user_profile and 
-                user_profile.push_notifications_enabled and 
-                not alert.notification_sent):
-                
-                # Format message based on alert type
-                message = alert.format_notification_message()
-                title = f"STOCKstorm: {position.ticker} Alert Triggered"
-                
-                # Additional data for the notification
-                data = {
-                    "alert_id": alert.id,
-                    "position_id": position.id,
-                    "ticker": position.ticker,
-                    "current_price": float(position.current_price)
-                }
-                
-                # Use OneSignal to send notification to user
-                success, result = send_onesignal_notification(
-                    user_id=user.id,
-                    message=message,
-                    title=title,
-                    url=f"/hpcrypto/position/{position.id}/",
-                    data=data
-                )
-                
-                if success:
-                    alert.notification_sent = True
-                    alert.last_notification_sent = now
-                    # Log success
-                    logger.info(f"Push notification sent for {position.ticker} to user {user.id}: {result}")
-                else:
-                    # Log error
-                    logger.error(f"Failed to send push notification for {position.ticker}: {result}")
+            # Format message based on alert type
+            message = alert.format_notification_message()
+            title = f"STOCKstorm: {position.ticker} Alert Triggered"
             
-            alert.save()
+            # Additional data for the notification
+            data = {
+                "alert_id": alert.id,
+                "position_id": position.id,
+                "ticker": position.ticker,
+                "current_price": float(position.current_price)
+            }
             
-            triggered.append({
-                "id": alert.id,
-                "position": position.ticker,
-                "type": alert.get_alert_type_display(),
-                "threshold": float(alert.threshold_value),
-                "current_price": float(position.current_price),
-                "notification_sent": alert.notification_sent
-            })
+            # Queue the push - the background dispatcher delivers it to OneSignal
+            outbox.append(build_notification(
+                user_id=user.id,
+                message=message,
+                title=title,
+                url=f"/hpcrypto/position/{position.id}/",
+                data=data,
+                alert=alert
+            ))
+        
+        to_save.append(alert)
+        
+        triggered.append({
+            "id": alert.id,
+            "position": position.ticker,
+            "type": alert.get_alert_type_display(),
+            "threshold": float(alert.threshold_value),
+            "current_price": float(position.current_price),
+            "notification_sent": alert.notification_sent
+        })
     
+    PriceAlert.objects.bulk_update(to_save, ['triggered', 'last_triggered'])
+    queue_notifications(outbox)
     return triggered
\ No newline at end of file
@@ -156,6 +156,9 @@ MICROSERVICE_URL2 = "http://127.0.0.1:8005"
 BNB_MICROSERVICE_URL="http://127.0.0.1:8006"
 XTB_D ="http://127.0.0.1:8004"
 
+# Background OneSignal dispatcher (hpcrypto) - start it in this process
+HPCRYPTO_DISPATCHER_ENABLED = True
+
 
 
 # Session settings
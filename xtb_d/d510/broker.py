@@ -0,0 +1,31 @@
+# d510/broker.py
+"""
+Wspólne moduły botcore podpięte do modeli serwisu D10.
+"""
+
+from botcore.columnar_export import TradeExport
+from botcore.pnl import PnlSummary
+from botcore.status_events import StatusPublisher
+from botcore.token_cache import TokenCache
+
+from .models import BotD10, TradeD10, BotPnlSummary, LevelPnlSummary, UserProfile
+
+BROKER_TYPE = "D10"
+
+status_events = StatusPublisher(BROKER_TYPE)
+publish_bot_status = status_events.publish
+
+pnl = PnlSummary(BotD10, TradeD10, BotPnlSummary, LevelPnlSummary,
+                 closed_filter={"status": "CLOSED"}, level_field="level_name")
+save_closed_trade = pnl.save_closed_trade
+rebuild_pnl_summary = pnl.rebuild
+
+token_cache = TokenCache(UserProfile)
+user_for_token = token_cache.user_for_token
+
+trade_export = TradeExport(
+    BROKER_TYPE, BotD10, TradeD10, date_field="created_at",
+    # bot_id, level, side, quantity, open_price, close_price, profit, status, opened_at, closed_at
+    fields=("bot_id", "level_name", None, None, "open_price", "close_price", "profit", "status", "created_at", "closed_at"),
+)
+user_trades = trade_export.user_trades
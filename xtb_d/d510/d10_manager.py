@@ -5,6 +5,7 @@ from decimal import Decimal
 from asgiref.sync import sync_to_async
 
 from .models import BotD10, TradeD10
+from .broker import publish_bot_status, save_closed_trade
 from .xtb_manager import xtb_manager, instrument_prices
 
 
@@ -116,6 +117,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
         bot = await sync_to_async(BotD10.objects.get)(pk=bot_id)
         bot.status = 'RUNNING'
         await sync_to_async(bot.save)()
+        publish_bot_status(bot.id, bot.user_id, 'RUNNING')
         print(f"[reapply_logic_once] Bot {bot_id} from NEW -> RUNNING (lv1 bought).")
         return
 
@@ -147,7 +149,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
                     t.profit = Decimal(str(profit_net))
                     t.status = "CLOSED"
                     t.closed_at = datetime.datetime.utcnow()
-                    await sync_to_async(t.save)()
+                    await sync_to_async(save_closed_trade)(t)
 
                 # 1) Dopisujemy zysk do globalnego bot.capital
                 old_capital = float(bot.capital)
@@ -180,6 +182,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
                 else:
                     bot.status = "ERROR"
                     await sync_to_async(bot.save)()
+                    publish_bot_status(bot.id, bot.user_id, "ERROR")
                     print(f"[reapply_logic_once] re-BUY lv1 FAIL => {resp2}")
 
                 # regenerujemy poziomy z uwzględnieniem powiększonego bot.capital
@@ -190,6 +193,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
             else:
                 bot.status = "ERROR"
                 await sync_to_async(bot.save)()
+                publish_bot_status(bot.id, bot.user_id, "ERROR")
                 print(f"[reapply_logic_once] SELL lv1 FAIL => {resp}")
 
     # BUY lv2..lvN => if current_price <= lvX['price']
@@ -234,7 +238,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
                             tt.profit = Decimal(str(profit_net))
                             tt.closed_at = datetime.datetime.utcnow()
                             tt.status = "CLOSED"
-                            await sync_to_async(tt.save)()
+                            await sync_to_async(save_closed_trade)(tt)
 
                         # 1) Dopisujemy zysk do globalnego bot.capital
                         old_capital = float(bot.capital)
@@ -251,6 +255,7 @@ async def reapply_logic_once(bot_id: int, current_price: float):
                     else:
                         bot.status = "ERROR"
                         await sync_to_async(bot.save)()
+                        publish_bot_status(bot.id, bot.user_id, "ERROR")
                         print(f"[reapply_logic_once] SELL {key} FAIL => {resp}")
 
     bot.levels_data = json.dumps(data)
@@ -3,14 +3,13 @@
 from django.db import models
 from django.conf import settings
 from cryptography.fernet import Fernet
-from django.db.models import Count, Sum
 
 FERNET_KEY = getattr(settings, 'FERNET_KEY', 'GiLFpoI4-TzsPAheWRYytzPXuOlZVHOz5FrZsjHYZSk=')
 fernet = Fernet(FERNET_KEY)
 
 class UserProfile(models.Model):
     user_id = models.IntegerField(unique=True)
-    auth_token = models.CharField(max_length=128, blank=True, null=True)
+    auth_token = models.CharField(max_length=128, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -46,27 +45,42 @@ class BotD10(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='d10_bot_status_idx'),
+            models.Index(fields=['user_id', 'status'], name='d10_bot_user_status_idx'),
+        ]
+
     def __str__(self):
         return f"[D10 Bot] {self.name} (user_id={self.user_id}, status={self.status})"
 
     def get_level_stats(self):
         """
-        Zwraca słownik, w którym kluczem jest nazwa poziomu (np. 'lv1'),
-        a wartością słownik z liczbą transakcji (tp) oraz łącznym zyskiem (total_profit).
-        Tylko transakcje zamknięte (status='CLOSED') są brane pod uwagę.
+        Zwraca słownik {nazwa poziomu: {'tp': liczba TP, 'profit': zysk}}.
+        Czyta gotowe wiersze LevelPnlSummary (po jednym na poziom); bez nich
+        (np. przed rebuild_pnl_summary) liczy je jednym zapytaniem GROUP BY level_name.
         """
+        stats = {
+            row.level: {
+                'tp': row.tp_count,
+                'profit': float(row.total_profit)
+            }
+            for row in self.level_pnl.all()
+        }
+        if stats:
+            return stats
+
         qs = self.trades.filter(status='CLOSED').values('level_name').annotate(
-            tp=Count('id'),
-            total_profit=Sum('profit')
+            tp=models.Count('id'),
+            total_profit=models.Sum('profit')
         )
-        stats = {
+        return {
             item['level_name']: {
                 'tp': item['tp'],
                 'profit': float(item['total_profit'] or 0)
             }
             for item in qs
         }
-        return stats
 
 
 class TradeD10(models.Model):
@@ -84,5 +98,42 @@ class TradeD10(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     closed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['bot', 'level_name', 'status'], name='d10_trade_bot_lvl_status_idx'),
+        ]
+
     def __str__(self):
         return f"TradeD10(bot_id={self.bot.id}, {self.level_name}, {self.status})"
+
+
+class BotPnlSummary(models.Model):
+    """
+    Zmaterializowane podsumowanie P&L bota: liczba TP i łączny zysk.
+    Aktualizowane w tej samej transakcji co zapis zamkniętej transakcji (broker.save_closed_trade),
+    odbudowywane z historii komendą rebuild_pnl_summary.
+    """
+    bot = models.OneToOneField(BotD10, on_delete=models.CASCADE, related_name='pnl_summary')
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"BotPnlSummary(bot_id={self.bot_id}, tp={self.tp_count}, profit={self.total_profit})"
+
+
+class LevelPnlSummary(models.Model):
+    """
+    Podsumowanie P&L jednego poziomu bota (jeden wiersz na poziom).
+    """
+    bot = models.ForeignKey(BotD10, on_delete=models.CASCADE, related_name='level_pnl')
+    level = models.CharField(max_length=10)
+    tp_count = models.PositiveIntegerField(default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('bot', 'level')
+
+    def __str__(self):
+        return f"LevelPnlSummary(bot_id={self.bot_id}, {self.level}, tp={self.tp_count}, profit={self.total_profit})"
@@ -1,3 +1,40 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from .models import BotD10, TradeD10, UserProfile
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), "plan format znany tylko dla MySQL/SQLite")
+class HotPathIndexTests(TestCase):
+    """
+    Zapytania z gorącej ścieżki (pętla workerów, autoryzacja tokenem, otwarte transakcje)
+    muszą mieć w planie (EXPLAIN) indeksy z migracji 0004_hot_path_indexes.
+    """
+
+    def assertPlanUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} nie występuje w planie:\n{plan}")
+
+    def test_running_bots_use_status_index(self):
+        self.assertPlanUses(BotD10.objects.filter(status='RUNNING'), 'd10_bot_status_idx')
+
+    def test_user_bots_use_user_status_index(self):
+        self.assertPlanUses(BotD10.objects.filter(user_id=1, status='RUNNING'), 'd10_bot_user_status_idx')
+
+    def test_token_lookup_uses_auth_token_index(self):
+        self.assertPlanUses(UserProfile.objects.filter(auth_token='token'), 'auth_token')
+
+    def test_open_trades_use_composite_index(self):
+        # Przy pustej tabeli planer może wybrać dowolny indeks - potrzebne są dane,
+        # w których sam bot_id jest mało selektywny (wiele poziomów i statusów na bota)
+        bots = [
+            BotD10.objects.create(user_id=1, name=f'bot{i}', instrument='US500')
+            for i in range(2)
+        ]
+        TradeD10.objects.bulk_create([
+            TradeD10(bot=bot, level_name=f'lv{lv}', open_price=100, status=status)
+            for bot in bots for lv in range(10) for status in ('OPEN', 'CLOSED') for _ in range(10)
+        ])
+        self.assertPlanUses(TradeD10.objects.filter(bot_id=bots[0].id, level_name='lv1', status='OPEN'), 'd10_trade_bot_lvl_status_idx')
@@ -6,8 +6,10 @@ from .views import (
     get_bot_details,
     remove_bot,
     export_d10_trades_csv,
+    export_trades_columnar,
     check_d10_connection,
-    get_bot_status
+    get_bot_status,
+    get_bot_statuses
 )
 
 urlpatterns = [
@@ -16,6 +18,9 @@ urlpatterns = [
     path('get_bot_details/<int:bot_id>/', get_bot_details, name='get_bot_details'),
     path('remove_bot/<int:bot_id>/', remove_bot, name='remove_bot'),
     path('export_d10_trades_csv/<int:bot_id>/', export_d10_trades_csv, name='export_bot_trades_csv'),
+    path('export_trades/', export_trades_columnar, name='export_trades_columnar'),
+    path('export_trades/<int:bot_id>/', export_trades_columnar, name='export_bot_trades_columnar'),
     path('check_d10_connection/<int:bot_id>/', check_d10_connection, name='check_d10_connection'),
     path('get_bot_status/<int:bot_id>/', get_bot_status, name='get_bot_status'),
+    path('bot_statuses/', get_bot_statuses, name='get_bot_statuses'),
 ]
@@ -9,13 +9,15 @@ from rest_framework.response import Response
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth.models import AnonymousUser, User
 from rest_framework.authentication import get_authorization_header
-from django.http import HttpResponse, JsonResponse  # Dodaj JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 import json
-import csv
-from io import StringIO
 from asgiref.sync import async_to_sync
 
-from .models import UserProfile, BotD10, TradeD10
+from .models import UserProfile, BotD10, TradeD10, BotPnlSummary
+from botcore.csv_stream import ROW_CHUNK_SIZE, parse_date_range, filter_date_range, streaming_csv_response
+from botcore.columnar_export import FORMATS, columnar_available, stream_columnar
+from botcore.bot_statuses import bot_statuses_view
+from .broker import token_cache, user_for_token, user_trades
 from .xtb_manager import xtb_manager, instrument_prices
 from .d10_manager import (
     generate_levels,
@@ -46,19 +48,10 @@ class CustomAuthentication(BaseAuthentication):
         return self.authenticate_credentials(token_key)
 
     def authenticate_credentials(self, key):
-        try:
-            user_profile = UserProfile.objects.get(auth_token=key)
-        except UserProfile.DoesNotExist:
+        # Token -> User z cache w pamięci procesu (baza tylko przy pierwszym użyciu / po TTL)
+        user_mock = user_for_token(key)
+        if user_mock is None:
             raise AuthenticationFailed("Invalid token")
-
-        user_mock = User(
-            id=user_profile.user_id,
-            username=f"micro_{user_profile.user_id}",
-            is_active=True,
-            is_staff=True,
-            is_superuser=True
-        )
-        user_mock.set_unusable_password()
         return (user_mock, None)
 
 
@@ -81,6 +74,7 @@ def register_token(request):
     user_profile, created = UserProfile.objects.get_or_create(user_id=user_id)
     user_profile.auth_token = token
     user_profile.save()
+    token_cache.invalidate_user(user_id)
 
     return Response({'status': 'Token saved successfully'})
 
@@ -116,7 +110,6 @@ def create_bot(request):
 
     return Response({"bot_id": bot.id, "status": bot.status}, status=200)
 
-from django.db.models import Sum
 
 @api_view(['GET'])
 @authentication_classes([CustomAuthentication])
@@ -148,6 +141,9 @@ def get_bot_details(request, bot_id):
             "total_profit": total_profit,
         }, status=400)
     
+    # TP i zysk wszystkich poziomów jednym zapytaniem (z cache)
+    level_stats = bot.get_level_stats()
+
     for key in lv_keys:
         lv_number = key
         try:
@@ -159,9 +155,9 @@ def get_bot_details(request, bot_id):
         bought = flags.get(f"{lv_number}_bought", False)
         sold = flags.get(f"{lv_number}_sold", False)
         
-        tp = bot.trades.filter(level_name=lv_number, status='CLOSED').count()
-        profit_sum = bot.trades.filter(level_name=lv_number, status='CLOSED').aggregate(total=Sum('profit'))['total'] or 0.0
-        profit_sum = float(profit_sum) 
+        stats = level_stats.get(lv_number, {})
+        tp = stats.get('tp', 0)
+        profit_sum = stats.get('profit', 0.0)
         
         try:
             capital = float(levels_data.get("caps", {}).get(lv_number, levels_data.get(key, {}).get("capital", 0.0)))
@@ -176,7 +172,10 @@ def get_bot_details(request, bot_id):
             "bought": bought,
             "sold": sold
         }
-        total_profit += profit_sum
+
+    # Łączny zysk ze zmaterializowanego podsumowania (jeden wiersz)
+    summary = BotPnlSummary.objects.filter(bot=bot).first()
+    total_profit = float(summary.total_profit) if summary else 0.0
 
     return Response({
         "flags": levels_data.get("flags", {}),
@@ -205,26 +204,70 @@ def remove_bot(request, bot_id):
 @authentication_classes([CustomAuthentication])
 @permission_classes([IsAuthenticated])
 def export_d10_trades_csv(request, bot_id):
+    """
+    Transakcje bota D10 w CSV, generowane strumieniowo.
+    Opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD (po created_at).
+    """
     bot = get_object_or_404(BotD10, id=bot_id)
     if bot.user_id != request.user.id:
         return Response({"error": "No access"}, status=403)
 
-    trades = bot.trades.all().order_by('created_at')
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';')
-    writer.writerow(["Level", "OpenPrice", "ClosePrice", "Profit", "Status", "CreatedAt", "ClosedAt"])
-    for t in trades:
-        writer.writerow([
-            t.level_name,
-            str(t.open_price).replace('.', ','),
-            str(t.close_price or '').replace('.', ','),
-            str(t.profit or '').replace('.', ','),
-            t.status,
-            t.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            t.closed_at.strftime("%Y-%m-%d %H:%M:%S") if t.closed_at else ''
-        ])
-    response = HttpResponse(output.getvalue(), content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="bot_{bot_id}_trades.csv"'
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    trades = filter_date_range(bot.trades.all(), 'created_at', date_from, date_to)
+    trades = trades.order_by('created_at').values_list(
+        'level_name', 'open_price', 'close_price', 'profit', 'status', 'created_at', 'closed_at'
+    ).iterator(chunk_size=ROW_CHUNK_SIZE)
+
+    def rows():
+        for level_name, open_price, close_price, profit, status, created_at, closed_at in trades:
+            yield [
+                level_name,
+                str(open_price).replace('.', ','),
+                str(close_price or '').replace('.', ','),
+                str(profit or '').replace('.', ','),
+                status,
+                created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                closed_at.strftime("%Y-%m-%d %H:%M:%S") if closed_at else ''
+            ]
+
+    header = ["Level", "OpenPrice", "ClosePrice", "Profit", "Status", "CreatedAt", "ClosedAt"]
+    return streaming_csv_response(request, f"bot_{bot_id}_trades.csv", header, rows())
+
+
+@api_view(['GET'])
+@authentication_classes([CustomAuthentication])
+@permission_classes([IsAuthenticated])
+def export_trades_columnar(request, bot_id=None):
+    """
+    Transakcje usera (wszystkich botów albo jednego) w formacie kolumnowym, z zachowaniem typów:
+    ?output=arrow (Arrow IPC stream, domyślnie) lub ?output=parquet,
+    opcjonalnie ?date_from=RRRR-MM-DD&date_to=RRRR-MM-DD.
+    """
+    if not columnar_available():
+        return Response({"error": "Columnar export requires pyarrow"}, status=501)
+
+    output = request.GET.get('output', 'arrow')
+    if output not in FORMATS:
+        return Response({"error": f"Unknown output format: {output}"}, status=400)
+
+    if bot_id is not None and not BotD10.objects.filter(id=bot_id, user_id=request.user.id).exists():
+        return Response({"error": "Bot not found or not owned by user"}, status=404)
+
+    try:
+        date_from, date_to = parse_date_range(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    content_type, extension = FORMATS[output]
+    rows = user_trades(request.user.id, bot_id, date_from, date_to)
+    filename = f"bot_{bot_id}_trades.{extension}" if bot_id else f"d10_trades.{extension}"
+
+    response = StreamingHttpResponse(stream_columnar(rows, output), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -238,11 +281,19 @@ def check_d10_connection(request, bot_id):
 
     ok = async_to_sync(xtb_manager.connect_bot)(bot_id)
     if ok:
-        return Response({"ok": True, "message": "Bot is connected with XTB"})
+        return Response({
+            "ok": True,
+            "message": "Bot is connected with XTB",
+            "scheduler": xtb_manager.scheduler_stats(bot_id)
+        })
     else:
         return Response({"ok": False, "message": "Failed to connect to XTB"}, status=400)
 
 
+# Zbiorczy status botów usera (POST /bot_statuses/) - wspólny widok z botcore
+get_bot_statuses = bot_statuses_view(BotD10, CustomAuthentication)
+
+
 @api_view(['GET'])
 @authentication_classes([CustomAuthentication])
 @permission_classes([IsAuthenticated])
@@ -1,6 +1,5 @@
 # xtb_manager.py
 import asyncio
-import json
 import datetime
 from decimal import Decimal
 import websockets
@@ -9,6 +8,8 @@ from asgiref.sync import sync_to_async
 from django.conf import settings
 
 from .models import BotD10
+from .broker import publish_bot_status
+from botcore.xtb_transport import XTBChannel, PRIORITY_TRADE, PRIORITY_QUOTE
 
 # Tu przechowujemy aktualne ceny instrumentów:
 # klucz: (bot_id, symbol) -> {"ask": float, "bid": float, "timestamp": "ISO8601"}
@@ -16,6 +17,9 @@ instrument_prices = {}
 
 XTB_MAIN_URL = "wss://ws.xtb.com/demo"
 
+# Co ile sekund odświeżamy cenę instrumentu (limit komend pilnuje XTBChannel)
+QUOTE_REFRESH_INTERVAL = 1.0
+
 
 class _XTBConnection:
     def __init__(self, bot_id, login, password, instrument):
@@ -24,9 +28,8 @@ class _XTBConnection:
         self.password = password
         self.instrument = instrument
 
-        self.ws = None
+        self.channel = None
         self.is_connected = False
-        self._recv_lock = asyncio.Lock()
         self._price_task = None
 
     def _ts(self):
@@ -34,7 +37,8 @@ class _XTBConnection:
 
     async def connect(self) -> bool:
         try:
-            self.ws = await websockets.connect(XTB_MAIN_URL)
+            ws = await websockets.connect(XTB_MAIN_URL)
+            self.channel = XTBChannel(ws, f"D10 Bot {self.bot_id}")
             print(f"[XTB] Bot {self.bot_id} connected to ws.")
         except Exception as e:
             print(f"[XTB] Bot {self.bot_id} cannot connect: {e}")
@@ -48,8 +52,12 @@ class _XTBConnection:
                 "password": self.password
             }
         }
-        await self.send_message(req)
-        resp = await self.receive_message()
+        try:
+            resp = await self.request(req, PRIORITY_TRADE)
+        except Exception as e:
+            print(f"[XTB] Bot {self.bot_id} login error: {e}")
+            await self.close()
+            return False
         if not resp.get("status"):
             print(f"[XTB] Bot {self.bot_id} login fail: {resp}")
             await self.close()
@@ -62,27 +70,33 @@ class _XTBConnection:
 
     async def close(self):
         self.is_connected = False
-        if self._price_task:
+        # reconnect() jest wołany z pętli cen - nie anulujemy bieżącego zadania
+        if self._price_task and self._price_task is not asyncio.current_task():
             self._price_task.cancel()
-        if self.ws:
-            await self.ws.close()
+        self._price_task = None
+        if self.channel:
+            await self.channel.close()
+            self.channel = None
         print(f"[XTB] Bot {self.bot_id} connection closed.")
 
-    async def send_message(self, msg: dict):
-        txt = json.dumps(msg)
-        await self.ws.send(txt)
-
-    async def receive_message(self):
-        async with self._recv_lock:
-            txt = await self.ws.recv()
-        return json.loads(txt)
+    async def request(self, msg: dict, priority: int = PRIORITY_QUOTE) -> dict:
+        """
+        Komenda + odpowiedź przez multiplekser (customTag) - pętla cen i zlecenia
+        mogą działać równolegle na jednym połączeniu bez podbierania cudzych odpowiedzi.
+        Zlecenia (PRIORITY_TRADE) są wysyłane przed zaległymi zapytaniami o cenę.
+        """
+        if self.channel is None:
+            raise ConnectionError("Not connected to XTB API.")
+        return await self.channel.request(msg, priority=priority)
 
     async def _fetch_prices_loop(self):
         """
-        Co 1s pobieramy bieżącą cenę instrumentu (np. BITCOIN) 
+        Co QUOTE_REFRESH_INTERVAL pobieramy bieżącą cenę instrumentu (np. BITCOIN) 
         i opcjonalnie np. USDPLN – wstawiamy do instrument_prices.
+        Odstęp liczymy od startu zapytania, więc czas w kolejce komend nie wydłuża cyklu.
         """
         while self.is_connected:
+            started = asyncio.get_running_loop().time()
             try:
                 # główny instrument
                 await self.fetch_symbol(self.instrument)
@@ -90,16 +104,18 @@ class _XTBConnection:
                 print(f"[XTB] Bot {self.bot_id} fetch price error: {e}")
                 await asyncio.sleep(2)
                 await self.reconnect()
+                # connect() uruchomił już nową pętlę cen - ta kończy pracę
+                return
 
-            await asyncio.sleep(1)
+            elapsed = asyncio.get_running_loop().time() - started
+            await asyncio.sleep(max(0.0, QUOTE_REFRESH_INTERVAL - elapsed))
 
     async def fetch_symbol(self, symbol):
         req = {
             "command": "getSymbol",
             "arguments": {"symbol": symbol}
         }
-        await self.send_message(req)
-        resp = await self.receive_message()
+        resp = await self.request(req)
 
         if resp.get("status"):
             rd = resp["returnData"]
@@ -142,8 +158,7 @@ class _XTBConnection:
                 }
             }
         }
-        await self.send_message(req)
-        resp = await self.receive_message()
+        resp = await self.request(req, PRIORITY_TRADE)
         return resp
 
 
@@ -178,6 +193,15 @@ class XTBManager:
             self._connections[bot_id] = conn
         return ok
 
+    def scheduler_stats(self, bot_id: int):
+        """
+        Metryki kolejki komend połączenia bota (głębokość kolejki, czas oczekiwania) albo None.
+        """
+        conn = self._connections.get(bot_id)
+        if conn is None or conn.channel is None:
+            return None
+        return conn.channel.stats()
+
     async def disconnect_bot(self, bot_id: int):
         if bot_id in self._connections:
             await self._connections[bot_id].close()
@@ -214,6 +238,7 @@ class XTBManager:
         bot = await sync_to_async(BotD10.objects.get)(pk=bot_id)
         bot.status = 'ERROR'
         await sync_to_async(bot.save)()
+        publish_bot_status(bot.id, bot.user_id, 'ERROR')
         return {"status": False, "errorCode": "MAX_RETRIES_EXCEEDED"}
 
 